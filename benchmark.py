@@ -0,0 +1,354 @@
+####################################################################
+### SUITE DE MESURES DE PERFORMANCE HORS LIGNE
+### 18.10.2026
+### Nestor Laborier
+####################################################################
+
+### Module controleur (la carte, et donc PyQt et matplotlib, ne sont importés que pour la mesure 'carte')
+from controler import *
+
+import argparse
+import gzip
+import platform
+import subprocess
+import sys
+
+# Dossier des données de mesure (enregistrées ou synthétiques) et de l'historique des résultats
+BENCH_PATH = 'benchmarks'
+FIXTURES_PATH = os.path.join(BENCH_PATH, 'fixtures')
+HISTORY_FILE = os.path.join(BENCH_PATH, 'history.jsonl')
+
+# Tailles des entrées (lignes du registre, vecteurs d'états, points de traces)
+SCALES = [100, 1000, 10000, 100000, 1000000]
+
+# Registre synthétique pour le filtrage : nombre de lignes et part de jets privés
+REGISTRY_ROWS = 100000
+REGISTRY_JET_RATIO = 0.1
+
+# Part des vecteurs d'états synthétiques qui sont des jets privés, et nombre de points par trace synthétique
+STATES_JET_RATIO = 0.05
+TRACK_POINTS = 200
+
+# Nombre d'essais par mesure, et durée maximale (s) au-delà de laquelle on s'arrête (au moins un essai)
+RUNS = 5
+BUDGET = 2.0
+
+# Régression : mesure plus lente que REGRESSION_THRESHOLD fois la médiane des HISTORY_WINDOW derniers passages sur la même machine
+REGRESSION_THRESHOLD = 1.2
+HISTORY_WINDOW = 10
+
+# Colonnes de la base des immatriculations OpenSky (aircraftDatabase), dans l'ordre du fichier
+REGISTRY_HEADER = ["icao24", "registration", "manufacturericao", "manufacturername", "model", "typecode", "serialnumber", "linenumber",
+                   "icaoaircrafttype", "operator", "operatorcallsign", "operatoricao", "operatoriata", "owner", "testreg", "registered",
+                   "reguntil", "status", "built", "firstflightdate", "seatconfiguration", "engines", "modes", "adsb", "acars", "notes",
+                   "categoryDescription"]
+
+# Types d'avions de ligne, hors registre des jets privés
+AIRLINER_TYPES = ['A320', 'B738', 'E190', 'A20N', 'B77W']
+
+
+### DONNEES DE MESURE
+
+class Fixtures :
+    """Données des mesures, relues depuis le dossier path : enregistrements réels de l'API (voir record) s'ils existent,
+    sinon données synthétiques générées une fois à graine fixe puis conservées, pour des mesures reproductibles hors ligne"""
+
+    def __init__(self, path=FIXTURES_PATH) :
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._jets = None
+
+    def file(self, name) :
+        return os.path.join(self.path, name)
+
+    def load(self, name, build) :
+        """Contenu JSON (compressé) du fichier name, construit par build() et enregistré s'il est absent"""
+        path = self.file(name)
+        if not os.path.exists(path) :
+            content = build()
+            with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as fixturefile :
+                json.dump(content, fixturefile)
+            os.replace(path + '.tmp', path)
+            return content
+        with gzip.open(path, 'rt', encoding='utf-8') as fixturefile :
+            return json.load(fixturefile)
+
+    def recorded(self) :
+        """Vrai si un instantané et des traces ont été enregistrés depuis l'API (voir record)"""
+        return os.path.exists(self.file('states-recorded.json.gz')) and os.path.exists(self.file('tracks-recorded.json.gz'))
+
+    def registryCSV(self, n) :
+        """Chemin d'une base des immatriculations synthétique de n lignes, au format de aircraftDatabase, écrite si elle est absente"""
+        path = self.file(f'registry-{n}.csv')
+        if not os.path.exists(path) :
+            writeRegistryCSV(path + '.tmp', n)
+            os.replace(path + '.tmp', path)
+        return path
+
+    def registry(self, n, rebuild=False) :
+        """Registre compilé de la base synthétique de n lignes, compilé à côté de celle-ci"""
+        csv_path = self.registryCSV(n)
+        return loadRegistry(csv_path, csv_path[:-4] + '.npy', csv_path[:-4] + '.json', rebuild=rebuild)
+
+    def jets(self) :
+        """Liste des jets privés des mesures : le vrai registre pour les enregistrements réels, sinon le registre synthétique"""
+        if self._jets is None :
+            if self.recorded() :
+                self._jets = PrivateJets()
+            else :
+                self._jets = PrivateJets(registry=self.registry(REGISTRY_ROWS))
+        return self._jets
+
+    def states(self, scale) :
+        """Réponse /states/all : enregistrée si scale vaut 'recorded', sinon synthétique de scale vecteurs d'états"""
+        if scale == 'recorded' :
+            return self.load('states-recorded.json.gz', None)
+        return self.load(f'states-{scale}.json.gz', lambda : syntheticAnswer(scale, self.jets()))
+
+    def tracks(self, scale) :
+        """Traces brutes /tracks par avion : enregistrées si scale vaut 'recorded', sinon synthétiques de scale points en tout"""
+        if scale == 'recorded' :
+            return self.load('tracks-recorded.json.gz', None)
+        return self.load(f'tracks-{scale}.json.gz', lambda : syntheticPaths(scale, self.jets()))
+
+
+def writeRegistryCSV(path, n, jet_ratio=REGISTRY_JET_RATIO, seed=0) :
+    """Ecrit une base des immatriculations synthétique de n lignes, dont une part jet_ratio de jets privés (types de modelNumbers)"""
+    rng = np.random.default_rng(seed)
+    icaos = np.char.mod('%06x', rng.choice(1 << 24, n, replace=False))
+    jet_types = np.array(sorted(modelNumbers()))
+    types = np.where(rng.random(n) < jet_ratio, jet_types[rng.integers(0, len(jet_types), n)],
+                     np.array(AIRLINER_TYPES)[rng.integers(0, len(AIRLINER_TYPES), n)])
+    blank = [''] * (len(REGISTRY_HEADER) - 6)
+    with open(path, 'w', newline='') as csvfile :
+        writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
+        writer.writerow(REGISTRY_HEADER)
+        for k, (icao, typecode) in enumerate(zip(icaos.tolist(), types.tolist())) :
+            writer.writerow([icao, "N%05d" % k, "MAKER", "Maker", "Model " + typecode, typecode] + blank)
+
+def syntheticAnswer(n, jets_list, jet_ratio=STATES_JET_RATIO, seed=0) :
+    """Réponse /states/all synthétique de n vecteurs d'états (comme engine.syntheticStates, mais générée en colonnes)"""
+    rng = np.random.default_rng(seed)
+    icaos = np.char.mod('%06x', rng.integers(0, 1 << 24, n)).astype('U6')
+    known = jets_list.registry['icao']
+    picked = np.flatnonzero(rng.random(n) < jet_ratio) if len(known) else []
+    icaos[picked] = known[rng.integers(0, len(known), len(picked))]
+    t = 1671926400
+    columns = zip(icaos.tolist(), rng.uniform(-180, 180, n).tolist(), rng.uniform(-80, 80, n).tolist(), rng.uniform(0, 13000, n).tolist(),
+                  rng.uniform(50, 280, n).tolist(), rng.uniform(0, 360, n).tolist())
+    rows = [[icao, "CS%05d   " % (k % 100000), "France", t - 2, t - 1, lon, lat, altitude, False, velocity, track, 0.0, None, None, None, False, 0]
+            for k, (icao, lon, lat, altitude, velocity, track) in enumerate(columns)]
+    return {"time" : t, "states" : rows}
+
+def syntheticPaths(n, jets_list, points=TRACK_POINTS, seed=0) :
+    """Traces brutes /tracks synthétiques de n points en tout, par traces de points points : roulage, montée, croisière, descente, roulage"""
+    rng = np.random.default_rng(seed)
+    known = jets_list.registry['icao']
+    paths = dict()
+    t = 1671926400.0
+    for k in range(-(-n // points)) :
+        size = min(points, n - k * points)
+        lat, lon = syntheticTrack(size, seed + k)
+        steps = np.arange(size)
+        altitude = np.minimum(11000.0, 100.0 * np.minimum(steps, size - 1 - steps))
+        ground = (steps < 5) | (steps >= size - 5)
+        altitude[ground] = 0.0
+        path = np.column_stack([t + 86400 * k + 30 * steps, lat, lon, altitude, np.full(size, 45.0), ground]).tolist()
+        icao = str(known[rng.integers(0, len(known))]) if len(known) else "%06x" % k
+        paths.setdefault(icao, []).extend(path)
+    return paths
+
+
+### MESURES
+
+def caseRegistre(fixtures, scale) :
+    """Compilation du registre depuis le CSV (lecture, filtre des jets privés, tableau trié)"""
+    fixtures.registryCSV(scale)
+    return lambda : fixtures.registry(scale, rebuild=True)
+
+def caseRegistreCache(fixtures, scale) :
+    """Chargement du registre compilé (mmap) et de son index de recherche"""
+    fixtures.registry(scale)
+    return lambda : PrivateJets(registry=fixtures.registry(scale))
+
+def caseFiltrage(fixtures, scale) :
+    """Filtrage des jets privés d'un instantané /states/all (FlyingPlanes)"""
+    rows = fixtures.states(scale)["states"]
+    jets_list = fixtures.jets()
+    return lambda : FlyingPlanes(rows, jets_list)
+
+def caseRoutes(fixtures, scale) :
+    """Construction des routes depuis les traces brutes, avec leur longueur"""
+    paths = fixtures.tracks(scale)
+
+    def build() :
+        routes = []
+        for icao, path in paths.items() :
+            route = Route(icao)
+            route.loadPath(path)
+            routes.append(route)
+        return sum(route.length for route in routes)
+    return build
+
+def caseCO2(fixtures, scale) :
+    """Découpage des routes en vols et calcul de leurs émissions"""
+    routes = []
+    for icao, path in fixtures.tracks(scale).items() :
+        route = Route(icao)
+        route.loadPath(path)
+        routes.append(route)
+    types = fixtures.jets().typecodes([route.icao for route in routes])
+    return lambda : FlightLegs.fromRoutes(routes, types).total()
+
+def caseCarte(fixtures, scale) :
+    """Retracé de la carte (blitting des avions sur le fond de carte mémorisé)"""
+    # Sans affichage (serveur, intégration continue), Qt s'ouvre hors écran au lieu d'interrompre toute la suite
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY') :
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    import graphics
+
+    app = graphics.QApplication.instance() or graphics.QApplication([])
+    columns = StateColumns.fromRows(fixtures.states(scale)["states"])
+    controler = Controler(background=True)
+    carte = graphics.Planisphere(None, controler)
+    carte.resize(1200, 700)
+    carte.canvas.draw()
+    controler.plane_coord_list = (columns.lon, columns.lat)
+    fixtures.carte = (app, carte)   # L'application et la fenêtre doivent survivre aux mesures
+    return carte.drawgraph
+
+# Mesures disponibles, dans l'ordre d'exécution
+CASES = {'registre' : caseRegistre, 'registre_cache' : caseRegistreCache, 'filtrage' : caseFiltrage,
+         'routes' : caseRoutes, 'co2' : caseCO2, 'carte' : caseCarte}
+
+
+def measure(function, runs=RUNS, budget=BUDGET) :
+    """Durées (ms) de function : meilleure et médiane d'au plus runs essais, arrêtés après budget secondes (un essai au moins)"""
+    timings = []
+    begin = time.perf_counter()
+    while len(timings) < runs and (not timings or time.perf_counter() - begin < budget) :
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return dict(best=min(timings), median=float(np.median(timings)), runs=len(timings))
+
+
+### HISTORIQUE ET REGRESSIONS
+
+def environment() :
+    """Description de la machine et de la version du code, enregistrée avec chaque passage"""
+    try :
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError :
+        commit = ''
+    return dict(machine=platform.node(), python=platform.python_version(), numpy=np.__version__, commit=commit)
+
+def loadHistory(path=HISTORY_FILE) :
+    """Passages précédents de la suite (une ligne JSON par passage), liste vide s'il n'y en a pas"""
+    try :
+        with open(path, encoding='utf-8') as historyfile :
+            return [json.loads(line) for line in historyfile if line.strip()]
+    except FileNotFoundError :
+        return []
+
+def saveRun(run, path=HISTORY_FILE) :
+    with open(path, 'a', encoding='utf-8') as historyfile :
+        historyfile.write(json.dumps(run) + '\n')
+
+def compare(results, history, machine, threshold=REGRESSION_THRESHOLD, window=HISTORY_WINDOW) :
+    """Rapport de chaque mesure à la médiane de ses window derniers passages sur la même machine (None sans référence)
+    Renvoie la liste des rapports, dans l'ordre des résultats, et celle des régressions (rapport au-delà de threshold)"""
+    previous = dict()
+    for run in history :
+        if run.get('machine') == machine :
+            for result in run['results'] :
+                previous.setdefault((result['case'], str(result['scale'])), []).append(result['best'])
+    ratios, regressions = [], []
+    for result in results :
+        reference = previous.get((result['case'], str(result['scale'])), [])[-window:]
+        ratio = result['best'] / float(np.median(reference)) if reference else None
+        ratios.append(ratio)
+        if ratio is not None and ratio > threshold :
+            regressions.append(result)
+    return ratios, regressions
+
+
+### SUITE DE MESURES
+
+def run(cases=None, scales=SCALES, runs=RUNS, budget=BUDGET, path=BENCH_PATH, save=True, threshold=REGRESSION_THRESHOLD) :
+    """Lance les mesures demandées à chaque taille (et sur les enregistrements réels s'il y en a), affiche les résultats
+    avec leur évolution, les ajoute à l'historique, et renvoie les régressions"""
+    fixtures = Fixtures(os.path.join(path, 'fixtures'))
+    history_file = os.path.join(path, 'history.jsonl')
+    scales = list(scales) + (['recorded'] if fixtures.recorded() else [])
+    results = []
+    for case in cases or CASES :
+        for scale in scales :
+            # Le registre n'a pas d'enregistrement réel : c'est la base téléchargée elle-même
+            if scale == 'recorded' and case.startswith('registre') :
+                continue
+            try :
+                function = CASES[case](fixtures, scale)
+            except (ImportError, OSError) as error :
+                print(f"{case:15s} : ignorée ({error})")
+                break
+            result = dict(case=case, scale=scale, **measure(function, runs, budget))
+            print(f"{case:15s} {str(scale):>9s} : {result['best']:10.2f} ms (médiane {result['median']:.2f} ms, {result['runs']} essais)")
+            results.append(result)
+
+    env = environment()
+    ratios, regressions = compare(results, loadHistory(history_file), env['machine'], threshold)
+    print("\nEvolution par rapport aux passages précédents sur cette machine :")
+    for result, ratio in zip(results, ratios) :
+        status = "référence" if ratio is None else f"x{ratio:.2f}" + ("  REGRESSION" if ratio > threshold else "")
+        print(f"{result['case']:15s} {str(result['scale']):>9s} : {status}")
+    if save :
+        saveRun(dict(time=time.time(), **env, results=results), history_file)
+    return regressions
+
+
+def record(path=FIXTURES_PATH, tracks=50) :
+    """Enregistre (identifiants OpenSky requis) un instantané /states/all et les traces de tracks jets privés,
+    qui remplacent ensuite les données synthétiques de taille 'recorded' dans les mesures"""
+    os.makedirs(path, exist_ok=True)
+    rest = RESTapi()
+    answer = rest.get("/states/all")
+    if answer is None or answer.status_code != 200 :
+        print("Enregistrement impossible : /states/all inaccessible")
+        return
+    states = answer.json()
+    fleet = FlyingPlanes(states["states"], PrivateJets())
+    paths = {icao : rest.getCurrentRoute(icao) for icao in fleet.states.icao24[:tracks].tolist()}
+    paths = {icao : path for icao, path in paths.items() if path}
+    for name, content in [('states-recorded.json.gz', states), ('tracks-recorded.json.gz', paths)] :
+        with gzip.open(os.path.join(path, name), 'wt', encoding='utf-8') as fixturefile :
+            json.dump(content, fixturefile)
+    print(f"{len(states['states'])} vecteurs d'états et {len(paths)} traces enregistrés dans {path}")
+
+
+def parser() :
+    parser = argparse.ArgumentParser(description="Jet Tracker : mesures de performance hors ligne, avec suivi des régressions")
+    parser.add_argument('--cases', nargs='*', default=None, choices=list(CASES), help="mesures à lancer (toutes par défaut)")
+    parser.add_argument('--scales', nargs='*', type=int, default=SCALES, help="tailles des entrées")
+    parser.add_argument('--runs', type=int, default=RUNS, help="nombre maximal d'essais par mesure")
+    parser.add_argument('--budget', type=float, default=BUDGET, help="durée maximale des essais d'une mesure (s)")
+    parser.add_argument('--path', default=BENCH_PATH, help="dossier des données de mesure et de l'historique")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="ralentissement signalé comme régression")
+    parser.add_argument('--no-save', action='store_true', help="n'ajoute pas ce passage à l'historique")
+    parser.add_argument('--check', action='store_true', help="code de sortie 1 en cas de régression")
+    parser.add_argument('--record', type=int, default=None, metavar='TRACKS', help="enregistre un instantané et TRACKS traces depuis l'API, puis s'arrête")
+    return parser
+
+
+def main(argv=None) :
+    args = parser().parse_args(argv)
+    if args.record is not None :
+        record(os.path.join(args.path, 'fixtures'), args.record)
+        return 0
+    regressions = run(args.cases, args.scales, args.runs, args.budget, args.path, not args.no_save, args.threshold)
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == '__main__' :
+    sys.exit(main())
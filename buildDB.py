@@ -5,53 +5,401 @@
 ####################################################################
 
 import csv
+import glob
+import gzip
+import io
+import json
+import operator
+import os
+import re
+import time
 
-model_numbers = dict()
+import numpy as np
 
-# On constitue la base de données des modèles de jets privés enregistrés dans le fichier doc8643AircraftTypes.csv
+from metrics import *
 
-with open('.\\planeDB\\doc8643AircraftTypes.csv', newline='') as csvfile:
-    csvfile.readline()
+# Emplacements de la base des immatriculations et de sa version compilée
+DB_FOLDER       = 'planeDB'
+REGISTRY_CSV    = os.path.join(DB_FOLDER, 'aircraftDatabase-2022-11.csv')
+REGISTRY_CACHE  = os.path.join(DB_FOLDER, 'privateJets.npy')
+REGISTRY_META   = os.path.join(DB_FOLDER, 'privateJets.json')
+MODELS_CSV      = os.path.join(DB_FOLDER, 'doc8643AircraftTypes.csv')
+MODELS_CACHE    = os.path.join(DB_FOLDER, 'modelNumbers.json')
 
-    lines = csv.reader(csvfile, delimiter=',', quotechar='"')
-    
-    for row in lines:
-        if row[0] == "LandPlane" and row[4] == "Jet" and row[5] in ["BOMBARDIER","GULFSTREAM","DASSAULT","PIAGGIO"] or (row[5] == "CESSNA" and "Citation" in row[6]) :
-            if "Rafale" not in row[6] and "Mirage" not in row[6] :
-                
-                description = row[1]
-                model_nbr = row[2]
-                manufacturer = row[5]
-                model = row[6]
+# Bases des immatriculations OpenSky reconnues dans DB_FOLDER (dumps mensuels, éventuellement compressés en .gz ou .zst) : 
+# la plus récente, d'après l'année et le mois de son nom, est utilisée ; et mises à jour partielles appliquées par-dessus, dans l'ordre des noms, 
+# chacune accompagnée de la signature de la base pour laquelle elle a été écrite (même nom suivi de DELTA_BASE)
+REGISTRY_PATTERNS = ['aircraftDatabase*.csv*', 'aircraft-database*.csv*', 'aircraftdatabase*.csv*']
+DELTA_PATTERN     = 'registryDelta*.csv*'
+DELTA_BASE        = '.base.json'
 
-                model_numbers[model_nbr] = model
+# Noms possibles (en minuscules) de chaque colonne utile de la base, selon les versions des dumps OpenSky
+REGISTRY_ALIASES = {'icao'          : ['icao24', 'icao'],
+                    'registration'  : ['registration', 'reg'],
+                    'manufacturer'  : ['manufacturericao', 'manufacturer', 'manufacturername'],
+                    'model'         : ['model'],
+                    'typecode'      : ['typecode', 'icaotypecode', 'type']}
 
-                # DEBUG AFFICHAGE DE LA LISTE DES MODELES
-                # print(description + model_nbr + manufacturer + model)
+# Nombre de lignes lues entre deux rapports d'avancement de la lecture de la base
+REGISTRY_CHUNK = 200000
 
+# Version du format compilé, à incrémenter à chaque changement des colonnes ou du filtre
+REGISTRY_VERSION = 2
 
-# CLASSE DE LA LISTE DES JETS PRIVES IMMATRICULES 
+# Colonnes du registre compilé, une ligne par jet privé, triées par code ICAO
+REGISTRY_FIELDS = ['icao', 'manufacturer', 'model', 'type', 'registration', 'typecode']
 
-class PrivateJets :
-    """Classe de la liste des jets privés immatriculés en novembre 2022"""
-    def __init__(self) :
+# Index des modèles de jets privés, et caractéristiques de tous les types d'avions, construits au premier usage puis gardés pour tout le processus
+_model_numbers = None
+_aircraft_types = None
 
-        self.jets = dict()      # Dictionnaire des jets privés avec leur ICAO comme clef
 
-        with open('.\\planeDB\\aircraftDatabase-2022-11.csv','r') as csvfile:
-    
-            csvfile.readline()
+# CONSTRUCTION DE L'INDEX DES MODELES DE JETS PRIVES
 
-            lines = csv.reader(csvfile, delimiter=',', quotechar='"')
+def parseModelNumbers(models_path=MODELS_CSV) :
+    """On constitue la base de données des modèles de jets privés enregistrés dans le fichier doc8643AircraftTypes.csv"""
+    model_numbers = dict()
 
-            for row in lines :
-                if row[5] in model_numbers :
+    with open(models_path, newline='') as csvfile:
+        csvfile.readline()
+
+        lines = csv.reader(csvfile, delimiter=',', quotechar='"')
+        
+        for row in lines:
+            if row[0] == "LandPlane" and row[4] == "Jet" and row[5] in ["BOMBARDIER","GULFSTREAM","DASSAULT","PIAGGIO"] or (row[5] == "CESSNA" and "Citation" in row[6]) :
+                if "Rafale" not in row[6] and "Mirage" not in row[6] :
                     
-                    self.jets[row[0]] = [row[2],row[4],model_numbers[row[5]]]
+                    description = row[1]
+                    model_nbr = row[2]
+                    manufacturer = row[5]
+                    model = row[6]
+
+                    model_numbers[model_nbr] = model
+
+                    # DEBUG AFFICHAGE DE LA LISTE DES MODELES
+                    # print(description + model_nbr + manufacturer + model)
+
+    return model_numbers
+
+def modelNumbers(rebuild=False) :
+    """Renvoie l'index des modèles de jets privés (code ICAO du type -> nom du modèle), 
+    lu depuis son cache à côté du registre compilé, ou reconstruit si doc8643AircraftTypes.csv a changé"""
+    global _model_numbers
+    if _model_numbers is not None and not rebuild :
+        return _model_numbers
+
+    signature = {'version' : REGISTRY_VERSION, 'models' : sourceSignature(MODELS_CSV)}
+    if not rebuild :
+        try :
+            with open(MODELS_CACHE) as cachefile :
+                cache = json.load(cachefile)
+            if cache['signature'] == signature :
+                _model_numbers = cache['models']
+                return _model_numbers
+        except (FileNotFoundError, KeyError, json.decoder.JSONDecodeError) :
+            pass
+
+    _model_numbers = parseModelNumbers()
+    with open(MODELS_CACHE + '.tmp', 'w') as cachefile :
+        json.dump({'signature' : signature, 'models' : _model_numbers}, cachefile)
+    os.replace(MODELS_CACHE + '.tmp', MODELS_CACHE)
+    return _model_numbers
+
+def aircraftTypes(models_path=MODELS_CSV) :
+    """Renvoie les caractéristiques de tous les types d'avions de doc8643AircraftTypes.csv : 
+    désignateur OACI -> (description, ex. 'L2J' pour un biréacteur terrestre, catégorie de turbulence de sillage 'L' / 'M' / 'H'), 
+    vide si le fichier est absent"""
+    global _aircraft_types
+    if _aircraft_types is not None :
+        return _aircraft_types
+    types = dict()
+    try :
+        with open(models_path, newline='') as csvfile :
+            csvfile.readline()
+            for row in csv.reader(csvfile, delimiter=',', quotechar='"') :
+                types.setdefault(row[2], (row[1], row[7]))
+    except FileNotFoundError :
+        pass
+    _aircraft_types = types
+    return types
+
+
+# LECTURE EN FLUX DE LA BASE DES IMMATRICULATIONS
+
+def registrySource(folder=DB_FOLDER) :
+    """Renvoie le chemin de la base des immatriculations la plus récente du dossier (année et mois du nom de fichier), 
+    REGISTRY_CSV si aucune n'est trouvée"""
+    def month(path) :
+        found = re.findall(r'(\d{4})[-_]?(\d{2})', os.path.basename(path))
+        return (found[-1] if found else ('0000', '00'), os.path.getmtime(path))
+    paths = {path for pattern in REGISTRY_PATTERNS for path in glob.glob(os.path.join(folder, pattern)) 
+             if not path.endswith(('.tmp', '.npy', '.json'))}
+    return max(paths, key=month) if paths else REGISTRY_CSV
+
+def deltaBase(delta_path) :
+    """Base pour laquelle la mise à jour partielle a été écrite (nom et signature, voir writeDelta), None si elle n'est pas connue"""
+    try :
+        with open(delta_path + DELTA_BASE) as basefile :
+            return json.load(basefile)
+    except (FileNotFoundError, json.decoder.JSONDecodeError) :
+        return None
+
+def deltaSources(csv_path) :
+    """Mises à jour partielles du registre écrites pour la base csv_path et rangées à côté d'elle, dans l'ordre de leurs noms
+    Celles d'une autre base (un dump plus ancien, remplacé depuis) ou d'une base inconnue sont ignorées : 
+    rejouées sur un autre dump, elles réintroduiraient des lignes périmées ou retirées"""
+    name, signature = os.path.basename(csv_path), sourceSignature(csv_path)
+    paths = []
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(csv_path), DELTA_PATTERN))) :
+        if path.endswith(('.tmp', DELTA_BASE)) :
+            continue
+        base = deltaBase(path)
+        # Sans base source (supprimée après compilation), seul son nom est comparé
+        if base is None or base.get('source') != name or (signature is not None and base.get('registry') != signature) :
+            continue
+        paths.append(path)
+    return paths
+
+def openSource(path) :
+    """Ouvre en lecture texte un fichier CSV, compressé ou non selon son extension (.gz, ou .zst avec le module zstandard)"""
+    if path.endswith('.gz') :
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    if path.endswith('.zst') :
+        try :
+            import zstandard
+        except ImportError :
+            raise ImportError("Le module zstandard est nécessaire pour lire " + path + " (pip install zstandard)")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True), encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+def registryColumns(header) :
+    """Position de chaque colonne utile (voir REGISTRY_ALIASES) dans l'en-tête de la base, quels que soient son ordre et sa casse"""
+    names = [name.strip().strip('\'"').lower() for name in header]
+    columns = dict()
+    for field, aliases in REGISTRY_ALIASES.items() :
+        found = [names.index(alias) for alias in aliases if alias in names]
+        if found :
+            columns[field] = found[0]
+    missing = [field for field in ['icao', 'typecode'] if field not in columns]
+    if missing :
+        raise ValueError("Colonnes absentes de la base des immatriculations : " + ', '.join(missing))
+    return columns
+
+def streamRegistry(csv_path, progress=None, typecodes=None, stats=None, chunk=REGISTRY_CHUNK) :
+    """Parcourt la base des immatriculations en flux, sans la charger : renvoie un à un les tuples 
+    (icao, immatriculation, constructeur, modèle, désignateur du type) lus d'après l'en-tête, 
+    seulement pour les types de typecodes s'il est donné, en appelant progress(lignes lues, secondes écoulées) toutes les chunk lignes
+    Le nombre de lignes lues est rangé à la fin dans stats['rows'], si stats est donné"""
+    start = time.perf_counter()
+    with openSource(csv_path) as csvfile :
+        header = csvfile.readline()
+        # Les dumps récents d'OpenSky sont entre apostrophes, les anciens entre guillemets
+        quotechar = "'" if header.lstrip().startswith("'") else '"'
+        columns = registryColumns(next(csv.reader([header], delimiter=',', quotechar=quotechar)))
+        positions = [columns.get(field) for field in ['icao', 'registration', 'manufacturer', 'model', 'typecode']]
+        width = max(position for position in positions if position is not None) + 1
+        # Les colonnes absentes sont lues dans une dernière case vide ajoutée à la ligne
+        padded = None in positions
+        getter = operator.itemgetter(*[position if position is not None else -1 for position in positions])
+        typecode = columns['typecode']
+        rows = 0
+        for row in csv.reader(csvfile, delimiter=',', quotechar=quotechar) :
+            rows += 1
+            if progress is not None and rows % chunk == 0 :
+                progress(rows, time.perf_counter() - start)
+            if len(row) < width or (typecodes is not None and row[typecode] not in typecodes) :
+                continue
+            if padded :
+                row.append('')
+            yield getter(row)
+    count('registry.rows', rows)
+    if stats is not None :
+        stats['rows'] = rows
+
+@timed('registry.parse')
+def ingestRegistry(csv_path=None, progress=None) :
+    """Lit la base des immatriculations en flux et renvoie les lignes des jets privés, triées par code ICAO, 
+    ainsi que le bilan de la lecture (lignes lues, jets retenus, durée et débit en lignes par seconde)
+    Mémoire bornée : seules les lignes des jets privés sont gardées"""
+    csv_path = csv_path or registrySource()
+    model_numbers = modelNumbers()
+    rows = dict()
+    stats = dict(source=csv_path)
+    start = time.perf_counter()
+    for icao, registration, manufacturer, model, typecode in streamRegistry(csv_path, progress, model_numbers, stats) :
+        # En cas de doublon, la dernière ligne de la base l'emporte
+        icao = icao.strip().lower()
+        rows[icao] = (icao, manufacturer, model, model_numbers[typecode], registration, typecode)
+    elapsed = time.perf_counter() - start
+    stats.update(jets=len(rows), seconds=elapsed, rate=stats['rows'] / elapsed if elapsed else 0.0)
+    return sorted(rows.values()), stats
+
+def parseRegistry(csv_path=None) :
+    """Parcourt la base des immatriculations et renvoie les lignes des jets privés, triées par code ICAO"""
+    return ingestRegistry(csv_path)[0]
+
+
+# COMPILATION DU REGISTRE DES JETS PRIVES
+
+def sourceSignature(path) :
+    """Renvoie la signature (taille, date de modification) d'un fichier source, None s'il est absent"""
+    try :
+        stat = os.stat(path)
+    except FileNotFoundError :
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def registrySignature(csv_path=None) :
+    """Signature des deux bases sources du registre compilé, avec la version du format"""
+    csv_path = csv_path or registrySource()
+    return {'version' : REGISTRY_VERSION,
+            'source' : os.path.basename(csv_path),
+            'registry' : sourceSignature(csv_path),
+            'models' : sourceSignature(MODELS_CSV)}
+
+def deltaSignatures(csv_path) :
+    """Signatures des mises à jour partielles rangées à côté de la base, dans leur ordre d'application"""
+    return [[os.path.basename(path), sourceSignature(path)] for path in deltaSources(csv_path)]
+
+def registryArray(rows) :
+    """Tableau numpy à largeur fixe du registre, depuis ses lignes triées par code ICAO"""
+    # Largeur de chaque colonne ajustée au plus long texte rencontré
+    widths = [max([len(row[k]) for row in rows], default=0) for k in range(len(REGISTRY_FIELDS))]
+    dtype = np.dtype([(name, 'U' + str(max(width, 1))) for name, width in zip(REGISTRY_FIELDS, widths)])
+    return np.array(rows, dtype=dtype)
+
+def saveRegistry(registry, meta, cache_path=REGISTRY_CACHE, meta_path=REGISTRY_META) :
+    """Enregistre le registre compilé et sa signature"""
+    # Ecriture atomique : le cache n'est jamais lu à moitié écrit
+    with open(cache_path + '.tmp', 'wb') as cachefile :
+        np.save(cachefile, registry)
+    os.replace(cache_path + '.tmp', cache_path)
+    with open(meta_path, 'w') as metafile :
+        json.dump(meta, metafile)
+
+def compileRegistry(csv_path=None, cache_path=REGISTRY_CACHE, meta_path=REGISTRY_META, progress=None) :
+    """Compile le registre des jets privés en un tableau numpy à largeur fixe, trié par code ICAO, 
+    et l'enregistre à côté de la base source avec sa signature (mises à jour partielles comprises)"""
+    csv_path = csv_path or registrySource()
+    rows, stats = ingestRegistry(csv_path, progress)
+    registry = registryArray(rows)
+    for path in deltaSources(csv_path) :
+        registry = mergeRegistry(registry, path)
+    saveRegistry(registry, dict(registrySignature(csv_path), deltas=deltaSignatures(csv_path), stats=stats), cache_path, meta_path)
+    return registry
+
+def mergeRegistry(registry, delta_path) :
+    """Applique une mise à jour partielle au registre compilé : chaque ligne remplace l'avion de même code ICAO, 
+    et une ligne dont le type n'est pas un jet privé (ou est vide) le retire du registre"""
+    model_numbers = modelNumbers()
+    updates = dict()
+    for icao, registration, manufacturer, model, typecode in streamRegistry(delta_path) :
+        icao = icao.strip().lower()
+        updates[icao] = (icao, manufacturer, model, model_numbers[typecode], registration, typecode) if typecode in model_numbers else None
+    kept = ~np.isin(registry['icao'], list(updates)) if updates else np.ones(len(registry), dtype=bool)
+    rows = registry[kept].tolist() + [row for row in updates.values() if row is not None]
+    return registryArray(sorted(rows))
 
-                    # DEBUG AFFICHAGE DE LA LISTE DES AVIONS CORRESPONDANTS AUX MODELES
-                    # useful = [row[0],row[1],row[2],row[3],row[4],row[5]]
-                    # print(", ".join(useful))
+def writeDelta(csv_path, delta_path, base=None) :
+    """Ecrit la mise à jour partielle qui fait passer le registre compilé depuis la base base (par défaut, la plus récente du dossier) 
+    à la base csv_path : jets ajoutés ou modifiés, et jets retirés (type vide) ; renvoie le nombre de lignes écrites
+    La mise à jour, à ranger à côté de base, n'est appliquée qu'à cette base (voir deltaSources) : son nom et sa signature sont 
+    enregistrés à côté d'elle (delta_path + DELTA_BASE)"""
+    base = base or registrySource()
+    registry = loadRegistry(base)
+    new = {row[0] : row for row in ingestRegistry(csv_path)[0]}
+    old = {row[0] : tuple(row) for row in registry.tolist()}
+    changed = [row for icao, row in new.items() if old.get(icao) != row]
+    removed = [icao for icao in old if icao not in new]
+    with open(delta_path, 'w', newline='', encoding='utf-8') as deltafile :
+        writer = csv.writer(deltafile, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
+        writer.writerow(['icao24', 'registration', 'manufacturericao', 'model', 'typecode'])
+        writer.writerows([(icao, registration, manufacturer, model, typecode) 
+                          for icao, manufacturer, model, name, registration, typecode in sorted(changed)])
+        writer.writerows([(icao, '', '', '', '') for icao in sorted(removed)])
+    with open(delta_path + DELTA_BASE, 'w') as basefile :
+        json.dump({'source' : os.path.basename(base), 'registry' : sourceSignature(base)}, basefile)
+    return len(changed) + len(removed)
+
+@timed('registry.load')
+def loadRegistry(csv_path=None, cache_path=REGISTRY_CACHE, meta_path=REGISTRY_META, rebuild=False) :
+    """Charge le registre compilé en mémoire partagée (mmap), et le recompile si la base source a changé ; 
+    les nouvelles mises à jour partielles sont seulement appliquées au registre compilé, sans relire la base"""
+    csv_path = csv_path or registrySource()
+    if not rebuild and os.path.exists(cache_path) :
+        try :
+            with open(meta_path) as metafile :
+                meta = json.load(metafile)
+        except (FileNotFoundError, json.decoder.JSONDecodeError) :
+            meta = None
+
+        signature = registrySignature(csv_path)
+        # Sans base source (supprimée après compilation), on se contente du cache
+        if signature['registry'] is None and meta is not None :
+            signature['registry'] = meta['registry']
+            signature['source'] = meta.get('source')
+        if meta is not None and all(meta.get(key) == value for key, value in signature.items()) :
+            deltas = deltaSignatures(csv_path)
+            applied = meta.get('deltas', [])
+            if deltas == applied :
+                return np.load(cache_path, mmap_mode='r')
+            if deltas[:len(applied)] == applied :
+                registry = np.load(cache_path)
+                for name, delta_signature in deltas[len(applied):] :
+                    registry = mergeRegistry(registry, os.path.join(os.path.dirname(csv_path), name))
+                saveRegistry(registry, dict(meta, deltas=deltas), cache_path, meta_path)
+                return registry
+
+    return compileRegistry(csv_path, cache_path, meta_path)
+
+
+# Valeur de chaque caractère hexadécimal (-1 pour les autres caractères ASCII), et poids de chaque position d'un code ICAO
+HEX_DIGITS = np.full(128, -1, dtype=np.int64)
+for k, c in enumerate('0123456789abcdef') :
+    HEX_DIGITS[ord(c)] = k
+    HEX_DIGITS[ord(c.upper())] = k
+HEX_WEIGHTS = np.array([1 << 20, 1 << 16, 1 << 12, 1 << 8, 1 << 4, 1])
+
+def emptyRegistry() :
+    """Registre vide, au format du registre compilé (en attendant le chargement du vrai registre)"""
+    return np.zeros(0, dtype=[(name, 'U1') for name in REGISTRY_FIELDS])
+
+def icaoKeys(icao_array, invalid=-1) :
+    """Convertit un tableau de codes ICAO 24 bits hexadécimaux en entiers, de façon vectorisée 
+    (les codes mal formés reçoivent la valeur invalid)"""
+    icao_array = np.asarray(icao_array)
+    if icao_array.dtype.kind != 'U' :
+        icao_array = icao_array.astype(str)
+    chars = np.ascontiguousarray(icao_array, dtype='U6').view(np.uint32).reshape(-1, 6)
+    digits = HEX_DIGITS[np.minimum(chars, 127)]
+    keys = digits @ HEX_WEIGHTS
+    # Les codes trop courts finissent par des caractères nuls (invalides), les codes trop longs seraient tronqués à 6 caractères
+    keys[(digits < 0).any(axis=1)] = invalid
+    if icao_array.dtype.itemsize > 6 * 4 :
+        keys[np.char.str_len(icao_array) > 6] = invalid
+    return keys
+
+
+# CLASSE DE LA LISTE DES JETS PRIVES IMMATRICULES 
+
+class PrivateJets :
+    """Classe de la liste des jets privés immatriculés en novembre 2022"""
+    def __init__(self, rebuild=False, registry=None) :
+
+        # Registre compilé, trié par code ICAO, partagé en mémoire avec le fichier cache
+        if registry is None :
+            registry = loadRegistry(rebuild=rebuild)
+        self.registry = registry
+
+        # Clefs entières des codes ICAO (24 bits), triées pour la recherche par dichotomie
+        keys = icaoKeys(self.registry['icao'], invalid=-1)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+        # Dictionnaire des jets privés avec leur ICAO comme clef
+        self.jets = {icao : [manufacturer, model, name] for icao, manufacturer, model, name in 
+                     zip(self.registry['icao'].tolist(), self.registry['manufacturer'].tolist(), 
+                         self.registry['model'].tolist(), self.registry['type'].tolist())}
 
         # DEBUG AFFICHAGE DU NOMBRE DE JETS
         # print(len(self.jets))
@@ -65,16 +413,33 @@ class PrivateJets :
     # Rafraichir la liste des jets privés
     def refreshList(self) :
         """Réinitialise la liste des jets privés (en cas de mise à jour du fichier)"""
-        self.__init__(self)
+        self.__init__(rebuild=True)
+
+    @timed('registry.lookup')
+    def lookup(self,icao_array) :
+        """Recherche vectorisée d'un tableau de codes ICAO dans le registre trié (par dichotomie) : 
+        renvoie le masque des jets privés et leur ligne dans le registre"""
+        queries = icaoKeys(icao_array, invalid=-2)
+        if len(self.keys) == 0 :
+            return np.zeros(len(queries), dtype=bool), np.zeros(len(queries), dtype=np.intp)
+        # Les requêtes sont triées au préalable : la dichotomie parcourt alors le registre dans l'ordre, bien plus vite
+        sorter = np.argsort(queries)
+        positions = np.empty(len(queries), dtype=np.intp)
+        positions[sorter] = np.searchsorted(self.keys, queries[sorter])
+        positions = np.minimum(positions, len(self.keys) - 1)
+        return self.keys[positions] == queries, self.order[positions]
+
+    def typecodes(self,icao_array) :
+        """Désignateurs OACI des types d'avions d'un tableau de codes ICAO, '' pour les avions absents du registre"""
+        found, rows = self.lookup(icao_array)
+        if not len(self.registry) :
+            return np.full(len(found), '', dtype='U4')
+        return np.where(found, self.registry['typecode'][rows], '')
 
     def selectICAOS(self,icao_select_list) : 
         """Selectionner les codes ICAO parmi self selon une liste de codes ICAO (intersection)"""
-        selected_planes = []
-        for icao in self.jets.keys() :
-            if icao in icao_select_list :    
-                selected_planes.append(icao)
-            
-        return selected_planes
+        icao_select = set(icao_select_list)
+        return [icao for icao in self.jets.keys() if icao in icao_select]
  
     def extractICAOS(self,icao_select_list) :
         """Filtrer les avions selon une liste de codes ICAO"""
@@ -88,7 +453,7 @@ class PrivateJets :
 
 def mainTest(): 
     print("\n Liste des modèles d'avions retenus comme jets privés :")
-    print(', '.join(model_numbers))
+    print(', '.join(modelNumbers()))
 
     print("\n Liste des avions immatriculés retenus comme jets privés : \n")
     private = PrivateJets()
@@ -97,5 +462,56 @@ def mainTest():
     print(plane)
 
 
+def benchRegistry() :
+    """Mesure le temps de chargement du registre : lecture CSV seule (avec son débit), compilation à froid, et chargement du cache"""
+    start = time.perf_counter()
+    rows, stats = ingestRegistry(progress=lambda read, elapsed : print(f"   {read} lignes lues, {read / elapsed:.0f} lignes/s"))
+    parse = time.perf_counter() - start
+
+    start = time.perf_counter()
+    PrivateJets(rebuild=True)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    private = PrivateJets()
+    warm = time.perf_counter() - start
+
+    print(f"Lecture du CSV seule       : {parse*1000:10.1f} ms ({len(rows)} jets sur {stats['rows']} lignes, {stats['rate']:.0f} lignes/s, {stats['source']})")
+    print(f"Démarrage à froid (compil.) : {cold*1000:10.1f} ms")
+    print(f"Chargement du cache (mmap)  : {warm*1000:10.1f} ms ({len(private.jets)} jets)")
+
+
+def benchImport(runs=5) :
+    """Mesure le coût propre de l'import du module (hors numpy), et le coût de l'index des modèles qu'il payait auparavant à chaque import"""
+    import subprocess
+    import sys
+
+    def timeit(code) :
+        best = None
+        for k in range(runs) :
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], check=True)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    reference = timeit("import csv, json, numpy")
+    lazy = timeit("import csv, json, numpy; import buildDB")
+
+    start = time.perf_counter()
+    parseModelNumbers()
+    parsed = time.perf_counter() - start
+
+    global _model_numbers
+    _model_numbers = None
+    start = time.perf_counter()
+    modelNumbers()
+    cached = time.perf_counter() - start
+
+    print(f"Import de buildDB (index paresseux)  : {max(lazy-reference, 0)*1000:8.1f} ms")
+    print(f"Index des modèles lu depuis le CSV   : {parsed*1000:8.1f} ms (payé à chaque import auparavant)")
+    print(f"Index des modèles lu depuis le cache : {cached*1000:8.1f} ms (au premier usage seulement)")
+
+
 if __name__ == "__main__" : 
     mainTest()
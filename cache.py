@@ -0,0 +1,139 @@
+####################################################################
+### CACHE LOCAL DES REPONSES OPENSKY
+### 18.10.2026
+### Nestor Laborier
+####################################################################
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# Emplacement et taille maximale du cache sur disque
+CACHE_PATH = os.path.join('cache', 'opensky.sqlite')
+CACHE_BUDGET = 256 * 1024 * 1024
+
+# Durée de vie des réponses en temps réel, calée sur la résolution des vecteurs d'états OpenSky (5 à 10 secondes)
+LIVE_TTL = 10
+
+# Cache partagé par toutes les instances des clients OpenSky, ouvert au premier usage
+_shared_cache = None
+
+
+class DiskCache :
+    """Cache clef -> valeur sur disque (SQLite), avec durée de vie par entrée, 
+    éviction des entrées les moins récemment utilisées au-delà d'un budget en octets, et compteurs de succès/échecs"""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_BUDGET) :
+        if os.path.dirname(path) :
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, accessed REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self.bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self) :
+        return ', '.join([k + ' : ' + str(v) for k, v in self.stats().items()])
+
+    def get(self, key) :
+        """Renvoie la valeur associée à key, None si elle est absente ou expirée"""
+        now = time.time()
+        with self.lock :
+            row = self.db.execute("SELECT value, size, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[2] is not None and row[2] < now :
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.bytes -= row[1]
+                row = None
+            if row is None :
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, key, value, ttl=None) :
+        """Enregistre value sous key, pour ttl secondes (indéfiniment si ttl est None), puis applique le budget en octets"""
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        with self.lock :
+            old = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (key, blob, len(blob), expires, now))
+            self.bytes += len(blob) - (old[0] if old is not None else 0)
+            if self.bytes > self.max_bytes :
+                self.evict(now)
+
+    def evict(self, now) :
+        """Supprime les entrées expirées, puis les moins récemment utilisées jusqu'à revenir sous le budget (appelée sous le verrou)"""
+        expired = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE expires < ?", (now,)).fetchone()
+        self.db.execute("DELETE FROM entries WHERE expires < ?", (now,))
+        self.evictions += expired[0]
+        self.bytes -= expired[1]
+
+        victims = []
+        freed = 0
+        for key, size in self.db.execute("SELECT key, size FROM entries ORDER BY accessed") :
+            if self.bytes - freed <= self.max_bytes :
+                break
+            victims.append((key,))
+            freed += size
+        self.db.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self.evictions += len(victims)
+        self.bytes -= freed
+
+    def clear(self) :
+        """Vide le cache"""
+        with self.lock :
+            self.db.execute("DELETE FROM entries")
+            self.bytes = 0
+
+    def stats(self) :
+        """Compteurs du cache : succès, échecs, taux de succès, évictions, nombre d'entrées et octets occupés"""
+        with self.lock :
+            entries = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            requests = self.hits + self.misses
+            return {'hits' : self.hits, 'misses' : self.misses, 'hit_rate' : self.hits / requests if requests else 0,
+                    'evictions' : self.evictions, 'entries' : entries, 'bytes' : self.bytes}
+
+
+def sharedCache() :
+    """Renvoie le cache disque partagé, ouvert au premier appel"""
+    global _shared_cache
+    if _shared_cache is None :
+        _shared_cache = DiskCache()
+    return _shared_cache
+
+
+# PROCEDURES DE TEST
+
+def testCache() :
+    """Teste la durée de vie et l'éviction LRU sur un cache temporaire"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as folder :
+        cache = DiskCache(os.path.join(folder, 'test.sqlite'), max_bytes=3000)
+        cache.put('vivant', [1, 2, 3], ttl=0.1)
+        cache.put('permanent', 'ok')
+        print(cache.get('vivant'), cache.get('permanent'))
+        time.sleep(0.2)
+        print("Après expiration : " + str(cache.get('vivant')))
+
+        for k in range(10) :
+            cache.put('bloc' + str(k), bytes(1000))
+            cache.get('permanent')
+        print("Après dépassement du budget : " + str(cache.get('bloc0')) + ", " + str(cache.get('permanent')))
+        print(cache)
+        cache.db.close()
+
+
+if __name__ == "__main__" :
+    testCache()
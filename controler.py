@@ -7,8 +7,20 @@
 ### Module moteur
 from engine import *
 
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+### Module d'historique des vols
+from storage import *
+
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Nombre de threads de calcul en arrière-plan (réseau, registre, routes)
+WORKERS = 4
+
+# Mode direct : intervalle entre deux interrogations d'OpenSky (s) et cadence de l'animation des positions (images/s)
+LIVE_INTERVAL = STATES_INTERVAL
+LIVE_FPS = 10
+
+# Marge autour de la partie visible de la carte (degrés), pour les avions qui y entrent entre deux instantanés
+CULL_MARGIN = 2.0
 
 ### CLASSES
 
@@ -16,6 +28,13 @@ class ControlerBase:
     def __init__(self):
         self.clients = list()
         self.message = ""
+        self.diff = None
+
+        self.executor = ThreadPoolExecutor(WORKERS)
+        self.jobs = dict()          # Dernière tâche lancée, par nom
+        # Exécution des rappels des tâches terminées : directe par défaut, 
+        # remplacée par l'interface graphique pour revenir dans le thread de la boucle Qt
+        self.dispatch = lambda function : function()
 
     def addClient(self, client):
         self.clients.append(client)
@@ -25,32 +44,122 @@ class ControlerBase:
         for client in self.clients:
             client.refresh()
 
+    def publish(self, message, diff):
+        """Rafraîchit les clients en leur donnant la différence de flotte (FleetDiff), visible seulement pendant ce rafraîchissement"""
+        self.diff = diff
+        try :
+            self.refreshAll(message)
+        finally :
+            self.diff = None
+
+    def progress(self, message):
+        """Affiche un message d'avancement depuis un thread de calcul"""
+        self.dispatch(lambda : self.refreshAll(message))
+
+    def submit(self, name, function, *args, done=None, message=None):
+        """Lance function(*args) en arrière-plan, et appelle done(résultat) dans le thread de l'interface une fois terminée
+        Une nouvelle tâche du même nom remplace la précédente : annulée si elle n'a pas démarré, son résultat ignoré sinon"""
+        self.cancel(name)
+        future = self.executor.submit(function, *args)
+        self.jobs[name] = future
+        if message :
+            self.refreshAll(message)
+
+        def deliver():
+            if self.jobs.get(name) is not future :
+                return
+            del self.jobs[name]
+            try :
+                result = future.result()
+            except Exception as e :
+                self.refreshAll("Erreur : " + str(e))
+                return
+            if done is not None :
+                done(result)
+
+        def finished(f):
+            if not f.cancelled() :
+                self.dispatch(deliver)
+
+        future.add_done_callback(finished)
+        return future
+
+    def busy(self, name):
+        """Indique si une tâche de ce nom est en cours"""
+        return name in self.jobs
+
+    def cancel(self, name):
+        """Abandonne la tâche en cours de ce nom, s'il y en a une"""
+        future = self.jobs.pop(name, None)
+        if future is not None :
+            future.cancel()
+
+    def shutdown(self):
+        """Arrête les threads de calcul, sans attendre les tâches en cours"""
+        self.jobs.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
 
 class Controler(ControlerBase):
-    def __init__(self):
+    def __init__(self, background=False, store=None, regional=False):
+        """background : la flotte est chargée en arrière-plan par start(), le contrôleur démarre avec une flotte vide
+        store : historique (HistoryStore) où sont enregistrés les instantanés et les routes calculées, aucun par défaut
+        regional : les rafraîchissements peuvent ne demander que la zone visible de la carte zoomée (requête moins coûteuse),
+        la flotte suivie se restreignant alors à cette zone ; par défaut, la flotte reste mondiale"""
         super().__init__()
+        self.store = store
+        self.records = []                       # Enregistrements de routes dans l'historique en cours, attendus à l'arrêt
+        self.regional = regional
 
-        self.flying_planes = FlyingPlanes()
-        self.coord_list = self.flying_planes.coordinates()
+        if background :
+            self.flying_planes = FlyingPlanes([], PrivateJets(registry=emptyRegistry()))
+        else :
+            self.flying_planes = FlyingPlanes()
         self.plane_list = self.flying_planes.flying
-        self.positions = self.flying_planes.positions
+        self.route = None                       # Route courante (Route), pour ses niveaux de détail
         self.route_coord = ([],[])
-        self.refresh_planes_flag = False
         self.route_length = 0 
+        self.route_stats = dict()
+        self.route_legs = None                  # Vols de la route courante (FlightLegs), du décollage à l'atterrissage
         self.co2 = 0
+        self.selected = None                    # ICAO de l'avion sélectionné, None si tous les avions sont affichés
+        self.live = False                       # Mode direct, voir set_live
+        self.live_interval = LIVE_INTERVAL
+        self.viewport = None                    # Partie visible de la carte (lon_min, lon_max, lat_min, lat_max), None si carte entière
+        self.planner = QueryPlanner()           # Choix de la requête des vecteurs d'états : globale, zone visible ou codes ICAO connus
+        self.record_states()
+
+    def start(self):
+        """Charge en arrière-plan le registre des jets privés puis la flotte en vol"""
+        self.submit('fleet', self.load_fleet, done=self.fleet_loaded, message="Chargement du registre des jets privés...")
+
+    def load_fleet(self):
+        """Lit le registre et récupère la flotte en vol (dans un thread de calcul)"""
+        jets_list = PrivateJets()
+        self.progress("Récupération des avions en vol...")
+        answer = self.planner.states()
+        return FlyingPlanes(answer["states"] if answer is not None else None, jets_list)
+
+    def fleet_loaded(self, fleet):
+        """Remplace la flotte par celle chargée en arrière-plan, et diffuse la différence"""
+        diff = FleetDiff(fleet.states.icao24.tolist(), self.flying_planes.states.icao24.tolist(), [])
+        self.flying_planes = fleet
+        self.plane_list = self.flying_planes.flying
+        self.record_states()
+        self.prep_plot_planes()
+        self.publish(str(len(fleet)) + " jets privés en vol", diff)
 
     def prep_plot_planes(self) :
         """Récupère les coordonnées de tous les avions à afficher en lat,long norme WGS 84"""
-        x = []
-        y = []
-        for pos in self.coord_list :
-            y.append(pos.lat)
-            x.append(pos.long)
-        self.plane_coord_list = (x,y)
+        states = self.flying_planes.states
+        self.selected = None
+        self.plane_coord_list = (states.lon,states.lat)
 
     def select_plane(self,icao):
         """Récupère les coordonnées d'un avion icao à afficher en lat,long norme WGS 84"""
-        self.plane_coord_list = (self.positions[icao].long,self.positions[icao].lat)
+        pos = self.flying_planes.select_plane(icao).pos
+        self.selected = icao
+        self.plane_coord_list = (pos.long,pos.lat)
 
         ### DEPRECATED 
         # selected = Plane("000000","ERROR","ID",Position(0,0))
@@ -60,31 +169,171 @@ class Controler(ControlerBase):
         #         selected = plane
         # self.plane_coord_list = (selected.pos.lat,selected.pos.long)
 
-    def compute_route(self,icao): 
-        """Calcule la route correspondant à l'avion icao, et stocke les positions succesives et la longueur de la route"""   
-        plane = self.flying_planes.select_plane(icao)
-        route = Route()
-        route.findRouteREST(plane)
+    def choose_plane(self,icao,label=None):
+        """Sélectionne l'avion icao (liste ou clic sur la carte) et lance le calcul de sa route en arrière-plan"""
+        self.select_plane(icao)
+        self.clear_route()
+        self.clear_co2()
+        self.refreshAll("Sélectionné : " + (label if label is not None else str(self.flying_planes.select_plane(icao))))
+        self.compute_route_async(icao)
+
+    def pick_plane(self,lat,lon,radius):
+        """Renvoie l'ICAO de l'avion le plus proche du point (clic sur la carte), None s'il n'y en a pas à moins de radius km"""
+        icaos, d = self.flying_planes.nearest(lat, lon)
+        if icaos and d[0] <= radius :
+            return icaos[0]
+        return None
+
+    def set_viewport(self,extent):
+        """Mémorise la partie visible de la carte (lon_min, lon_max, lat_min, lat_max), None pour la carte entière"""
+        self.viewport = extent
+
+    def region(self):
+        """Partie visible de la carte élargie de CULL_MARGIN (lon_min, lon_max, lat_min, lat_max, lon_min > lon_max si elle passe 
+        l'antiméridien), None si la carte est entière"""
+        if self.viewport is None :
+            return None
+        lon_min, lon_max, lat_min, lat_max = self.viewport
+        if lon_max - lon_min + 2 * CULL_MARGIN >= 360 :
+            lon_min, lon_max = -180.0, 180.0
+        else :
+            lon_min = (lon_min - CULL_MARGIN + 180) % 360 - 180
+            lon_max = (lon_max + CULL_MARGIN + 180) % 360 - 180
+        return lon_min, lon_max, max(lat_min - CULL_MARGIN, -90), min(lat_max + CULL_MARGIN, 90)
+
+    def visible(self):
+        """Lignes des avions à afficher dans la partie visible de la carte (avec une marge), toutes si la carte est entière"""
+        region = self.region()
+        if region is None :
+            return slice(None)
+        return self.flying_planes.inside(*region)
+
+    def fetch_route(self,icao):
+        """Récupère la route de l'avion icao, sans modifier le contrôleur (utilisable dans un thread de calcul)"""
+        route = Route(icao)
+        route.findRouteREST(Plane(icao))
+        return route
+
+    def set_route(self,route):
+        """Stocke les positions succesives et la longueur d'une route"""
+        self.route = route
         self.route_coord = route.unpack_coord()
         self.route_length = route.length
+        self.route_stats = route.stats()
+        self.route_legs = route.legs(str(self.flying_planes.jets_list.typecodes([route.icao])[0]))
+        if self.store is not None :
+            # Simplification et écriture de la route dans un thread de calcul, hors du thread de l'interface
+            self.records = [future for future in self.records if not future.done()]
+            self.records.append(self.executor.submit(self.store.recordRoute, route))
+
+    def route_display(self,km_per_pixel):
+        """Positions de la route courante à afficher, simplifiées selon l'échelle de la carte (voir Route.lod)"""
+        if self.route is None :
+            return self.route_coord
+        return self.route.lod(km_per_pixel)
+
+    def compute_route(self,icao): 
+        """Calcule la route correspondant à l'avion icao, et stocke les positions succesives et la longueur de la route"""   
+        self.set_route(self.fetch_route(icao))
+
+    def compute_route_async(self,icao):
+        """Calcule la route de l'avion icao en arrière-plan, en remplaçant le calcul en cours pour un autre avion"""
+        self.submit('route', self.fetch_route, icao, done=self.route_computed, message="Calcul de la route de " + icao + "...")
 
-    def refresh_planes(self):
-        """Rappelle l'OpenSkyAPI pour mettre à jour la liste des avions en vols actuellement"""
-        self.flying_planes = FlyingPlanes()
-        self.coord_list = self.flying_planes.coordinates()
+    def route_computed(self,route):
+        self.set_route(route)
+        self.refreshAll("Route de " + route.icao + " : " + "{:.2f}".format(route.length) + " km, " + str(len(self.route_legs)) + " vol(s)")
+
+    def refresh_planes(self, snapshot=None):
+        """Rappelle l'OpenSkyAPI pour mettre à jour la liste des avions en vols actuellement, par différence avec la précédente
+        (sans relire le registre ni recréer les avions), et renvoie cette différence
+        snapshot : instantané déjà filtré par FlyingPlanes.filter (par exemple en arrière-plan)"""
+        if snapshot is None :
+            snapshot = self.fetch_states()
+        diff = self.flying_planes.apply(*snapshot)
         self.plane_list = self.flying_planes.flying
-        self.positions = self.flying_planes.positions
-        self.route_coord = ([],[])
-        self.refresh_planes_flag = False
+        self.record_states()
+        if self.live and self.selected is not None and self.flying_planes.index(self.selected) is not None :
+            # En mode direct, l'avion sélectionné et sa route restent affichés tant qu'il est en vol
+            self.select_plane(self.selected)
+        else :
+            self.route = None
+            self.route_coord = ([],[])
+            self.prep_plot_planes()
+        return diff
+
+    def refresh_planes_async(self):
+        """Rafraîchit la liste des avions en arrière-plan, puis diffuse la différence"""
+        if len(self.flying_planes.jets_list.registry) == 0 :
+            self.start()
+            return
+        self.submit('fleet', self.fetch_states, done=self.planes_refreshed, message="Rafraichissement de la liste des avions...")
+
+    def fetch_states(self):
+        """Récupère un instantané par la requête la moins coûteuse (voir QueryPlanner) et le filtre sur le registre (dans un thread de calcul) :
+        requête globale ou jets connus, ou zone visible de la carte zoomée en mode régional ; requête de l'API Python en cas d'échec"""
+        fleet = self.flying_planes
+        region = self.region() if self.regional else None
+        if region is not None and region[1] - region[0] >= 360 :
+            # Zone faisant le tour du globe : requête globale
+            region = None
+        share = len(fleet.inside(*region)) / len(fleet) if region is not None and len(fleet) else None
+        answer = self.planner.states(fleet.states.icao24.tolist(), region, share)
+        return fleet.filter(answer["states"] if answer is not None else None)
+
+    def planes_refreshed(self, snapshot):
+        diff = self.refresh_planes(snapshot)
+        self.publish("Listes des avions rafraichie : " + str(diff) + " (" + self.planner.describe() + ")", diff)
+
+    def set_live(self, live, interval=None):
+        """Active ou désactive le mode direct : OpenSky est interrogé toutes les live_interval secondes (poll, appelé par l'interface)
+        et les positions sont extrapolées entre deux interrogations (animate)"""
+        self.live = live
+        if interval is not None :
+            self.live_interval = interval
+        self.refreshAll("Mode direct " + ("activé, rafraichissement toutes les " + str(self.live_interval) + " s" if live else "désactivé"))
+
+    def poll(self):
+        """Interrogation périodique du mode direct, ignorée si le rafraichissement précédent n'est pas terminé"""
+        if not self.busy('fleet') :
+            self.refresh_planes_async()
+
+    def animate(self, t=None):
+        """Met à jour les coordonnées à afficher avec les positions extrapolées à l'instant t (par défaut maintenant)"""
+        lon, lat = self.flying_planes.extrapolate(t)
+        if self.selected is None :
+            self.plane_coord_list = (lon,lat)
+            return
+        k = self.flying_planes.index(self.selected)
+        if k is not None :
+            self.plane_coord_list = (lon[k],lat[k])
+
+    def record_states(self):
+        """Enregistre l'instantané courant dans l'historique, s'il y en a un"""
+        if self.store is not None :
+            self.store.recordStates(self.flying_planes.states)
+
+    def shutdown(self):
+        wait(self.records)
+        super().shutdown()
+        if self.store is not None :
+            self.store.flush()
 
     def clear_route(self):
-        """Réinitialise la route courante"""
+        """Réinitialise la route courante, et abandonne son calcul s'il est en cours"""
+        self.cancel('route')
+        self.route = None
         self.route_coord = [],[]
         self.route_length = 0
+        self.route_stats = dict()
+        self.route_legs = None
 
     def compute_co2(self):
-        """Calcule le bilan carbone de la route courante, en partant sur la base de 4,9 kg CO2 / km pour un Bombardier Global Express"""
-        if self.route_length :
+        """Calcule le bilan carbone de la route courante selon le type d'avion et les phases de vol (voir EmissionModel)
+        Seuls les vols comptent (le roulage au sol est écarté) ; une route sans vol reconnu compte 4,9 kg CO2 / km (Bombardier Global Express)"""
+        if self.route_legs is not None and len(self.route_legs) :
+            self.co2 = self.route_legs.total()[1]
+        elif self.route_length :
             self.co2 = convert_CO2(self.route_length)
         else :
             self.co2 = 0
@@ -0,0 +1,149 @@
+####################################################################
+### MODELE D'EMISSIONS PAR TYPE D'AVION
+### 18.10.2026
+### Nestor Laborier
+####################################################################
+
+### Module base de données (types d'avions doc8643)
+from buildDB import *
+
+# Facteur d'émission du kérosène (kg CO2 par kg de carburant brûlé)
+CO2_PER_FUEL = 3.16
+
+# Phases de vol ; un segment dont la pente dépasse PHASE_GRADIENT mètres d'altitude par km parcouru est en montée (ou en descente)
+PHASES = ['climb', 'cruise', 'descent']
+PHASE_GRADIENT = 10
+
+# Consommation par km en montée et en descente, relativement à la croisière
+PHASE_FACTORS = {'climb' : 1.7, 'cruise' : 1.0, 'descent' : 0.45}
+
+# Consommation en croisière (kg de carburant par km) des principaux jets d'affaires : ordres de grandeur tirés des débits horaires
+# moyens publiés par les constructeurs et opérateurs, rapportés à la vitesse de croisière
+CRUISE_BURN = {
+    'C510' : 0.49, 'C525' : 0.52, 'C25A' : 0.55, 'C25B' : 0.58, 'PRM1' : 0.62, 'E55P' : 0.66, 'LJ45' : 0.78, 'C56X' : 0.83,
+    'LJ60' : 0.87, 'C680' : 0.90, 'C68A' : 0.86, 'CL30' : 0.94, 'G280' : 0.98, 'GALX' : 0.97, 'C700' : 0.99, 'C750' : 1.02,
+    'F2TH' : 1.03, 'CL60' : 1.11, 'F900' : 1.14, 'FA7X' : 1.28, 'FA8X' : 1.32, 'GLF4' : 1.48, 'GL5T' : 1.55, 'GLF5' : 1.56,
+    'GLEX' : 1.64, 'GLF6' : 1.71, 'GL7T' : 1.75,
+}
+
+# Consommation par défaut : 4,9 kg CO2e / km, la valeur d'un Bombardier Global Express (ancienne constante de convert_CO2)
+DEFAULT_BURN = 4.9 / CO2_PER_FUEL
+
+# Niveaux de repli, du plus précis au plus grossier
+BASIS = ['type', 'classe', 'turbulence', 'défaut']
+
+# Modèle partagé, construit au premier usage
+_emission_model = None
+
+
+class EmissionModel :
+    """Table de consommation (kg de carburant par km) par type d'avion (désignateur OACI) et par phase de vol, précalculée en tableau numpy
+    pour tous les types de doc8643, avec repli pour les types sans consommation connue : moyenne des types connus de même description
+    (ex. 'L2J') et catégorie de turbulence, puis de même catégorie de turbulence, puis valeur par défaut"""
+
+    def __init__(self, burn=CRUISE_BURN, types=None) :
+        if types is None :
+            types = aircraftTypes()
+        self.burn = dict(burn)
+        self.types = types
+
+        classes, wakes = dict(), dict()
+        for code, value in burn.items() :
+            if code in types :
+                description, wake = types[code]
+                classes.setdefault((description, wake), []).append(value)
+                wakes.setdefault(wake, []).append(value)
+        self.class_burn = {key : float(np.mean(values)) for key, values in classes.items()}
+        self.wake_burn = {key : float(np.mean(values)) for key, values in wakes.items()}
+
+        # Table précalculée : désignateurs triés, consommations par phase et niveau de repli ; dernière ligne pour les types inconnus
+        self.codes = np.array(sorted(set(types) | set(burn)), dtype=str)
+        cruise, basis = zip(*[self.cruiseBurn(code) for code in self.codes.tolist()]) if len(self.codes) else ((), ())
+        factors = np.array([PHASE_FACTORS[phase] for phase in PHASES])
+        self.table = np.append(np.array(cruise, dtype=float), DEFAULT_BURN)[:, None] * factors[None, :]
+        self.basis = np.append(np.array([BASIS.index(b) for b in basis], dtype=int), BASIS.index('défaut'))
+
+    def __repr__(self) :
+        counts = np.bincount(self.basis[:-1], minlength=len(BASIS))
+        return f"{len(self.codes)} types : " + ', '.join(f"{counts[k]} par {basis}" for k, basis in enumerate(BASIS))
+
+    def cruiseBurn(self, code) :
+        """Consommation en croisière (kg/km) d'un type d'avion, et le niveau de repli utilisé"""
+        if code in self.burn :
+            return self.burn[code], 'type'
+        description, wake = self.types.get(code, (None, None))
+        if (description, wake) in self.class_burn :
+            return self.class_burn[(description, wake)], 'classe'
+        if wake in self.wake_burn :
+            return self.wake_burn[wake], 'turbulence'
+        return DEFAULT_BURN, 'défaut'
+
+    def rows(self, codes) :
+        """Lignes de la table pour un tableau de désignateurs, par dichotomie (types inconnus : dernière ligne, par défaut)"""
+        codes = np.asarray(codes, dtype=str)
+        if not len(self.codes) :
+            return np.zeros(len(codes), dtype=int)
+        positions = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        return np.where(self.codes[positions] == codes, positions, len(self.codes))
+
+    def co2(self, codes, distances) :
+        """Émissions (kg CO2e) d'un ensemble de vols, en une opération sur tableaux :
+        codes (n désignateurs) et distances (n, 3) parcourues en montée, croisière et descente (km)"""
+        return CO2_PER_FUEL * np.einsum('ij,ij->i', self.table[self.rows(codes)], np.asarray(distances, dtype=float).reshape(-1, len(PHASES)))
+
+    def basisOf(self, codes) :
+        """Niveau de repli utilisé pour chaque désignateur"""
+        return [BASIS[k] for k in self.basis[self.rows(codes)]]
+
+
+def emissionModel() :
+    """Modèle d'émissions partagé, construit au premier usage"""
+    global _emission_model
+    if _emission_model is None :
+        _emission_model = EmissionModel()
+    return _emission_model
+
+
+def flightPhases(lengths, altitudes) :
+    """Phase de vol de chaque segment d'une suite de points (indice dans PHASES), d'après la pente de l'altitude (m par km)
+    Une altitude inconnue ou un segment de longueur nulle compte comme croisière"""
+    climb = np.diff(np.asarray(altitudes, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore') :
+        slope = climb / np.asarray(lengths, dtype=float)
+    phases = np.full(len(climb), PHASES.index('cruise'))
+    phases[slope > PHASE_GRADIENT] = PHASES.index('climb')
+    phases[slope < -PHASE_GRADIENT] = PHASES.index('descent')
+    return phases
+
+
+### PROCEDURES DE TEST
+
+def testEmissions() :
+    """Affiche la table précalculée, les niveaux de repli de quelques types, et un vol type de 1000 km par phase"""
+    model = emissionModel()
+    print(model)
+    codes = ['GLEX', 'C56X', 'E50P', 'B738', 'ZZZZ', '']
+    distances = np.tile([150.0, 700.0, 150.0], (len(codes), 1))
+    for code, basis, co2 in zip(codes, model.basisOf(codes), model.co2(codes, distances)) :
+        print(f"{code:4s} | {basis:10s} | {co2:8.0f} kg CO2e pour 1000 km (ancienne constante : {4.9 * 1000:.0f})")
+
+def benchEmissions(n=1000000) :
+    """Mesure le calcul des émissions de n vols en une opération sur tableaux, contre une boucle vol par vol"""
+    model = emissionModel()
+    rng = np.random.default_rng(0)
+    codes = rng.choice(np.array(list(CRUISE_BURN) + ['B738', 'ZZZZ']), n)
+    distances = rng.uniform(0, 800, (n, len(PHASES)))
+    start = time.perf_counter()
+    batched = model.co2(codes, distances)
+    elapsed = time.perf_counter() - start
+
+    m = min(n, 100000)
+    start = time.perf_counter()
+    looped = [CO2_PER_FUEL * model.cruiseBurn(code)[0] * sum(PHASE_FACTORS[p] * d for p, d in zip(PHASES, row))
+              for code, row in zip(codes[:m].tolist(), distances[:m].tolist())]
+    per_plane = (time.perf_counter() - start) * n / m
+    print(f"{n} vols : {elapsed*1000:.1f} ms en tableaux, ~{per_plane*1000:.0f} ms vol par vol, écart max {np.max(np.abs(batched[:m] - looped)):.2e} kg")
+
+
+if __name__ == '__main__' :
+    testEmissions()
@@ -16,11 +16,16 @@ from link import *
 # Module de construction de la base de données pour une mise à jour possible des modèles de jets et des immatriculations
 from buildDB import *
 
+### Module du modèle d'émissions
+from emissions import *
+
 
 ### DEFINITION DE LA CLASSE POSITION
 
 class Position : 
-    """Classe des positions, en latitude/longitude, selon la norme WGS84"""
+    """Classe des positions, en latitude/longitude, selon la norme WGS84 (valeur compacte, sans __dict__)"""
+
+    __slots__ = ('lat', 'long')
     
     def __init__(self,lat=0,long=0):
         self.lat   = lat
@@ -52,9 +57,9 @@ class Position :
 class Plane :
     """Classe d'un avion, définie par son ICAO, sa position, son modèle, son immatriculation ID, et son pays d'origine"""
     
-    def __init__(self, icao="unknown", model="unknown", country="unknown", ID="unknown", pos=Position(0,0)):
+    def __init__(self, icao="unknown", model="unknown", country="unknown", ID="unknown", pos=None):
         self.icao   = icao
-        self.pos    = pos
+        self.pos    = pos if pos is not None else Position(0,0)
         self.model  = model
         self.ID     = ID
         self.country= country
@@ -64,54 +69,477 @@ class Plane :
 
     def findRouteLinear(self,inter) :
         """
-        LEGACY : Trouve la route suivie par l'avion décomposée par intervalle, de manière itérative
-        Limitations : Les requetes OpenSkyAPI ne peuvent être effectuées que toutes les 10 secondes min
+        LEGACY : Trouve la route suivie par l'avion décomposée par intervalle, en remontant le temps jusqu'à perdre l'avion
+        Les requêtes passent par le planificateur de StateHistory (limite de débit OpenSky) et son cache
         """
-        
-        currentTime = time.time()
-        r = Route(self.icao)
+        history = StateHistory(self.icao)
+        now = int(time.time())
+        # Pas d'au moins une résolution : deux instants successifs ne tombent jamais dans la même case du cache
+        step = max(inter, HISTORY_RESOLUTION)
+        times = []
+        k = 0
+        while history.stateAt(now - k*step) is not None :
+            times.append(now - k*step)
+            k += 1
+        return history.route(times)
 
-        api = OSapi()
-        state = api.getOldState(self.icao,0)
-        k = 1
-
-        while state != None :
-            # print(state)
-            if state.states != [] :
-                pos = Position(state.states[0].latitude,state.states[0].longitude)
-                r.addPos(pos)
-            time.sleep(11)
-            state = api.getOldState(self.icao,k*(inter+11))
-            k+=1
-
-        return r
+    def findRouteHistory(self) :
+        """Reconstruit la route de l'avion depuis son départ, par dichotomie puis échantillonnage adaptatif des vecteurs d'états passés"""
+        return StateHistory(self.icao).reconstruct()
 
     def findRouteREST(self):
         """Récupère la route courante suivie par l'avion actif, par une requete REST, directe et plus rapide"""
-        rest = RESTapi()
-        raw_route = rest.getCurrentRoute(self.icao)
         route = Route(self.icao)
-        for p in raw_route : 
-            route.addPos(Position(p[1],p[2]))
+        route.findRouteREST(self)
         return route
 
 
     def findOrigin(self) : 
-        """DEPRECATED : Trouve la position de départ de l'avion actif par dichotomie
-        en considérant un trajet de maximum 18h, il nous faut une profondeur récursive de 16, 
-        soit ~16*10 = 2min40sec pour un requete à la seconde près"""
-        pass
+        """Trouve la position de départ de l'avion actif par dichotomie
+        en considérant un trajet de maximum 18h, il nous faut une profondeur de 13 à la résolution de 10 secondes, 
+        soit ~13*11 = 2min20sec de requêtes"""
+        history = StateHistory(self.icao)
+        departure = history.findDeparture()
+        state = history.stateAt(departure)
+        if state is None :
+            return Position(None, None)
+        return Position(state.latitude, state.longitude)
+
+
+### RECONSTRUCTION HISTORIQUE DES ROUTES
+
+# Résolution des vecteurs d'états historiques OpenSky (s), et durée maximale d'un vol recherché (s)
+HISTORY_RESOLUTION = 10
+HISTORY_MAX_FLIGHT = 18 * 3600
+
+class StateHistory :
+    """Reconstruction de l'historique d'un avion en un minimum de requêtes datées : dichotomie sur l'heure de départ, 
+    puis échantillonnage adaptatif, resserré là où le cap change. Les requêtes sont cadencées par le planificateur de OSapi, 
+    et leurs réponses (datées, donc immuables) gardées par son cache disque, partagé par toutes les reconstructions"""
+
+    def __init__(self, icao, api=None) :
+        self.icao = icao
+        self.api = api if api is not None else OSapi()
+        self.queries = 0            # Nombre de requêtes réellement envoyées (hors cache)
+
+    def stateAt(self, t) :
+        """Vecteur d'états de l'avion en vol à l'instant t (arrondi à la résolution), None s'il n'était pas en vol ou pas visible"""
+        t = int(t) // HISTORY_RESOLUTION * HISTORY_RESOLUTION
+        answer = self.api.cachedStates(t, self.icao)
+        if answer is None :
+            answer = self.api.getScheduledState(t, self.icao)
+            self.queries += 1
+            # Pas de réponse (erreur, limite de débit) : rien n'a été mis en cache
+            if answer is None :
+                return None
+        states = [s for s in answer.states if not s.on_ground and s.latitude is not None]
+        return states[0] if states else None
+
+    def findDeparture(self, t_end=None, max_flight=HISTORY_MAX_FLIGHT) :
+        """Recherche par dichotomie le premier instant où l'avion est en vol, sur les max_flight secondes précédant t_end"""
+        low = int(t_end if t_end is not None else time.time()) - max_flight
+        high = low + max_flight
+        if self.stateAt(high) is None :
+            return high
+        while high - low > HISTORY_RESOLUTION :
+            middle = (low + high) // 2
+            if self.stateAt(middle) is None :
+                low = middle
+            else :
+                high = middle
+        return high
+
+    def sample(self, t_start, t_end, min_step=60, max_step=1800, heading_tolerance=10) :
+        """Choisit les instants à interroger entre t_start et t_end : un point au moins tous les max_step secondes, 
+        et subdivision des intervalles dont le cap varie de plus de heading_tolerance degrés, jusqu'à min_step secondes"""
+        times = set(range(int(t_start), int(t_end), max_step)) | {int(t_end)}
+        bounds = sorted(times)
+        stack = list(zip(bounds[:-1], bounds[1:]))
+        while stack :
+            a, b = stack.pop()
+            if b - a <= min_step :
+                continue
+            sa, sb = self.stateAt(a), self.stateAt(b)
+            if sa is not None and sb is not None and sa.true_track is not None and sb.true_track is not None :
+                turn = abs((sb.true_track - sa.true_track + 180) % 360 - 180)
+                if turn <= heading_tolerance :
+                    continue
+            middle = (a + b) // 2
+            times.add(middle)
+            stack += [(a, middle), (middle, b)]
+        return sorted(times)
+
+    def route(self, times) :
+        """Construit la route de l'avion aux instants donnés, dans l'ordre chronologique"""
+        r = Route(self.icao)
+        for t in sorted(times) :
+            state = self.stateAt(t)
+            if state is not None :
+                r.addPos(Position(state.latitude, state.longitude))
+        return r
+
+    def reconstruct(self, t_start=None, t_end=None, **sampling) :
+        """Reconstruit la route de l'avion entre t_start (par défaut son heure de départ) et t_end (par défaut maintenant)"""
+        t_end = int(t_end if t_end is not None else time.time())
+        if t_start is None :
+            t_start = self.findDeparture(t_end)
+        return self.route(self.sample(t_start, t_end, **sampling))
+
+
+### CALCUL VECTORISE DES LONGUEURS DE ROUTES
+
+# Ellipsoïde WGS-84 (demi grand axe en km, aplatissement) et rayon moyen terrestre (km)
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+EARTH_RADIUS = 6371.0088
+
+# Méthode de calcul des longueurs de route par défaut : 'haversine', 'andoyer' ou 'geodesic'
+LENGTH_MODE = 'andoyer'
+
+# Longueur (km) au-delà de laquelle la formule d'Andoyer se dégrade à l'approche des antipodes : 
+# ces segments, absents des traces réelles, sont calculés par la géodésique exacte
+ANDOYER_MAX_LENGTH = 10000
+
+def centralAngle(lat1, lon1, lat2, lon2) :
+    """Angle au centre (radians) entre deux séries de points donnés en radians, par la formule de haversine"""
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+def segmentLengths(lat, lon, mode=LENGTH_MODE) :
+    """Calcule en une passe vectorisée les longueurs (km) des segments successifs d'une suite de points (degrés, norme WGS-84)
+    Bornes d'erreur, relativement à la géodésique exacte :
+    - 'haversine' : sphère de rayon moyen, erreur relative jusqu'à 0,6 % (selon le cap et la latitude)
+    - 'andoyer'   : formule d'Andoyer-Lambert sur l'ellipsoïde, correction de l'aplatissement au premier ordre, 
+                    erreur relative mesurée sous 2e-6 pour les segments de moins de ANDOYER_MAX_LENGTH km (ceux des traces) ; 
+                    elle croît ensuite jusqu'à une dizaine de km près des antipodes, d'où le calcul exact des segments plus longs
+    - 'geodesic'  : géodésique exacte de Karney (geopy), segment par segment, lente et réservée à la vérification"""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if len(lat) < 2 :
+        return np.zeros(0)
+
+    if mode == 'geodesic' :
+        return np.array([distance.geodesic((lat[k], lon[k]), (lat[k+1], lon[k+1])).km for k in range(len(lat) - 1)])
+
+    phi = np.radians(lat)
+    lam = np.radians(lon)
+    if mode == 'haversine' :
+        return EARTH_RADIUS * centralAngle(phi[:-1], lam[:-1], phi[1:], lam[1:])
+    if mode != 'andoyer' :
+        raise ValueError("Méthode de calcul de longueur inconnue : " + str(mode))
+
+    # Andoyer-Lambert : angle au centre entre latitudes réduites, puis correction de l'aplatissement
+    beta = np.arctan((1 - WGS84_F) * np.tan(phi))
+    sigma = centralAngle(beta[:-1], lam[:-1], beta[1:], lam[1:])
+    P = (beta[:-1] + beta[1:]) / 2
+    Q = (beta[1:] - beta[:-1]) / 2
+    with np.errstate(divide='ignore', invalid='ignore') :
+        X = (sigma - np.sin(sigma)) * np.sin(P) ** 2 * np.cos(Q) ** 2 / np.cos(sigma / 2) ** 2
+        Y = (sigma + np.sin(sigma)) * np.cos(P) ** 2 * np.sin(Q) ** 2 / np.sin(sigma / 2) ** 2
+        lengths = WGS84_A * (sigma - WGS84_F / 2 * (X + Y))
+    lengths = np.where(sigma > 0, lengths, 0.0)
+    for k in np.flatnonzero(lengths > ANDOYER_MAX_LENGTH) :
+        lengths[k] = distance.geodesic((lat[k], lon[k]), (lat[k+1], lon[k+1])).km
+    return lengths
+
+@timed('geo.length')
+def routeLength(lat, lon, mode=LENGTH_MODE) :
+    """Longueur totale (km) d'une suite de points, en ignorant les positions invalides (None ou nan)"""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    return float(segmentLengths(lat[valid], lon[valid], mode).sum())
+
+
+### EXTRAPOLATION DES POSITIONS ENTRE DEUX INSTANTANES
+
+# Durée maximale d'extrapolation (s) : au-delà, la position n'est plus avancée
+DEAD_RECKONING_MAX = 120
+
+def deadReckoning(lat, lon, velocity, track, elapsed) :
+    """Avance en bloc des positions (degrés) sur un grand cercle, à vitesse (m/s) et cap vrai (degrés) constants pendant elapsed secondes
+    La durée est bornée à [0, DEAD_RECKONING_MAX], une vitesse, un cap ou une durée manquant (nan) laisse la position inchangée"""
+    phi = np.radians(np.asarray(lat, dtype=float))
+    lam = np.radians(np.asarray(lon, dtype=float))
+    theta = np.radians(np.asarray(track, dtype=float))
+    d = np.clip(elapsed, 0, DEAD_RECKONING_MAX) * np.asarray(velocity, dtype=float) / 1000 / EARTH_RADIUS
+    d = np.where(np.isfinite(d) & np.isfinite(theta), d, 0.0)
+    theta = np.nan_to_num(theta)
+
+    sin_phi = np.sin(phi) * np.cos(d) + np.cos(phi) * np.sin(d) * np.cos(theta)
+    phi2 = np.arcsin(np.clip(sin_phi, -1, 1))
+    lam2 = lam + np.arctan2(np.sin(theta) * np.sin(d) * np.cos(phi), np.cos(d) - np.sin(phi) * sin_phi)
+    return np.degrees(phi2), (np.degrees(lam2) + 180) % 360 - 180
+
+
+### INDEX SPATIAL DES AVIONS EN VOL
+
+# Taille des cellules de la grille (degrés)
+GRID_STEP = 2.0
+
+def boundingBox(lat, lon, radius) :
+    """Rectangle (lon_min, lon_max, lat_min, lat_max), en degrés, contenant le cercle de rayon radius (km) autour d'un point
+    lon_min > lon_max si le rectangle traverse l'antiméridien ; toutes les longitudes si le cercle contient un pôle"""
+    delta = np.degrees(radius / EARTH_RADIUS)
+    lat_min, lat_max = lat - delta, lat + delta
+    if lat_min <= -90 or lat_max >= 90 or delta >= 90 :
+        return -180.0, 180.0, max(lat_min, -90.0), min(lat_max, 90.0)
+    dlon = np.degrees(np.arcsin(np.sin(np.radians(delta)) / np.cos(np.radians(lat))))
+    lon_min = (lon - dlon + 180) % 360 - 180
+    lon_max = (lon + dlon + 180) % 360 - 180
+    return lon_min, lon_max, lat_min, lat_max
+
+
+class SpatialGrid :
+    """Index spatial d'un instantané : grille régulière en latitude / longitude, les lignes des avions sont rangées par cellule
+    (tri unique à la construction), chaque ligne de cellules d'un rectangle est alors une tranche contiguë de l'index"""
+
+    def __init__(self, lat, lon, step=GRID_STEP) :
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.step = step
+        self.rows = int(np.ceil(180 / step))
+        self.cols = int(np.ceil(360 / step))
+
+        valid = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lon))
+        cells = self.cell(self.lat[valid], self.lon[valid])
+        order = np.argsort(cells, kind='stable')
+        self.order = valid[order]               # Lignes des avions, rangées par cellule
+        self.starts = np.searchsorted(cells[order], np.arange(self.rows * self.cols + 1))
+
+    def __len__(self) :
+        return len(self.order)
+
+    def cell(self, lat, lon) :
+        r = np.clip(((lat + 90) // self.step).astype(int), 0, self.rows - 1)
+        c = np.clip(((lon + 180) // self.step).astype(int), 0, self.cols - 1)
+        return r * self.cols + c
+
+    def candidates(self, lon_min, lon_max, lat_min, lat_max) :
+        """Lignes des avions des cellules qui recouvrent le rectangle (sur-ensemble)"""
+        if lon_min > lon_max :
+            return np.concatenate([self.candidates(lon_min, 180.0, lat_min, lat_max), self.candidates(-180.0, lon_max, lat_min, lat_max)])
+        r0, c0 = divmod(int(self.cell(np.array(lat_min), np.array(lon_min))), self.cols)
+        r1, c1 = divmod(int(self.cell(np.array(lat_max), np.array(lon_max))), self.cols)
+        slices = [self.order[self.starts[r * self.cols + c0] : self.starts[r * self.cols + c1 + 1]] for r in range(r0, r1 + 1)]
+        return np.concatenate(slices) if slices else np.zeros(0, dtype=int)
+
+    def bbox(self, lon_min, lon_max, lat_min, lat_max) :
+        """Lignes des avions situés dans le rectangle (lon_min > lon_max s'il traverse l'antiméridien)"""
+        k = self.candidates(lon_min, lon_max, lat_min, lat_max)
+        lat, lon = self.lat[k], self.lon[k]
+        inside_lon = (lon >= lon_min) & (lon <= lon_max) if lon_min <= lon_max else (lon >= lon_min) | (lon <= lon_max)
+        return np.sort(k[inside_lon & (lat >= lat_min) & (lat <= lat_max)])
+
+    def distances(self, k, lat, lon) :
+        """Distances (km, sphère de rayon moyen) entre le point et les avions des lignes k"""
+        return EARTH_RADIUS * centralAngle(np.radians(self.lat[k]), np.radians(self.lon[k]), np.radians(lat), np.radians(lon))
+
+    def within(self, lat, lon, radius) :
+        """Lignes des avions à moins de radius km du point (par exemple un aéroport) et leurs distances, de la plus proche à la plus lointaine"""
+        k = self.candidates(*boundingBox(lat, lon, radius))
+        d = self.distances(k, lat, lon)
+        keep = d <= radius
+        k, d = k[keep], d[keep]
+        order = np.argsort(d, kind='stable')
+        return k[order], d[order]
+
+    def nearest(self, lat, lon, n=1) :
+        """Lignes des n avions les plus proches du point et leurs distances (km) : recherche dans des cercles de rayon croissant"""
+        n = min(n, len(self))
+        radius = self.step * 111.0
+        while True :
+            k, d = self.within(lat, lon, radius)
+            if len(k) >= n or radius >= np.pi * EARTH_RADIUS :
+                return k[:n], d[:n]
+            radius *= 2
+
+
+### DECOUPAGE DES TRACES EN VOLS
+
+# Un trou de plus de LEG_GAP secondes entre deux points sous LEG_LOW_ALTITUDE mètres (atterrissage et décollage non observés), 
+# ou de plus de LEG_MAX_GAP secondes à toute altitude, sépare deux vols
+LEG_GAP = 15 * 60
+LEG_MAX_GAP = 4 * 3600
+LEG_LOW_ALTITUDE = 1500
+
+def segmentTracks(track, t, lat, lon, alt, ground, mode=LENGTH_MODE) :
+    """Découpe en une passe vectorisée des traces mises bout à bout (track : numéro de trace de chaque point, points rangés par trace 
+    puis par instant) en vols : suites de points en l'air, coupées aux passages sol / air et aux trous sans atterrissage observé
+    Les points au sol (roulage) et les positions invalides sont écartés ; un vol compte au moins deux points
+    Renvoie pour chaque vol : trace, indices du premier et du dernier point, longueur (km) et distances en montée, croisière 
+    et descente (km, voir flightPhases)"""
+    t = np.asarray(t, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    track, t, lat, lon = np.asarray(track)[valid], t[valid], lat[valid], lon[valid]
+    alt, ground = np.asarray(alt, dtype=float)[valid], np.asarray(ground, dtype=bool)[valid]
+    n = len(valid)
+
+    # Points qui commencent une nouvelle suite : nouvelle trace, passage sol / air, ou trou (une altitude inconnue compte comme basse)
+    cut = np.ones(n, dtype=bool)
+    if n > 1 :
+        dt = np.diff(t)
+        low = ~(alt[1:] >= LEG_LOW_ALTITUDE) & ~(alt[:-1] >= LEG_LOW_ALTITUDE)
+        gap = (dt > LEG_MAX_GAP) | ((dt > LEG_GAP) & low)
+        cut[1:] = (track[1:] != track[:-1]) | (ground[1:] != ground[:-1]) | gap
+    starts = np.flatnonzero(cut)
+    ends = np.append(starts[1:], n)
+    keep = ~ground[starts] & (ends - starts >= 2)
+    starts, ends = starts[keep], ends[keep]
+
+    # Longueurs cumulées des segments internes aux suites, par phase : la longueur d'un vol est une différence de deux cumuls
+    lengths = segmentLengths(lat, lon, mode) if n > 1 else np.zeros(0)
+    inside = np.where(~cut[1:], lengths, 0.0)
+    phase = flightPhases(lengths, alt)
+    by_phase = np.zeros((n, len(PHASES)))
+    by_phase[np.arange(n - 1), phase] = inside if n > 1 else 0
+    cumulated = np.concatenate([np.zeros((1, len(PHASES))), np.cumsum(by_phase[:-1], axis=0)]) if n else np.zeros((0, len(PHASES)))
+    phases = cumulated[ends - 1] - cumulated[starts]
+    before = np.maximum(starts - 1, 0)
+    after = np.minimum(ends, n - 1)
+    return dict(track=track[starts], first=valid[starts], last=valid[ends - 1], t_start=t[starts], t_end=t[ends - 1],
+                distance=phases.sum(axis=1), phases=phases,
+                takeoff=(starts > 0) & (track[before] == track[starts]) & ground[before],
+                landing=(ends < n) & (track[after] == track[starts]) & ground[after])
+
+
+class FlightLegs :
+    """Vols (du décollage à l'atterrissage) d'un ensemble de traces, en colonnes : avion, type, instants de début et de fin, durée (s), 
+    distance (km) totale et par phase, émissions (kg CO2e, voir EmissionModel), et si le décollage / l'atterrissage ont été observés"""
+
+    def __init__(self, icao, legs, types=None, model=None) :
+        """icao, types : code ICAO et désignateur du type d'avion de chaque trace (types inconnus par défaut)"""
+        model = model if model is not None else emissionModel()
+        self.icao = np.asarray(icao, dtype=str).reshape(-1)[legs['track']]
+        self.typecode = np.asarray(types if types is not None else [''] * len(icao), dtype=str).reshape(-1)[legs['track']]
+        self.track = legs['track']
+        self.first, self.last = legs['first'], legs['last']
+        self.t_start, self.t_end = legs['t_start'], legs['t_end']
+        self.duration = self.t_end - self.t_start
+        self.distance = legs['distance']
+        self.phases = legs['phases']
+        self.co2 = model.co2(self.typecode, self.phases)
+        self.takeoff, self.landing = legs['takeoff'], legs['landing']
+
+    def __len__(self) :
+        return len(self.distance)
+
+    def __repr__(self) :
+        return '\n'.join(f"{leg['icao']} | {leg['distance']:8.1f} km | {(leg['duration'] or 0) / 60:6.0f} min | {leg['co2']:8.0f} kg CO2e"
+                         for leg in self.rows())
+
+    @classmethod
+    @timed('route.legs')
+    def fromRoutes(cls, routes, types=None, mode=LENGTH_MODE) :
+        """Découpe en vols un ensemble de routes (liste de Route), en une seule passe sur toutes leurs positions
+        types : désignateurs des types d'avions des routes (par exemple PrivateJets.typecodes), pour le calcul des émissions"""
+        routes = list(routes)
+        tracks = [route.unpack_track() for route in routes]
+        sizes = [len(track[0]) for track in tracks]
+        columns = [np.concatenate([track[k] for track in tracks]) if tracks else np.zeros(0) for k in range(5)]
+        legs = segmentTracks(np.repeat(np.arange(len(routes)), sizes), *columns, mode=mode)
+        # Indices des points relatifs à leur route
+        offsets = np.concatenate([[0], np.cumsum(sizes)])[legs['track']] if len(routes) else 0
+        legs['first'], legs['last'] = legs['first'] - offsets, legs['last'] - offsets
+        return cls([route.icao for route in routes], legs, types)
+
+    def total(self) :
+        """Distance (km) et émissions (kg CO2e) de tous les vols"""
+        return float(self.distance.sum()), float(self.co2.sum())
+
+    def rows(self) :
+        """Vols sous forme de dictionnaires (pour l'affichage ou l'export JSON), instants et durées inconnus à None"""
+        known = lambda value : float(value) if np.isfinite(value) else None
+        return [dict(icao=str(self.icao[k]), typecode=str(self.typecode[k]), t_start=known(self.t_start[k]), t_end=known(self.t_end[k]), duration=known(self.duration[k]),
+                     distance=float(self.distance[k]), phases=dict(zip(PHASES, self.phases[k].tolist())), co2=float(self.co2[k]), takeoff=bool(self.takeoff[k]), landing=bool(self.landing[k]))
+                for k in range(len(self))]
+
+
+### SIMPLIFICATION DES ROUTES
+
+# Niveaux de détail des routes : tolérances (km) de simplification, de la plus fine à la plus grossière
+LOD_TOLERANCES = [0.05, 0.2, 1.0, 5.0, 20.0]
+
+def unitVectors(lat, lon) :
+    """Vecteurs unitaires 3D (n, 3) de points donnés en degrés"""
+    phi, lam = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)], axis=1)
+
+def simplifyTrack(lat, lon, tolerance) :
+    """Simplification de Ramer-Douglas-Peucker d'une suite de points (degrés) : renvoie les indices des points gardés, 
+    de sorte qu'aucun point écarté ne soit à plus de tolerance km (distance au grand cercle) de la route simplifiée
+    Tous les intervalles encore ouverts sont traités ensemble à chaque passe (vectorisé), les positions invalides sont écartées"""
+    valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    n = len(valid)
+    if n <= 2 :
+        return valid
+    xyz = unitVectors(np.asarray(lat, dtype=float)[valid], np.asarray(lon, dtype=float)[valid])
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+    starts, ends = np.array([0]), np.array([n - 1])
+    angle = tolerance / EARTH_RADIUS
+
+    while len(starts) :
+        inner = ends - starts - 1
+        open_ = inner > 0
+        starts, ends, inner = starts[open_], ends[open_], inner[open_]
+        if not len(starts) :
+            break
+        # Points intérieurs de tous les intervalles, mis bout à bout
+        owner = np.repeat(np.arange(len(starts)), inner)
+        first = np.cumsum(inner) - inner
+        index = starts[owner] + 1 + np.arange(len(owner)) - first[owner]
+
+        # Écart angulaire au grand cercle de la corde, ou au point de départ si la corde est de longueur nulle
+        normal = np.cross(xyz[starts], xyz[ends])
+        norm = np.linalg.norm(normal, axis=1)
+        degenerate = norm < 1e-12
+        normal[~degenerate] /= norm[~degenerate, None]
+        points = xyz[index]
+        deviation = np.abs(np.arcsin(np.clip(np.einsum('ij,ij->i', points, normal[owner]), -1, 1)))
+        to_start = np.arccos(np.clip(np.einsum('ij,ij->i', points, xyz[starts][owner]), -1, 1))
+        deviation = np.where(degenerate[owner], to_start, deviation)
+
+        # Point le plus éloigné de chaque intervalle : coupure si son écart dépasse la tolérance
+        worst = np.maximum.reduceat(deviation, first)
+        at_worst = np.flatnonzero(deviation == worst[owner])
+        farthest = np.full(len(starts), -1)
+        farthest[owner[at_worst][::-1]] = index[at_worst][::-1]
+        split = worst > angle
+        keep[farthest[split]] = True
+        starts, ends = np.concatenate([starts[split], farthest[split]]), np.concatenate([farthest[split], ends[split]])
+
+    return valid[keep]
 
 
 ### DEFINITION DE LA CLASSE DES ROUTES
 
+# Capacité initiale des tableaux d'une route, doublée à chaque dépassement
+ROUTE_CAPACITY = 256
+
 class Route():
-    """Classe des routes, liée à un ICAO particulier, contient une liste de positions à la norme WGS-84, et la longueur totale du trajet mise à jour à chaque ajout de position"""
+    """Classe des routes, liée à un ICAO particulier, contient les positions successives à la norme WGS-84 
+    dans des tableaux contigus (latitudes, longitudes, et quand elles sont connues instants, altitudes et indicateurs au sol), 
+    et la longueur totale du trajet mise à jour à chaque ajout de position"""
     
-    def __init__ (self, icao="", pos_list=[]) :
+    def __init__ (self, icao="", pos_list=None, mode=LENGTH_MODE) :
         self.length = 0
-        self.pos_list = pos_list
         self.icao = icao
+        self.mode = mode            # Méthode de calcul des longueurs, voir segmentLengths
+        self.size = 0               # Nombre de positions enregistrées
+        self.last_valid = -1        # Indice de la dernière position valide, -1 si aucune
+        self.invalid = 0            # Nombre de positions invalides (latitude ou longitude absente)
+        self.gaps = 0               # Nombre de trous : suites de positions invalides entre deux positions valides
+        self._lat = np.empty(ROUTE_CAPACITY)
+        self._lon = np.empty(ROUTE_CAPACITY)
+        self._time = np.empty(ROUTE_CAPACITY)
+        self._alt = np.empty(ROUTE_CAPACITY)
+        self._ground = np.empty(ROUTE_CAPACITY, dtype=bool)
+        self._lod = dict()          # Indices des points gardés, par tolérance de simplification
+        if pos_list :
+            self.extend([p.lat for p in pos_list], [p.long for p in pos_list])
     
     def __repr__(self) :
         header = "Route de l'avion ICAO : " + self.icao + "\n"
@@ -121,56 +549,286 @@ class Route():
         footer = "\n Longueur totale du trajet : " + str(self.length)
         return header+history+footer
 
+    def __len__(self) :
+        return self.size
+
+    @property
+    def pos_list(self):
+        """Liste des positions de la route (copie, créée à la demande)"""
+        return [Position(lat, long) for lat, long in zip(self._lat[:self.size].tolist(), self._lon[:self.size].tolist())]
+
+    def reserve(self, n):
+        """Agrandit les tableaux pour contenir au moins n positions, en doublant la capacité (coût amorti constant par ajout)"""
+        if n > len(self._lat) :
+            capacity = max(n, 2 * len(self._lat))
+            for name in ['_lat', '_lon', '_time', '_alt', '_ground'] :
+                grown = np.empty(capacity, dtype=getattr(self, name).dtype)
+                grown[:self.size] = getattr(self, name)[:self.size]
+                setattr(self, name, grown)
+
     def addPos(self,pos):
-        """Ajoute une position à la route active, et met à jour la distance parcourue"""
-        if self.pos_list != [] :
-            k = -1
-            # On contrôle que la dernière position est ok, sinon on recule jusqu'a en trouver une bonne
-            while (self.pos_list[k].lat == None) or (self.pos_list[k].long == None) :
-                k -= 1
-            self.length += self.pos_list[k].dist(pos)
-        self.pos_list.append(pos)
+        """Ajoute une position à la route active, et met à jour la distance parcourue depuis la dernière position valide, en temps constant"""
+        lat = np.nan if pos.lat is None else pos.lat
+        long = np.nan if pos.long is None else pos.long
+        if not (np.isfinite(lat) and np.isfinite(long)) :
+            self.invalid += 1
+        else :
+            k = self.last_valid
+            if k >= 0 :
+                self.length += float(segmentLengths([self._lat[k], lat], [self._lon[k], long], self.mode)[0])
+                if k != self.size - 1 :
+                    self.gaps += 1
+            self.last_valid = self.size
+        self.reserve(self.size + 1)
+        self._lat[self.size] = lat
+        self._lon[self.size] = long
+        self._time[self.size] = np.nan
+        self._alt[self.size] = np.nan
+        self._ground[self.size] = False
+        self.size += 1
+        self._lod.clear()
+
+    def extend(self, lat, lon, time=None, altitude=None, ground=None):
+        """Ajoute une suite de positions (tableaux de latitudes et longitudes, et si elles sont connues des instants, altitudes 
+        et indicateurs au sol) et met à jour la distance parcourue en une passe vectorisée"""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        self.invalid += len(lat) - len(valid)
+
+        # Indices des positions valides dans la route, en partant de la dernière position valide déjà enregistrée
+        positions = self.size + valid
+        path_lat, path_lon = lat[valid], lon[valid]
+        if self.last_valid >= 0 :
+            positions = np.concatenate([[self.last_valid], positions])
+            path_lat = np.concatenate([[self._lat[self.last_valid]], path_lat])
+            path_lon = np.concatenate([[self._lon[self.last_valid]], path_lon])
+        self.length += float(segmentLengths(path_lat, path_lon, self.mode).sum())
+        self.gaps += int(np.count_nonzero(np.diff(positions) > 1))
+        if len(positions) :
+            self.last_valid = int(positions[-1])
+
+        self.reserve(self.size + len(lat))
+        added = slice(self.size, self.size + len(lat))
+        self._lat[added] = lat
+        self._lon[added] = lon
+        self._time[added] = np.nan if time is None else np.array(time, dtype=float)
+        self._alt[added] = np.nan if altitude is None else np.array(altitude, dtype=float)
+        self._ground[added] = False if ground is None else np.array(ground, dtype=bool)
+        self.size += len(lat)
+        self._lod.clear()
+
+    def clear(self):
+        """Vide la route, en gardant les tableaux alloués"""
+        self.size = 0
+        self.length = 0
+        self.last_valid = -1
+        self.invalid = 0
+        self.gaps = 0
+        self._lod.clear()
+
+    def stats(self):
+        """Indicateurs de qualité de la route : nombre de positions, positions invalides écartées, trous et longueur"""
+        return {'points' : self.size, 'valid' : self.size - self.invalid, 'invalid' : self.invalid, 
+                'gaps' : self.gaps, 'length' : self.length}
+
+    @timed('route.length')
+    def computeLength(self, mode=None):
+        """Recalcule la longueur totale de la route en une seule passe vectorisée (mode : voir segmentLengths)"""
+        rlt,rlg = self.unpack_coord()
+        return routeLength(rlt, rlg, mode or self.mode)
 
     def findRouteREST(self,plane):
         """Met à jour la route actuelle avec celle de l'avion choisi, en un appel à l'API REST"""
         rest = RESTapi()
         raw_route = rest.getCurrentRoute(plane.icao)
         self.icao = plane.icao
-        self.pos_list = []
-        for p in raw_route : 
-            self.addPos(Position(p[1],p[2]))
+        self.loadPath(raw_route)
+
+    @timed('route.load')
+    def loadPath(self,raw_route):
+        """Remplace les positions de la route par celles d'une trace brute de l'API REST
+        Format d'un point : [time,latitude,longitude,altitude,true_track,on_ground_flag]"""
+        self.clear()
+        self.extend([p[1] for p in raw_route], [p[2] for p in raw_route], [p[0] for p in raw_route], 
+                    [p[3] for p in raw_route], [bool(p[5]) for p in raw_route])
 
     def unpack_coord(self):
-        """Renvoie les listes des latitudes et longitudes de la route active (pour l'affichage)"""
-        rlt,rlg = [],[]
-        for p in self.pos_list :
-            rlt.append(p.lat)
-            rlg.append(p.long)
-        return rlt,rlg
-        
+        """Renvoie les tableaux des latitudes et longitudes de la route active (pour l'affichage), 
+        sous forme de vues sans copie, valables jusqu'au prochain ajout de position"""
+        return self._lat[:self.size], self._lon[:self.size]
+
+    def simplify(self, tolerance):
+        """Indices des points gardés par la simplification à tolerance km (voir simplifyTrack), calculés une fois par tolérance"""
+        if tolerance not in self._lod :
+            lat, lon = self.unpack_coord()
+            self._lod[tolerance] = simplifyTrack(lat, lon, tolerance)
+        return self._lod[tolerance]
+
+    def lod(self, km_per_pixel):
+        """Latitudes et longitudes de la route au niveau de détail adapté à l'échelle de la carte : 
+        la plus grossière des tolérances LOD_TOLERANCES sous la taille d'un pixel, la route complète si aucune"""
+        levels = [tolerance for tolerance in LOD_TOLERANCES if tolerance <= km_per_pixel]
+        lat, lon = self.unpack_coord()
+        if not levels :
+            return lat, lon
+        kept = self.simplify(levels[-1])
+        return lat[kept], lon[kept]
+
+    def simplifyError(self, tolerance):
+        """Effet d'une simplification sur la route : points gardés, et erreur introduite sur la longueur (km et relative)"""
+        kept = self.simplify(tolerance)
+        lat, lon = self.unpack_coord()
+        length = routeLength(lat, lon, self.mode)
+        simplified = routeLength(lat[kept], lon[kept], self.mode)
+        return {'tolerance' : tolerance, 'points' : self.size, 'kept' : len(kept), 'length' : length, 'simplified' : simplified,
+                'error' : length - simplified, 'relative' : (length - simplified) / length if length else 0.0}
+
+    def unpack_track(self):
+        """Renvoie les tableaux (instants, latitudes, longitudes, altitudes, au sol) de la route, vues sans copie comme unpack_coord"""
+        n = self.size
+        return self._time[:n], self._lat[:n], self._lon[:n], self._alt[:n], self._ground[:n]
+
+    def legs(self, typecode=''):
+        """Découpe la route en vols, du décollage à l'atterrissage (voir segmentTracks), typecode : désignateur du type d'avion"""
+        return FlightLegs.fromRoutes([self], [typecode], mode=self.mode)
+
+
+### DEFINITION DE LA CLASSE DES VECTEURS D'ETATS EN COLONNES
+
+# Ordre des champs d'un vecteur d'états OpenSky, tel que renvoyé par /states/all
+STATE_KEYS = ["icao24", "callsign", "origin_country", "time_position", "last_contact", "longitude", "latitude", "baro_altitude", 
+              "on_ground", "velocity", "true_track", "vertical_rate", "sensors", "geo_altitude", "squawk", "spi", "position_source"]
+
+class StateColumns :
+    """Classe des vecteurs d'états OpenSky rangés en colonnes numpy, un tableau par champ et une ligne par avion"""
+
+    # Colonnes retenues : nom de la colonne, champ OpenSky correspondant, type numpy
+    COLUMNS = [("icao24", "icao24", str), ("callsign", "callsign", str), ("country", "origin_country", str),
+               ("time_position", "time_position", float), ("last_contact", "last_contact", float),
+               ("lat", "latitude", float), ("lon", "longitude", float), ("altitude", "baro_altitude", float),
+               ("velocity", "velocity", float), ("true_track", "true_track", float), 
+               ("vertical_rate", "vertical_rate", float), ("on_ground", "on_ground", bool)]
+
+    def __init__(self, **columns) :
+        for name, key, kind in StateColumns.COLUMNS :
+            setattr(self, name, columns[name])
+
+    def __len__(self) :
+        return len(self.icao24)
+
+    @classmethod
+    def build(cls, values) :
+        """Construit les colonnes depuis un dictionnaire champ OpenSky -> liste des valeurs (None -> '' / nan / False)"""
+        columns = dict()
+        for name, key, kind in cls.COLUMNS :
+            if kind is str :
+                columns[name] = np.array([v if v is not None else '' for v in values[key]], dtype=str)
+            elif kind is bool :
+                columns[name] = np.array([bool(v) for v in values[key]], dtype=bool)
+            else :
+                # numpy convertit directement les None en nan
+                columns[name] = np.array(values[key], dtype=float)
+        return cls(**columns)
+
+    @classmethod
+    def fromStates(cls, states) :
+        """Construit les colonnes depuis une liste de StateVector de l'API Python OpenSky"""
+        return cls.build({key : [getattr(state, key) for state in states] for name, key, kind in cls.COLUMNS})
+
+    @classmethod
+    def fromRows(cls, rows) :
+        """Construit les colonnes depuis les listes brutes de la réponse JSON de /states/all"""
+        return cls.build({key : [row[k] for row in rows] for name, key, kind in cls.COLUMNS for k in [STATE_KEYS.index(key)]})
+
+    def select(self, index) :
+        """Renvoie les lignes choisies par un masque booléen ou un tableau d'indices"""
+        return StateColumns(**{name : getattr(self, name)[index] for name, key, kind in StateColumns.COLUMNS})
 
     
 ### CLASSE DE LA LISTE DES JETS PRIVES EN VOLS ACTUELLEMENT
 
+class FleetDiff :
+    """Différence entre deux instantanés de la flotte en vol : codes ICAO des avions apparus, disparus et déplacés"""
+
+    def __init__(self, appeared=None, disappeared=None, moved=None) :
+        self.appeared = appeared if appeared is not None else []
+        self.disappeared = disappeared if disappeared is not None else []
+        self.moved = moved if moved is not None else []
+
+    def __repr__(self) :
+        return f"{len(self.appeared)} apparus, {len(self.disappeared)} disparus, {len(self.moved)} déplacés"
+
+
 class FlyingPlanes :
-    """Classe des avions en vols, regroupe la liste de tous les avions actuellement en vol répertoriés par l'API OpenSky"""
+    """Classe des avions en vols, regroupe la liste de tous les avions actuellement en vol répertoriés par l'API OpenSky
+    Les vecteurs d'états sont gardés en colonnes numpy, les objets Plane ne sont créés qu'à la demande"""
     
-    def __init__ (self) :
-        api = OSapi()
-        states_list = api.getCurrentStates()
-        states_list = states_list.states
-        jets_list = PrivateJets()
-
-        self.flying = []
-        self.positions = dict()
-    
-        for state in states_list :
-            if state.icao24 in jets_list.jets :
-                model = jets_list.jets[state.icao24][0] + ' ' + jets_list.jets[state.icao24][2]
-                ID = state.callsign
-                country = state.origin_country
-                self.flying.append(Plane(state.icao24,model,country,ID,Position(state.latitude,state.longitude)))
-                self.positions[state.icao24] = Position(state.latitude,state.longitude)
+    def __init__ (self, states=None, jets_list=None) :
+        """states : liste de StateVector, lignes brutes de /states/all ou StateColumns (par défaut, appel à l'API OpenSky)"""
+        if jets_list is None :
+            jets_list = PrivateJets()
+        self.jets_list = jets_list
+
+        self._planes = dict()       # Objets Plane déjà créés, par code ICAO
+        self._index = None          # Ligne de chaque avion, par code ICAO
+        self._grid = None           # Index spatial de l'instantané (SpatialGrid), construit au premier accès
+        self._registration = None   # Immatriculations des avions, lues dans le registre au premier accès
+        self.states, self.model = self.filter(states)
+
+    @timed('fleet.filter')
+    def filter(self, states=None) :
+        """Récupère (si states est None) et filtre un instantané sur le registre des jets privés, 
+        renvoie les colonnes des jets privés et leurs modèles"""
+        if states is None :
+            api = OSapi()
+            states = api.getCurrentStates()
+            states = states.states if states is not None else []
+        jets_list = self.jets_list
+
+        # Filtrage vectorisé des vecteurs d'états sur le registre des jets privés, seule la colonne ICAO est extraite de tous les états
+        if isinstance(states, StateColumns) :
+            found, rows = jets_list.lookup(states.icao24)
+            columns = states.select(found)
+        elif len(states) and isinstance(states[0], list) :
+            # Un caractère de plus que les codes ICAO : les codes trop longs ne sont pas tronqués, et sont rejetés par lookup
+            found, rows = jets_list.lookup(np.fromiter((row[0] for row in states), dtype='U7', count=len(states)))
+            columns = StateColumns.fromRows([states[k] for k in np.flatnonzero(found)])
+        else :
+            found, rows = jets_list.lookup(np.fromiter((state.icao24 for state in states), dtype='U7', count=len(states)))
+            columns = StateColumns.fromStates([states[k] for k in np.flatnonzero(found)])
+        registry = jets_list.registry[rows[found]]
+        return columns, np.char.add(np.char.add(registry['manufacturer'], ' '), registry['type'])
+
+    def update(self, states=None) :
+        """Applique un nouvel instantané (par défaut, appel à l'API OpenSky) sans reconstruire la flotte : 
+        le registre est conservé, les avions déjà créés sont mis à jour sur place, et la différence est renvoyée (FleetDiff)"""
+        return self.apply(*self.filter(states))
+
+    @timed('fleet.apply')
+    def apply(self, columns, model) :
+        """Applique un instantané déjà filtré (voir filter, qui peut tourner dans un autre thread) et renvoie la différence (FleetDiff)"""
+        old, new = self.states, columns
+
+        appeared = np.setdiff1d(new.icao24, old.icao24)
+        disappeared = np.setdiff1d(old.icao24, new.icao24)
+        common, k_old, k_new = np.intersect1d(old.icao24, new.icao24, return_indices=True)
+        same = lambda a, b : (a == b) | (np.isnan(a) & np.isnan(b))
+        moved = ~(same(old.lat[k_old], new.lat[k_new]) & same(old.lon[k_old], new.lon[k_new]))
+
+        self.states, self.model = new, model
+        self._index = None
+        self._grid = None
+        self._registration = None
+        for icao in disappeared.tolist() :
+            self._planes.pop(icao, None)
+        for icao, plane in self._planes.items() :
+            k = self.index(icao)
+            plane.pos = Position(float(new.lat[k]), float(new.lon[k]))
+            plane.ID = str(new.callsign[k])
+            plane.country = str(new.country[k])
+
+        return FleetDiff(appeared.tolist(), disappeared.tolist(), common[moved].tolist())
 
     def __repr__(self):
         output = ''
@@ -178,6 +836,37 @@ class FlyingPlanes :
             output += str(plane) + '\n'
         return output
 
+    def __len__(self):
+        return len(self.states)
+
+    @property
+    def registration(self) :
+        """Immatriculations des avions de l'instantané, dans l'ordre des colonnes"""
+        if self._registration is None :
+            found, rows = self.jets_list.lookup(self.states.icao24)
+            registry = self.jets_list.registry
+            self._registration = np.where(found, registry['registration'][rows], '') if len(registry) else np.full(len(found), '')
+        return self._registration
+
+    def plane(self, k) :
+        """Renvoie l'avion de la ligne k, créé au premier accès puis mis à jour sur place à chaque instantané"""
+        states = self.states
+        icao = str(states.icao24[k])
+        if icao not in self._planes :
+            self._planes[icao] = Plane(icao, str(self.model[k]), str(states.country[k]), str(states.callsign[k]),
+                                       Position(float(states.lat[k]), float(states.lon[k])))
+        return self._planes[icao]
+
+    @property
+    def flying(self):
+        """Liste des avions en vols répertoriés"""
+        return [self.plane(k) for k in range(len(self.states))]
+
+    @property
+    def positions(self):
+        """Dictionnaire des positions des avions en vols, avec leur ICAO comme clef"""
+        return {plane.icao : plane.pos for plane in self.flying}
+
     def coordinates(self):
         """Renvoie les coordonnées des avions en vols répertoriés"""
         coord = []
@@ -185,13 +874,67 @@ class FlyingPlanes :
             coord.append(plane.pos)
         return coord
     
+    def extrapolate(self, t=None) :
+        """Renvoie les positions (longitudes, latitudes) des avions extrapolées à l'instant t (par défaut maintenant) 
+        depuis leur dernier vecteur d'états, en une passe vectorisée ; les avions au sol ne sont pas avancés"""
+        states = self.states
+        if t is None :
+            t = time.time()
+        elapsed = t - np.where(np.isfinite(states.time_position), states.time_position, states.last_contact)
+        velocity = np.where(states.on_ground, 0.0, states.velocity)
+        lat, lon = deadReckoning(states.lat, states.lon, velocity, states.true_track, elapsed)
+        return lon, lat
+
+    def index(self, icao) :
+        """Renvoie la ligne de l'avion icao dans les colonnes, None s'il n'est pas en vol"""
+        if self._index is None :
+            self._index = {icao : k for k, icao in enumerate(self.states.icao24.tolist())}
+        return self._index.get(icao)
+
+    def findRoutes(self, icaos=None, callback=None, concurrency=8) :
+        """Récupère en parallèle les routes de tous les avions en vol (ou de la liste icaos), renvoie le dictionnaire icao -> Route
+        callback(route) est appelé à l'arrivée de chaque route"""
+        if icaos is None :
+            icaos = self.states.icao24.tolist()
+        routes = dict()
+
+        def received(icao, path) :
+            route = Route(icao)
+            route.loadPath(path)
+            routes[icao] = route
+            if callback is not None :
+                callback(route)
+
+        TrackFetcher(concurrency=concurrency).fetchAll(icaos, received)
+        return routes
+
+    @property
+    def grid(self) :
+        """Index spatial des positions de l'instantané courant"""
+        if self._grid is None :
+            self._grid = SpatialGrid(self.states.lat, self.states.lon)
+        return self._grid
+
+    def inside(self, lon_min, lon_max, lat_min, lat_max) :
+        """Lignes des avions situés dans le rectangle (par exemple la partie visible de la carte)"""
+        return self.grid.bbox(lon_min, lon_max, lat_min, lat_max)
+
+    def nearest(self, lat, lon, n=1) :
+        """Codes ICAO des n avions les plus proches du point, et leurs distances (km)"""
+        k, d = self.grid.nearest(lat, lon, n)
+        return self.states.icao24[k].tolist(), d
+
+    def around(self, lat, lon, radius) :
+        """Codes ICAO des avions à moins de radius km du point (par exemple un aéroport), et leurs distances (km)"""
+        k, d = self.grid.within(lat, lon, radius)
+        return self.states.icao24[k].tolist(), d
+
     def select_plane(self,icao) :
         """Renvoie l'avion sélectionné à l'aide d'un code icao, avec ses informations actuelles si elles sont présentes"""
-        for plane in self.flying :
-            # print(plane)
-            if plane.icao == icao :
-                return plane
-        return Plane(icao)
+        k = self.index(icao)
+        if k is None :
+            return Plane(icao)
+        return self.plane(k)
           
 
 def convert_CO2(km):
@@ -243,6 +986,259 @@ def testFindRoute():
     r = plane.findRouteREST()
     print(r)
 
+def syntheticStates(n=10000, jets_list=None, jet_ratio=0.05, seed=0) :
+    """Génère une réponse /states/all synthétique de n vecteurs d'états, dont une part jet_ratio de jets privés du registre"""
+    rng = np.random.default_rng(seed)
+    icaos = ["%06x" % k for k in rng.integers(0, 1 << 24, n)]
+    if jets_list is not None and len(jets_list.registry) :
+        known = jets_list.registry['icao']
+        for k in np.flatnonzero(rng.random(n) < jet_ratio) :
+            icaos[k] = str(known[rng.integers(0, len(known))])
+    t = 1671926400
+    rows = []
+    for k in range(n) :
+        rows.append([icaos[k], "CS%05d   " % k, "France", t - 2, t - 1, float(rng.uniform(-180, 180)), float(rng.uniform(-80, 80)),
+                     float(rng.uniform(0, 13000)), False, float(rng.uniform(50, 280)), float(rng.uniform(0, 360)), 0.0, None,
+                     None, None, False, 0])
+    return {"time" : t, "states" : rows}
+
+def benchFiltrage(n=10000, fixture=None, runs=5) :
+    """Compare la boucle historique de FlyingPlanes et le filtrage en colonnes, sur un enregistrement de /states/all (fichier JSON) ou des états synthétiques"""
+    import types
+
+    jets_list = PrivateJets()
+    if fixture is not None :
+        with open(fixture) as fixturefile :
+            answer = json.load(fixturefile)
+    else :
+        answer = syntheticStates(n, jets_list)
+    rows = answer["states"]
+    states = [types.SimpleNamespace(**dict(zip(STATE_KEYS, row))) for row in rows]
+
+    def legacy() :
+        flying = []
+        positions = dict()
+        for state in states :
+            if state.icao24 in jets_list.jets :
+                model = jets_list.jets[state.icao24][0] + ' ' + jets_list.jets[state.icao24][2]
+                flying.append(Plane(state.icao24,model,state.origin_country,state.callsign,Position(state.latitude,state.longitude)))
+                positions[state.icao24] = Position(state.latitude,state.longitude)
+        return flying
+
+    def best(function) :
+        timings = []
+        for k in range(runs) :
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
+
+    print(f"{len(rows)} vecteurs d'états, {len(legacy())} jets privés")
+    print(f"Boucle historique (Plane + Position)     : {best(legacy):8.2f} ms")
+    print(f"Colonnes depuis les StateVector          : {best(lambda : FlyingPlanes(states, jets_list)):8.2f} ms")
+    print(f"Colonnes depuis le JSON brut             : {best(lambda : FlyingPlanes(rows, jets_list)):8.2f} ms")
+    print(f"Colonnes complètes puis filtrage         : {best(lambda : FlyingPlanes(StateColumns.fromRows(rows), jets_list)):8.2f} ms")
+
+def syntheticTrack(n=5000, seed=0) :
+    """Génère une trace synthétique de n points, en marche aléatoire d'environ 3 km entre deux points"""
+    rng = np.random.default_rng(seed)
+    heading = np.cumsum(rng.normal(0, 0.05, n)) + rng.uniform(0, 2 * np.pi)
+    lat = 45 + np.cumsum(0.027 * np.cos(heading))
+    lon = 2 + np.cumsum(0.027 * np.sin(heading) / np.cos(np.radians(lat)))
+    return np.clip(lat, -85, 85), (lon + 180) % 360 - 180
+
+def benchRouteLength(sizes=[1000, 5000, 20000]) :
+    """Compare le calcul de longueur historique (geopy segment par segment, arrondi) aux méthodes vectorisées, en temps et en précision"""
+    for n in sizes :
+        lat, lon = syntheticTrack(n)
+
+        start = time.perf_counter()
+        legacy = 0
+        for k in range(1, n) :
+            legacy += Position(lat[k-1], lon[k-1]).dist(Position(lat[k], lon[k]))
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        exact = routeLength(lat, lon, 'geodesic')
+        exact_time = time.perf_counter() - start
+
+        print(f"Trace de {n} points, géodésique exacte : {exact:.3f} km en {exact_time*1000:.1f} ms")
+        print(f"   historique (geopy + arrondi)  : {legacy_time*1000:9.2f} ms, erreur {legacy - exact:+.4f} km")
+        for mode in ['andoyer', 'haversine'] :
+            start = time.perf_counter()
+            length = routeLength(lat, lon, mode)
+            elapsed = time.perf_counter() - start
+            print(f"   {mode:<29} : {elapsed*1000:9.2f} ms, erreur {length - exact:+.4f} km ({(length - exact) / exact:+.1e})")
+
+def benchRouteMemory(n=1000000) :
+    """Mesure la mémoire occupée par point de route : liste de Position avec __dict__ (historique), avec __slots__, et tableaux de la Route"""
+    import tracemalloc
+
+    class LegacyPosition :
+        def __init__(self,lat=0,long=0):
+            self.lat   = lat
+            self.long  = long
+
+    lat, lon = syntheticTrack(n)
+    lat, lon = lat.tolist(), lon.tolist()
+
+    def measure(build) :
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return used / n
+
+    def arrays() :
+        route = Route("XXX")
+        for k in range(0, n, 1000) :
+            route.extend(lat[k:k+1000], lon[k:k+1000])
+        return route
+
+    print(f"{n} points de route")
+    print(f"Liste de Position avec __dict__ : {measure(lambda : [LegacyPosition(a, b) for a, b in zip(lat, lon)]):6.1f} octets/point")
+    print(f"Liste de Position avec __slots__ : {measure(lambda : [Position(a, b) for a, b in zip(lat, lon)]):6.1f} octets/point")
+    print(f"Route en tableaux float64       : {measure(arrays):6.1f} octets/point")
+
+def moveStates(answer, churn=0.05, jets_list=None, seed=1) :
+    """Instantané suivant d'une réponse /states/all synthétique : tous les avions avancent, une part churn est remplacée (par des jets du registre s'il est donné)"""
+    rng = np.random.default_rng(seed)
+    known = jets_list.registry['icao'] if jets_list is not None and len(jets_list.registry) else None
+    rows = []
+    for row in answer["states"] :
+        row = list(row)
+        if rng.random() < churn :
+            row[0] = str(known[rng.integers(0, len(known))]) if known is not None else "%06x" % rng.integers(0, 1 << 24)
+        row[5] += 0.05
+        row[6] += 0.05
+        rows.append(row)
+    return {"time" : answer["time"] + 10, "states" : rows}
+
+def benchRefresh(jets=1000, runs=5) :
+    """Mesure la latence d'un rafraîchissement pour environ jets avions suivis : reconstruction complète historique 
+    (registre, filtrage, liste des avions) contre mise à jour par différence"""
+    jets_list = PrivateJets()
+    first = syntheticStates(jets * 20, jets_list)
+    second = moveStates(first, 0.05 * 0.05, jets_list)
+
+    def rebuild() :
+        fleet = FlyingPlanes(second["states"], PrivateJets())
+        return fleet.flying
+
+    def incremental() :
+        fleet = FlyingPlanes(first["states"], jets_list)
+        fleet.flying
+        start = time.perf_counter()
+        diff = fleet.update(second["states"])
+        fleet.flying
+        return time.perf_counter() - start, diff
+
+    timings = []
+    for k in range(runs) :
+        start = time.perf_counter()
+        rebuild()
+        timings.append(time.perf_counter() - start)
+    results = [incremental() for k in range(runs)]
+
+    print(f"{len(FlyingPlanes(second['states'], jets_list))} jets suivis, {len(second['states'])} vecteurs d'états, différence : {results[0][1]}")
+    print(f"Reconstruction complète : {min(timings)*1000:8.2f} ms")
+    print(f"Mise à jour par différence : {min([r[0] for r in results])*1000:8.2f} ms")
+
+def benchDeadReckoning(sizes=[1000, 10000, 100000], runs=20) :
+    """Mesure le coût par image de l'extrapolation des positions de toute la flotte, et son écart à la géodésique exacte (geopy)"""
+    for n in sizes :
+        answer = syntheticStates(n)
+        fleet = FlyingPlanes(answer["states"], PrivateJets(registry=emptyRegistry()))
+        fleet.states = StateColumns.fromRows(answer["states"])
+        t = answer["time"] + 60
+        start = time.perf_counter()
+        for k in range(runs) :
+            lon, lat = fleet.extrapolate(t)
+        per_frame = (time.perf_counter() - start) / runs
+        states = fleet.states
+        errors = [distance.geodesic((lat[k], lon[k]), distance.geodesic(kilometers=states.velocity[k] * (t - states.time_position[k]) / 1000)
+                                    .destination((states.lat[k], states.lon[k]), states.true_track[k])).km for k in range(min(n, 200))]
+        print(f"{n:7d} avions : {per_frame*1000:8.3f} ms/image, écart max {max(errors)*1000:6.1f} m")
+
+def syntheticFlights(tracks=1000, points=200, seed=0) :
+    """Traces brutes /tracks synthétiques : roulage, vol, roulage, et pour une trace sur deux un second vol après une escale 
+    sans aucun point reçu ; renvoie les routes et le nombre de vols attendu"""
+    rng = np.random.default_rng(seed)
+    routes, expected = [], 0
+    for k in range(tracks) :
+        t, lat, lon = 1671926400.0, float(rng.uniform(-60, 60)), float(rng.uniform(-170, 170))
+        path = []
+        for leg in range(1 + k % 2) :
+            for phase, n in [(True, 5), (False, points), (True, 5)] :
+                for i in range(n) :
+                    t += 10 if phase else 60
+                    if not phase :
+                        lat, lon = lat + 0.02, lon + 0.03
+                    altitude = 0.0 if phase else float(min(11000, 300 + 100 * min(i, n - i)))
+                    path.append([t, lat, lon, altitude, 45.0, phase])
+            t += 2 * 3600
+            expected += 1
+        route = Route("%06x" % k)
+        route.loadPath(path)
+        routes.append(route)
+    return routes, expected
+
+def benchSegmentation(tracks=[100, 1000, 5000], points=200) :
+    """Mesure le découpage en vols de milliers de traces en une passe, contre un découpage trace par trace"""
+    for n in tracks :
+        routes, expected = syntheticFlights(n, points)
+        start = time.perf_counter()
+        legs = FlightLegs.fromRoutes(routes)
+        batched = time.perf_counter() - start
+        start = time.perf_counter()
+        single = sum(len(route.legs()) for route in routes)
+        looped = time.perf_counter() - start
+        distance, co2 = legs.total()
+        print(f"{n:5d} traces, {sum(len(r) for r in routes):8d} points : {len(legs)} vols (attendus {expected}, trace par trace {single}), "
+              f"{batched*1000:7.1f} ms en une passe, {looped*1000:7.1f} ms trace par trace, {distance:.0f} km, {co2/1000:.0f} t CO2e")
+
+def benchSimplification(sizes=[1000, 20000, 200000]) :
+    """Mesure la simplification des routes à chaque niveau de détail : points gardés, durée, et erreur introduite sur la longueur"""
+    for n in sizes :
+        lat, lon = syntheticTrack(n)
+        route = Route("bench")
+        route.extend(lat, lon)
+        for tolerance in LOD_TOLERANCES :
+            start = time.perf_counter()
+            route.simplify(tolerance)
+            elapsed = time.perf_counter() - start
+            error = route.simplifyError(tolerance)
+            print(f"{n:7d} points, tolérance {tolerance:5.2f} km : {error['kept']:6d} gardés en {elapsed*1000:7.1f} ms, "
+                  f"longueur {error['length']:9.1f} km, erreur {error['error']:7.2f} km ({error['relative']*100:.3f} %)")
+
+def benchSpatialIndex(sizes=[1000, 10000, 100000], queries=200) :
+    """Compare l'index spatial au parcours complet : rectangle de la carte, avion le plus proche d'un clic, avions à moins de 100 km"""
+    rng = np.random.default_rng(0)
+    for n in sizes :
+        lat, lon = rng.uniform(-80, 80, n), rng.uniform(-180, 180, n)
+        start = time.perf_counter()
+        grid = SpatialGrid(lat, lon)
+        build = time.perf_counter() - start
+        points = list(zip(rng.uniform(-70, 70, queries), rng.uniform(-180, 180, queries)))
+
+        def brute(qlat, qlon) :
+            d = EARTH_RADIUS * centralAngle(np.radians(lat), np.radians(lon), np.radians(qlat), np.radians(qlon))
+            box = np.flatnonzero((lon >= qlon - 10) & (lon <= qlon + 10) & (lat >= qlat - 5) & (lat <= qlat + 5))
+            return int(np.argmin(d)), np.flatnonzero(d <= 100), box
+
+        def indexed(qlat, qlon) :
+            return int(grid.nearest(qlat, qlon)[0][0]), np.sort(grid.within(qlat, qlon, 100)[0]), grid.bbox(qlon - 10, qlon + 10, qlat - 5, qlat + 5)
+
+        timings, results = [], []
+        for function in [brute, indexed] :
+            start = time.perf_counter()
+            results.append([function(qlat, qlon) for qlat, qlon in points])
+            timings.append((time.perf_counter() - start) / queries)
+        same = all(a[0] == b[0] and np.array_equal(a[1], b[1]) and np.array_equal(a[2], b[2]) for a, b in zip(*results))
+        print(f"{n:7d} avions : construction {build*1000:7.2f} ms, requêtes parcours {timings[0]*1000:7.3f} ms, "
+              f"index {timings[1]*1000:7.3f} ms, résultats identiques : {same}")
+
 if __name__ == '__main__' :
     TestListesAvions()
     testFindRoute()
\ No newline at end of file
@@ -23,10 +23,36 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 ### Module controleur
 from controler import *
 
+import time
+from collections import deque
+
+# Nombre d'images conservées pour les mesures de durée d'affichage
+FRAME_HISTORY = 100
+
+# Zoom de la carte à la molette, et rayon de sélection d'un avion au clic (part de la largeur visible)
+ZOOM_FACTOR = 1.5
+PICK_TOLERANCE = 0.02
+
+# Intervalle d'affichage des mesures dans le bloc log (ms), quand elles sont actives
+METRICS_PERIOD = 5000
+
+
+class Dispatcher(QObject):
+    """Pont entre les threads de calcul du contrôleur et l'interface : les rappels émis depuis un thread sont exécutés dans la boucle Qt"""
+    called = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.called.connect(self.run)
+
+    def run(self, function):
+        function()
+
 
 
 class Planisphere(QGroupBox):
-    """Bloc carte, pour l'affichage des avions"""
+    """Bloc carte, pour l'affichage des avions
+    Le fond de carte est dessiné une seule fois et mémorisé : seules les couches dynamiques (avions, route) sont retracées (blitting)"""
     def __init__(self, parent, controler):
         super().__init__(parent)
         self.controler = controler
@@ -38,32 +64,119 @@ class Planisphere(QGroupBox):
         self.controler.prep_plot_planes()
         self.figure = plt.figure()
         self.canvas = FigureCanvas(self.figure)
+        self.background = None                         # Fond de carte mémorisé, recapturé à chaque rendu complet
+        self.frame_times = deque(maxlen=FRAME_HISTORY)  # Durées des dernières images (s)
+        self.timer = QTimer(self)                       # Animation du mode direct
+        self.timer.setInterval(int(1000 / LIVE_FPS))
+        self.timer.timeout.connect(self.animate)
+        self.drawbasemap()
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas.mpl_connect('button_press_event', self.on_click)
+        self.canvas.mpl_connect('scroll_event', self.on_scroll)
         self.canvas.draw()
         layout.addWidget(self.canvas)
         self.setLayout(layout)
         
         self.drawgraph()    
 
+    def drawbasemap(self):
+        """Dessine le fond de carte (côtes, frontières, océans) et crée les couches dynamiques, vides"""
+        self.ax = self.figure.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+        self.ax.coastlines()
+        self.ax.add_feature(cfeature.BORDERS)
+        self.ax.add_feature(cfeature.OCEAN)
+        self.ax.set_global()
+        (self.planes_line,) = self.ax.plot([], [], 'or', animated=True)
+        (self.route_line,) = self.ax.plot([], [], '-g', animated=True)
+        self.figure.tight_layout()
+
+    def on_draw(self, event):
+        """Après un rendu complet (premier affichage, redimensionnement), mémorise le fond de carte et y retrace les couches dynamiques"""
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_dynamic()
+
+    def on_click(self, event):
+        """Un clic sur la carte sélectionne l'avion le plus proche, à moins de PICK_TOLERANCE de la largeur visible"""
+        if event.inaxes is not self.ax or event.xdata is None :
+            return
+        lon_min, lon_max, lat_min, lat_max = self.ax.get_extent()
+        radius = (lon_max - lon_min) * PICK_TOLERANCE * 111.0
+        icao = self.controler.pick_plane(event.ydata, event.xdata, radius)
+        if icao is not None :
+            self.controler.choose_plane(icao)
+
+    def on_scroll(self, event):
+        """La molette zoome autour du curseur ; seuls les avions de la partie visible sont ensuite tracés"""
+        if event.inaxes is not self.ax or event.xdata is None :
+            return
+        factor = 1 / ZOOM_FACTOR if event.button == 'up' else ZOOM_FACTOR
+        lon_min, lon_max, lat_min, lat_max = self.ax.get_extent()
+        width = min((lon_max - lon_min) * factor, 360)
+        height = min((lat_max - lat_min) * factor, 180)
+        if width >= 360 :
+            self.ax.set_global()
+            self.controler.set_viewport(None)
+        else :
+            lon_min = np.clip(event.xdata - (event.xdata - lon_min) * factor, -180, 180 - width)
+            lat_min = np.clip(event.ydata - (event.ydata - lat_min) * factor, -90, 90 - height)
+            extent = (lon_min, lon_min + width, lat_min, lat_min + height)
+            self.ax.set_extent(extent, crs=ccrs.PlateCarree())
+            self.controler.set_viewport(extent)
+        self.background = None
+        self.drawgraph()
+
+    def draw_dynamic(self):
+        self.ax.draw_artist(self.route_line)
+        self.ax.draw_artist(self.planes_line)
+
+    @timed('map.draw')
     def drawgraph(self):
-        """Dessine la carte et trace les positions du ou des avion(s) sélectionnés"""
-        ax = plt.axes(projection=ccrs.PlateCarree())
-        ax.coastlines()
-        ax.add_feature(cfeature.BORDERS)
-        ax.add_feature(cfeature.OCEAN)
+        """Trace les positions du ou des avion(s) sélectionnés et la route, au-dessus du fond de carte mémorisé"""
+        start = time.perf_counter()
         (x,y) = self.controler.plane_coord_list
-        (ry,rx) = self.controler.route_coord
-        ax.set_global()
-        ax.plot(x, y, 'or')
-        ax.plot(rx,ry,'-g')
-        self.figure.tight_layout()
-        self.canvas.draw()
+        (ry,rx) = self.controler.route_display(self.km_per_pixel())
+        if np.ndim(x) :
+            k = self.controler.visible()
+            x, y = x[k], y[k]
+        self.planes_line.set_data(np.atleast_1d(x), np.atleast_1d(y))
+        self.route_line.set_data(rx, ry)
+        if self.background is None :
+            self.canvas.draw()
+        else :
+            self.canvas.restore_region(self.background)
+            self.draw_dynamic()
+            self.canvas.blit(self.figure.bbox)
+        self.frame_times.append(time.perf_counter() - start)
+
+    def km_per_pixel(self):
+        """Échelle de la carte à l'équateur (km par pixel), pour le niveau de détail des routes"""
+        lon_min, lon_max, lat_min, lat_max = self.ax.get_extent()
+        width = max(self.ax.get_window_extent().width, 1)
+        return (lon_max - lon_min) * 111.32 / width
+
+    def frameStats(self):
+        """Durées des dernières images en ms : moyenne, 95e centile et maximum"""
+        if not self.frame_times :
+            return dict(frames=0)
+        times = np.array(self.frame_times) * 1000
+        return dict(frames=len(times), mean=times.mean(), p95=np.percentile(times, 95), max=times.max())
+
+    def animate(self):
+        """Image du mode direct : positions extrapolées, seules les couches dynamiques sont retracées"""
+        self.controler.animate()
+        self.drawgraph()
 
     def refresh(self):
+        if self.controler.live and not self.timer.isActive() :
+            self.timer.start()
+        elif not self.controler.live :
+            self.timer.stop()
         self.drawgraph()
 
 
 class LogWidget(QTextEdit):
-    """Bloc log, désactivé par défaut, pour le debogage"""
+    """Bloc log, affiché seulement quand les mesures sont actives, pour le debogage : 
+    messages du contrôleur, et toutes les METRICS_PERIOD ms l'activité mesurée depuis le dernier affichage"""
     def __init__(self, parent, controler):
         super().__init__(parent)
         self.controler = controler
@@ -74,11 +187,232 @@ class LogWidget(QTextEdit):
         font = QFont("Courier New", 12)
         self.setFont(font)
 
+        self.last_metrics = metrics().snapshot()
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.show_metrics)
+        self.metrics_timer.start(METRICS_PERIOD)
+
     def refresh(self):
         message = self.controler.message
         if message:
             self.append(message)
 
+    def show_metrics(self):
+        lines = metrics().report(self.last_metrics)
+        self.last_metrics = metrics().snapshot()
+        if lines :
+            self.append("[mesures] " + time.strftime("%H:%M:%S") + "\n" + "\n".join(lines))
+
+
+class FleetTableModel(QAbstractTableModel):
+    """Modèle Qt de la flotte en vol, lu directement dans les colonnes numpy : la vue ne formate que les lignes visibles
+    Les lignes affichées (view) sont des lignes des colonnes, filtrées par un index des mots des colonnes cherchées, puis triées"""
+
+    # Titre, colonne (de FlyingPlanes.states, ou model / registration de FlyingPlanes) et format
+    COLUMNS = [("ICAO", "icao24", "{}"), ("Immat", "registration", "{}"), ("Marque et modèle", "model", "{}"),
+               ("Pays d'origine", "country", "{}"), ("Indicatif", "callsign", "{}"), ("Altitude (m)", "altitude", "{:.0f}"),
+               ("Vitesse (km/h)", "velocity", "{:.0f}")]
+
+    # Colonnes prises en compte par le filtre, et colonnes qui changent d'un instantané à l'autre pour un même avion
+    SEARCHED = ["icao24", "registration", "model", "country"]
+    DYNAMIC = ["callsign", "altitude", "velocity"]
+
+    def __init__(self, controler):
+        super().__init__()
+        self.controler = controler
+        self.filter_text = ""
+        self.sort_column = None
+        self.sort_order = Qt.AscendingOrder
+        self.load()
+
+    def fleetColumns(self, take=None):
+        """Colonnes affichées de la flotte courante, dans l'ordre de ses lignes ou réordonnées par take"""
+        fleet = self.controler.flying_planes
+        states = fleet.states
+        columns = dict(icao24=states.icao24, registration=fleet.registration, model=fleet.model, country=states.country,
+                       callsign=np.char.strip(states.callsign), altitude=states.altitude, velocity=states.velocity * 3.6)
+        if take is not None :
+            columns = {name : values[take] for name, values in columns.items()}
+        return columns
+
+    def load(self):
+        """Relit les colonnes de la flotte courante, reconstruit l'index du filtre, puis réapplique filtre et tri"""
+        self.columns = self.fleetColumns()
+        self.build_index()
+        self.view = self.filtered(self.filter_text)
+        self.order()
+
+    def reload(self):
+        self.beginResetModel()
+        self.load()
+        self.endResetModel()
+
+    def words_of(self, rows):
+        """Mots (en minuscules) des colonnes cherchées des lignes rows, avec la ligne de chacun, non triés"""
+        words, word_rows = [], []
+        for name in self.SEARCHED :
+            for k, text in zip(rows.tolist(), np.char.lower(self.columns[name][rows].astype(str)).tolist()) :
+                for word in text.split() :
+                    words.append(word)
+                    word_rows.append(k)
+        return np.array(words, dtype=str), np.array(word_rows, dtype=int)
+
+    def build_index(self):
+        """Index du filtre : tous les mots (en minuscules) des colonnes cherchées, triés, avec la ligne de chacun"""
+        words, rows = self.words_of(np.arange(len(self.columns['icao24'])))
+        order = np.argsort(words, kind='stable')
+        self.words = words[order]
+        self.word_rows = rows[order]
+
+    def update(self, diff):
+        """Applique la différence de flotte (FleetDiff) sans réinitialiser le modèle : lignes des avions disparus retirées, 
+        avions apparus insérés à leur place (filtre et tri), lignes des avions déplacés signalées modifiées ; 
+        seuls les mots des avions apparus sont ajoutés à l'index (les colonnes cherchées ne changent pas pour un même avion)
+        Les lignes gardent leur ordre : survivants dans l'ordre précédent, puis avions apparus"""
+        fleet_keys = self.controler.flying_planes.states.icao24
+        old_keys = self.columns['icao24']
+        gone = np.isin(old_keys, diff.disappeared)
+        survivors = old_keys[~gone]
+        sorter = np.argsort(fleet_keys, kind='stable')
+        found = np.searchsorted(fleet_keys, survivors, sorter=sorter)
+        found = sorter[np.minimum(found, len(sorter) - 1)] if len(sorter) else found
+        fresh = np.flatnonzero(np.isin(fleet_keys, diff.appeared))
+        if len(old_keys) == 0 or len(survivors) + len(fresh) != len(fleet_keys) or not np.array_equal(fleet_keys[found], survivors) :
+            # Premier chargement, ou différence qui ne correspond pas au modèle
+            self.reload()
+            return
+
+        # Avions disparus : lignes affichées retirées par blocs contigus, en partant de la fin
+        hidden = np.flatnonzero(gone[self.view])
+        if len(hidden) :
+            breaks = np.flatnonzero(np.diff(hidden) != 1) + 1
+            for run in reversed(np.split(hidden, breaks)) :
+                self.beginRemoveRows(QModelIndex(), int(run[0]), int(run[-1]))
+                self.view = np.delete(self.view, run)
+                self.endRemoveRows()
+
+        # Colonnes réordonnées (survivants dans l'ordre précédent, puis avions apparus), index des mots et lignes affichées renumérotés
+        take = np.concatenate([found, fresh]).astype(int)
+        renumber = np.cumsum(~gone) - 1
+        self.columns = self.fleetColumns(take)
+        kept = ~gone[self.word_rows]
+        self.words, self.word_rows = self.words[kept], renumber[self.word_rows[kept]]
+        self.view = renumber[self.view]
+
+        # Avions apparus : mots ajoutés à l'index, lignes insérées si elles passent le filtre
+        added = np.arange(len(survivors), len(take))
+        words, rows = self.words_of(added)
+        order = np.argsort(words, kind='stable')
+        at = np.searchsorted(self.words, words[order], 'right')
+        # Largeur des mots élargie si besoin : np.insert tronquerait les mots plus longs que ceux de l'index
+        self.words = np.insert(self.words.astype(np.promote_types(self.words.dtype, words.dtype)), at, words[order])
+        self.word_rows = np.insert(self.word_rows, at, rows[order])
+        self.insert(self.filtered(self.filter_text, added))
+
+        # Avions déplacés : lignes affichées signalées modifiées, et nouveau tri si la colonne triée a pu changer
+        moved = np.flatnonzero(np.isin(self.columns['icao24'][self.view], diff.moved))
+        if len(moved) :
+            self.dataChanged.emit(self.index(int(moved[0]), 0), self.index(int(moved[-1]), len(self.COLUMNS) - 1))
+            if self.sort_column is not None and self.COLUMNS[self.sort_column][1] in self.DYNAMIC :
+                self.sort(self.sort_column, self.sort_order)
+
+    def insert(self, rows):
+        """Insère les lignes rows dans les lignes affichées, à leur place dans le tri courant (à la fin sans tri)"""
+        if len(rows) == 0 :
+            return
+        if self.sort_column is None :
+            positions = np.full(len(rows), len(self.view))
+        else :
+            values = self.columns[self.COLUMNS[self.sort_column][1]]
+            shown, new = values[self.view], values[rows]
+            order = np.argsort(new, kind='stable')
+            rows, new = rows[order], new[order]
+            if self.sort_order == Qt.DescendingOrder :
+                rows, new = rows[::-1], new[::-1]
+                positions = len(shown) - np.searchsorted(shown[::-1], new, 'left')
+            else :
+                positions = np.searchsorted(shown, new, 'right')
+        # Un bloc par position d'insertion, de la plus grande à la plus petite : les positions des blocs restants restent valables
+        starts = np.flatnonzero(np.r_[True, positions[1:] != positions[:-1]])
+        blocks = sorted(zip(starts.tolist(), np.r_[starts[1:], len(rows)].tolist()), key=lambda block : positions[block[0]], reverse=True)
+        for start, stop in blocks :
+            position = int(positions[start])
+            self.beginInsertRows(QModelIndex(), position, position + stop - start - 1)
+            self.view = np.insert(self.view, position, rows[start:stop])
+            self.endInsertRows()
+
+    def filtered(self, text, rows=None):
+        """Lignes (parmi rows, toutes par défaut) dont un mot commence par chacun des termes du texte, par dichotomie dans l'index"""
+        if rows is None :
+            rows = np.arange(len(self.columns['icao24']))
+        for term in text.lower().split() :
+            lo = np.searchsorted(self.words, term, 'left')
+            hi = np.searchsorted(self.words, term + '\U0010ffff', 'left')
+            rows = rows[np.isin(rows, self.word_rows[lo:hi])]
+        return rows
+
+    def set_filter(self, text):
+        """Filtre incrémental : un texte qui prolonge le précédent ne fait que restreindre les lignes déjà retenues (dans leur ordre)"""
+        self.beginResetModel()
+        if text.lower().startswith(self.filter_text.lower()) and len(text.split()) >= len(self.filter_text.split()) :
+            self.view = self.filtered(text, self.view)
+        else :
+            self.view = self.filtered(text)
+            self.order()
+        self.filter_text = text
+        self.endResetModel()
+
+    def order(self):
+        if self.sort_column is None :
+            return
+        values = self.columns[self.COLUMNS[self.sort_column][1]][self.view]
+        order = np.argsort(values, kind='stable')
+        self.view = self.view[order[::-1] if self.sort_order == Qt.DescendingOrder else order]
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Tri par colonne ; les index persistants (sélection) suivent leur avion"""
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        keys = [self.key(index.row()) for index in old]
+        self.sort_column, self.sort_order = column, order
+        self.order()
+        new = [self.index(self.row(key), index.column()) if self.row(key) is not None else QModelIndex() for key, index in zip(keys, old)]
+        self.changePersistentIndexList(old, new)
+        self.layoutChanged.emit()
+
+    def key(self, row):
+        """Code ICAO de l'avion affiché à la ligne row"""
+        return str(self.columns['icao24'][self.view[row]])
+
+    def row(self, key):
+        """Ligne affichée de l'avion key, None s'il n'est pas affiché"""
+        rows = np.flatnonzero(self.columns['icao24'][self.view] == key)
+        return int(rows[0]) if len(rows) else None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.view)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() :
+            return None
+        title, name, form = self.COLUMNS[index.column()]
+        value = self.columns[name][self.view[index.row()]]
+        if role == Qt.DisplayRole :
+            if isinstance(value, np.floating) and not np.isfinite(value) :
+                return ""
+            return form.format(value)
+        if role == Qt.TextAlignmentRole and form != "{}" :
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal :
+            return self.COLUMNS[section][0]
+        return None
+
 
 class PlaneListWidget(QGroupBox):
     """Bloc liste des avions, pour la sélection d'un avion"""
@@ -91,40 +425,50 @@ class PlaneListWidget(QGroupBox):
 
         layout = QGridLayout()
         self.setLayout(layout)
-        self.listwidget = QListWidget()
-        self.set_list()
 
-        self.listwidget.clicked.connect(self.plane_selec)
-        layout.addWidget(self.listwidget)
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filtrer : ICAO, immatriculation, modèle ou pays")
+        layout.addWidget(self.filter_edit)
+
+        self.model = FleetTableModel(controler)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setFont(QFont("Courier New", 10))
+        self.table.setSortingEnabled(True)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.verticalHeader().hide()
+        # Hauteur de ligne fixe : la vue ne calcule que les lignes visibles
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(self.table.fontMetrics().height() + 4)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        self.filter_edit.textChanged.connect(self.model.set_filter)
+        self.model.modelReset.connect(self.show_selection)
+        self.table.clicked.connect(self.plane_selec)
 
         self.reset_button = QPushButton("Reset de la sélection")
         layout.addWidget(self.reset_button)
         self.reset_button.clicked.connect(self.reset_selec)
-
-    def set_list(self): 
-        """Crée la liste des avions en vols pour la sélection"""
-        self.listwidget.insertItem(0," ICAO  | Marque et modèle                           | Pays d'origine       | Immat    ")
-        self.listwidget.insertItem(1,"--------------------------------------------------------------------------------------")
-        font = QFont("Courier New", 10)
-        self.listwidget.setFont(font)
-        i = 2
-        for plane in self.controler.plane_list :
-            self.listwidget.insertItem(i," | ".join([plane.icao,f"{plane.model:<42}",f"{plane.country:<20}",f"{plane.ID:<8}"]))
-            i+=1
+        self.shown = None           # ICAO de l'avion surligné dans la table
 
     def plane_selec(self, qmodelindex):
-        item = self.listwidget.currentItem()
-        message = item.text()
-
-        if message[0] == " " or message[0] =="-" :
-            return None
+        icao = self.model.key(qmodelindex.row())
+        self.shown = icao
+        self.controler.choose_plane(icao)
+
+    def show_selection(self):
+        """Surligne l'avion sélectionné (depuis la liste ou la carte), retrouvé par son code ICAO"""
+        icao = self.controler.selected
+        row = self.model.row(icao) if icao is not None else None
+        if row is None :
+            self.table.clearSelection()
         else :
-            self.controler.select_plane(message[:6])
-            self.controler.clear_route()
-            self.controler.clear_co2()
-            self.controler.compute_route(message[:6])
-
-        self.controler.refreshAll("Sélectionné : " + message)
+            self.table.selectRow(row)
+            if icao != self.shown :
+                self.table.scrollTo(self.model.index(row, 0))
+        self.shown = icao
 
     def reset_selec(self):
         self.controler.prep_plot_planes()
@@ -133,12 +477,10 @@ class PlaneListWidget(QGroupBox):
         self.controler.refreshAll("Sélection réinitialisée")
 
     def refresh(self):
-        if self.controler.refresh_planes_flag == True :
-            self.controler.refresh_planes()
-            self.listwidget.clear()
-            self.set_list()
-        else :
-            pass
+        if self.controler.diff is not None :
+            self.model.update(self.controler.diff)
+        if self.controler.selected != self.shown :
+            self.show_selection()
 
 class OneLineInfo(QTextEdit):
     """Bloc de log mini, une ligne pour afficher l'état actuel"""
@@ -171,6 +513,11 @@ class ButtonsWidget(QMenuBar):
 
         self.reset_button = QPushButton('Rafraichir la liste des avions')
         self.reset_button.clicked.connect(self.refresh_planes)
+
+        self.live_box = QCheckBox('Suivi en direct')
+        self.live_box.toggled.connect(self.controler.set_live)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.timeout.connect(self.controler.poll)
         
         self.label_dist = QLabel("Distance parcourue par l'avion sélectionné : ")
         self.label_dist.setFixedHeight(self.label_dist.fontMetrics().height() + 11)
@@ -187,7 +534,7 @@ class ButtonsWidget(QMenuBar):
         self.co2_button = QPushButton('Bilan CO2 partiel')
         self.co2_button.clicked.connect(self.compute_co2)
 
-        self.sublabel1_co2 = QLabel("Estimation du CO2,\nbasée sur un Bombardier Global Express \n(soit 4,9 kg CO2e/km) ")
+        self.sublabel1_co2 = QLabel("Estimation du CO2,\nselon le type d'avion et les phases de vol \n(4,9 kg CO2e/km par défaut) ")
         # Donnée : https://www.sciencesetavenir.fr/nature-environnement/climat/l-impact-ecologique-demesure-des-jets-prives_164673
 
         self.bilan_co2 = QTextEdit()
@@ -248,10 +595,16 @@ class ButtonsWidget(QMenuBar):
         buttongrid.addWidget(self.co2_button,0)
         buttongrid.addWidget(self.line,0)
         buttongrid.addWidget(self.reset_button,0)
+        buttongrid.addWidget(self.live_box,0)
 
         self.setLayout(buttongrid)
 
     def refresh(self):
+        if self.controler.live and not self.poll_timer.isActive() :
+            self.poll_timer.start(int(self.controler.live_interval * 1000))
+        elif not self.controler.live :
+            self.poll_timer.stop()
+
         length = self.controler.route_length
         self.route_length.clear()
         if length != 0 :
@@ -271,8 +624,7 @@ class ButtonsWidget(QMenuBar):
         self.controler.refreshAll('')
 
     def refresh_planes(self):
-        self.controler.refresh_planes_flag = True
-        self.controler.refreshAll("Listes des avions rafraichie")
+        self.controler.refresh_planes_async()
 
 class MainWidget(QGroupBox):
     def __init__(self, parent, controler):
@@ -283,14 +635,16 @@ class MainWidget(QGroupBox):
         menu = QHBoxLayout()
         self.paramswidget = PlaneListWidget(self, controler)
         self.chartswidget = Planisphere(self, controler)
-        # self.logwidget = LogWidget(self, controler)
+        # Bloc log de débogage, seulement quand les mesures sont actives
+        self.logwidget = LogWidget(self, controler) if metrics().enabled else None
         self.buttonswidget = ButtonsWidget(self,controler)
         self.oneline = OneLineInfo(self,controler)
         hlayout.addWidget(self.buttonswidget, 1)
         hlayout.addWidget(self.chartswidget, 4)
         vlayout.addLayout(hlayout,3)
         vlayout.addWidget(self.paramswidget,1)
-        #vlayout.addWidget(self.logwidget, 0)
+        if self.logwidget is not None :
+            vlayout.addWidget(self.logwidget, 0)
         vlayout.addWidget(self.oneline,0)
         self.setLayout(vlayout)
 
@@ -300,6 +654,9 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.setWindowTitle("JET TRACKER")
         self.setWindowIcon(QIcon("icon.png"))
+        # Les résultats des calculs en arrière-plan reviennent dans la boucle Qt
+        self.dispatcher = Dispatcher()
+        controler.dispatch = self.dispatcher.called.emit
         self.mainwidget = MainWidget(self, controler)
         self.setCentralWidget(self.mainwidget)
 
@@ -308,12 +665,112 @@ class MainWindow(QMainWindow):
         fileMenu = QMenu("&File", self)
         menuBar.addMenu(fileMenu)
 
-def main():
+### PROCEDURES DE TEST
+
+def benchRendu(n=2000, frames=50):
+    """Compare la durée d'une image : retracé complet de la carte (ancien drawgraph) et blitting des seules couches dynamiques"""
+    app = QApplication.instance() or QApplication([])
+    controler = Controler(background=True)
+    carte = Planisphere(None, controler)
+    carte.resize(1200, 700)
+    carte.canvas.draw()
+    rng = np.random.default_rng(0)
+
+    def move():
+        controler.plane_coord_list = (rng.uniform(-180, 180, n), rng.uniform(-90, 90, n))
+        controler.route_coord = (np.cumsum(rng.normal(0, 0.2, 500)) + 45, np.cumsum(rng.normal(0, 0.2, 500)))
+
+    # Ancien drawgraph : axes, côtes, frontières et océans reconstruits à chaque rafraîchissement, sur une figure de même taille
+    # (la figure est vidée à chaque image, là où l'ancien code empilait les axes : la référence est donc plutôt favorable)
+    figure = plt.figure()
+    canvas = FigureCanvas(figure)
+    canvas.resize(carte.canvas.size())
+    start = time.perf_counter()
+    for _ in range(frames) :
+        move()
+        figure.clear()
+        plt.figure(figure.number)
+        ax = plt.axes(projection=ccrs.PlateCarree())
+        ax.coastlines()
+        ax.add_feature(cfeature.BORDERS)
+        ax.add_feature(cfeature.OCEAN)
+        (x,y) = controler.plane_coord_list
+        (ry,rx) = controler.route_coord
+        ax.set_global()
+        ax.plot(x, y, 'or')
+        ax.plot(rx,ry,'-g')
+        figure.tight_layout()
+        canvas.draw()
+    full = (time.perf_counter() - start) / frames * 1000
+    plt.close(figure)
+
+    carte.frame_times.clear()
+    for _ in range(frames) :
+        move()
+        carte.drawgraph()
+    stats = carte.frameStats()
+    print(n, "avions - rendu complet :", "{:.1f}".format(full), "ms/image")
+    print(n, "avions - blitting :", "{:.1f}".format(stats['mean']), "ms/image (p95", "{:.1f}".format(stats['p95']), "ms)")
+
+
+def benchListe(sizes=[1000, 10000], filters=["c", "ce", "ces", "cess", "cessna", "cessna c"]):
+    """Compare la construction de l'ancienne liste (une chaîne par avion dans un QListWidget) et du modèle en colonnes, 
+    puis mesure le filtre incrémental à chaque frappe, et un rafraîchissement appliqué par différence ou par réinitialisation du modèle"""
+    app = QApplication.instance() or QApplication([])
+    jets_list = PrivateJets()
+    # Codes ICAO uniques, comme dans les réponses OpenSky (les jets synthétiques sont tirés avec remise)
+    unique = lambda answer : dict(answer, states=list({row[0] : row for row in answer["states"]}.values()))
+    for n in sizes :
+        controler = Controler(background=True)
+        answer = unique(syntheticStates(n, jets_list, jet_ratio=1.0))
+        controler.flying_planes = FlyingPlanes(answer["states"], jets_list)
+
+        start = time.perf_counter()
+        listwidget = QListWidget()
+        for plane in controler.flying_planes.flying :
+            listwidget.addItem(" | ".join([plane.icao, f"{plane.model:<42}", f"{plane.country:<20}", f"{plane.ID:<8}"]))
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        model = FleetTableModel(controler)
+        built = time.perf_counter() - start
+        timings = []
+        for text in filters :
+            start = time.perf_counter()
+            model.set_filter(text)
+            timings.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        model.sort(2, Qt.DescendingOrder)
+        sorting = time.perf_counter() - start
+        print(f"{len(controler.flying_planes)} avions : liste {legacy*1000:.1f} ms, modèle {built*1000:.1f} ms, tri {sorting*1000:.1f} ms, "
+              f"filtre par frappe (ms) : {', '.join(f'{t:.2f}' for t in timings)} -> {model.rowCount()} lignes")
+
+        model.set_filter("")
+        diff = controler.flying_planes.apply(*controler.flying_planes.filter(unique(moveStates(answer, 0.05, jets_list))["states"]))
+        start = time.perf_counter()
+        model.update(diff)
+        updated = time.perf_counter() - start
+        start = time.perf_counter()
+        model.reload()
+        reloaded = time.perf_counter() - start
+        print(f"   rafraîchissement ({diff}) : par différence {updated*1000:.1f} ms, par réinitialisation {reloaded*1000:.1f} ms")
+
+
+def main(profile=None, regional=False, store=None):
+    """profile : None sans mesures, sinon liste (éventuellement vide) des opérations à profiler, mesures affichées dans le bloc log
+    regional : flotte restreinte à la zone visible de la carte zoomée (voir Controler)
+    store : dossier de l'historique où sont enregistrés les instantanés et les routes calculées, aucun historique par défaut"""
+    if profile is not None :
+        enableMetrics(profile)
     app = QApplication([])
-    controler = Controler()
+    controler = Controler(background=True, store=HistoryStore(store) if store else None, regional=regional)
     win = MainWindow(controler)
     win.show()
+    controler.start()
     app.exec()
+    controler.shutdown()
+    for name in profile or [] :
+        print(metrics().profileReport(name) or name + " : jamais appelée")
 
 
 if __name__ == '__main__':
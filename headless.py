@@ -0,0 +1,145 @@
+####################################################################
+### MODE SANS INTERFACE
+### 18.10.2026
+### Nestor Laborier
+####################################################################
+
+### Module controleur (sans PyQt ni matplotlib, qui ne sont chargés qu'avec --gui)
+from controler import *
+
+import argparse
+import json
+import subprocess
+import sys
+
+# Intervalle par défaut entre deux instantanés de la flotte (s)
+HEADLESS_INTERVAL = 60
+
+
+def number(value) :
+    """Valeur numérique pour la sortie JSON, None si elle est absente (nan)"""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def snapshot(controler, diff=None, routes=0, icaos=None) :
+    """Résumé d'un instantané de la flotte en vol, avec les routes et le bilan CO2 des avions demandés
+    routes : nombre d'avions dont la route est calculée (dans l'ordre de la liste), icaos : avions choisis"""
+    fleet = controler.flying_planes
+    states = fleet.states
+    record = dict(time=time.time(), planes=len(fleet))
+    if diff is not None :
+        record["diff"] = dict(appeared=diff.appeared, disappeared=diff.disappeared, moved=len(diff.moved))
+
+    record["fleet"] = [dict(icao=str(states.icao24[k]), model=str(fleet.model[k]), callsign=str(states.callsign[k]).strip(),
+                            country=str(states.country[k]), lat=number(states.lat[k]), lon=number(states.lon[k]),
+                            altitude=number(states.altitude[k]), velocity=number(states.velocity[k]))
+                       for k in range(len(fleet))]
+
+    if icaos :
+        targets = [icao for icao in icaos if fleet.index(icao) is not None]
+    else :
+        targets = states.icao24[:routes].tolist()
+    if targets :
+        found = fleet.findRoutes(targets)
+        if controler.store is not None :
+            for route in found.values() :
+                controler.store.recordRoute(route)
+        # Découpage de toutes les routes en vols en une seule passe
+        legs = dict()
+        for leg in FlightLegs.fromRoutes(found.values(), fleet.jets_list.typecodes(list(found.keys()))).rows() :
+            legs.setdefault(leg['icao'], []).append(leg)
+        record["routes"] = [dict(icao=icao, points=len(route), length=route.length, legs=legs.get(icao, []))
+                            for icao, route in found.items()]
+        record["co2"] = sum(leg['co2'] for icao in legs for leg in legs[icao])
+    return record
+
+
+def run(interval=HEADLESS_INTERVAL, count=0, routes=0, icaos=None, output=None, store=None, log_metrics=False) :
+    """Boucle sans interface : un instantané toutes les interval secondes (count fois, indéfiniment si 0),
+    écrit en JSON, une ligne par instantané, dans le fichier output (ajout) ou sur la sortie standard
+    store : dossier de l'historique en colonnes (voir storage.py) où sont aussi enregistrés instantanés et routes
+    log_metrics : ajoute à chaque instantané l'état des mesures (voir metrics.py)"""
+    controler = Controler(store=HistoryStore(store) if store else None)
+    stream = open(output, 'a', encoding='utf-8') if output else sys.stdout
+    try :
+        diff = None
+        cycle = 0
+        while True :
+            start = time.time()
+            if cycle :
+                diff = controler.refresh_planes()
+            record = snapshot(controler, diff, routes, icaos)
+            if log_metrics :
+                record["metrics"] = metrics().snapshot()
+            stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            stream.flush()
+            cycle += 1
+            if count and cycle >= count :
+                break
+            time.sleep(max(0, interval - (time.time() - start)))
+    except KeyboardInterrupt :
+        pass
+    finally :
+        controler.shutdown()
+        if output :
+            stream.close()
+
+
+def parser() :
+    parser = argparse.ArgumentParser(description="Jet Tracker : suivi des jets privés et bilan CO2, sans interface graphique")
+    parser.add_argument('--interval', type=float, default=HEADLESS_INTERVAL, help="intervalle entre deux instantanés (s)")
+    parser.add_argument('--count', type=int, default=0, help="nombre d'instantanés (0 : sans fin)")
+    parser.add_argument('--routes', type=int, default=0, help="nombre d'avions dont la route et le CO2 sont calculés")
+    parser.add_argument('--icao', nargs='*', default=None, help="avions dont la route et le CO2 sont calculés")
+    parser.add_argument('--output', default=None, help="fichier JSON lines de sortie (par défaut : sortie standard)")
+    parser.add_argument('--store', default=None, help="dossier de l'historique des instantanés et des routes")
+    parser.add_argument('--compact', action='store_true', help="compacte l'historique de --store, puis s'arrête")
+    parser.add_argument('--metrics', action='store_true', help="mesure les chemins critiques : état des mesures ajouté à chaque instantané, bloc log dans l'interface")
+    parser.add_argument('--metrics-port', type=int, default=None, help="sert les mesures au format Prometheus sur http://localhost:PORT/metrics")
+    parser.add_argument('--profile', nargs='*', default=[], help="opérations profilées avec cProfile (ex. fleet.filter), profils affichés à la fin")
+    parser.add_argument('--gui', action='store_true', help="lance l'interface graphique")
+    parser.add_argument('--regional', action='store_true', help="interface : ne suit que les avions de la zone visible de la carte zoomée (requêtes moins coûteuses)")
+    parser.add_argument('--bench', action='store_true', help="compare les temps de démarrage avec et sans interface")
+    return parser
+
+
+def main(argv=None) :
+    args = parser().parse_args(argv)
+    measured = args.metrics or args.metrics_port is not None or bool(args.profile)
+    if measured :
+        enableMetrics(args.profile)
+    if args.metrics_port is not None :
+        serveMetrics(args.metrics_port)
+    if args.bench :
+        benchDemarrage()
+    elif args.compact :
+        store = HistoryStore(args.store or STORE_PATH)
+        print(store.compact(), "segments compactés")
+        print(store)
+    elif args.gui :
+        # PyQt, matplotlib et cartopy ne sont importés qu'ici
+        import graphics
+        graphics.main(args.profile if measured else None, args.regional, args.store)
+    else :
+        run(args.interval, args.count, args.routes, args.icao, args.output, args.store, args.metrics)
+        for name in args.profile :
+            print(metrics().profileReport(name) or name + " : jamais appelée", file=sys.stderr)
+
+
+### PROCEDURES DE TEST
+
+def benchDemarrage(modules=['engine', 'controler', 'headless', 'graphics'], runs=3) :
+    """Compare les temps d'import des modules, chacun dans un nouvel interpréteur (meilleur de runs essais)"""
+    folder = os.path.dirname(os.path.abspath(__file__))
+    code = "import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)"
+    for module in modules :
+        timings = []
+        for k in range(runs) :
+            result = subprocess.run([sys.executable, '-c', code.format(module)], cwd=folder, capture_output=True, text=True)
+            timings.append(float(result.stdout.split()[-1]))
+        print(f"import {module:10s} : {min(timings)*1000:8.1f} ms")
+
+
+if __name__ == '__main__' :
+    main()
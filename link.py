@@ -6,17 +6,112 @@
 
 from opensky_api import OpenSkyApi
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 import json
+import os
 
+from cache import *
+from metrics import *
+
+import asyncio
+import math
+import random
+import threading
 import time    
+from concurrent.futures import ThreadPoolExecutor
+
+# URL de base de l'API REST OpenSky
+REST_URL = "https://opensky-network.org/api"
+
+# Paramètres par défaut du client REST
+REST_TIMEOUT = (5, 30)          # Délais de connexion et de lecture, en secondes
+REST_POOL_SIZE = 10             # Nombre de connexions persistantes gardées ouvertes
+REST_RETRIES = 4                # Nombre de nouvelles tentatives sur 429, 5xx ou erreur réseau
+REST_BACKOFF = 1.0              # Base du délai exponentiel entre deux tentatives, en secondes
+REST_MAX_WAIT = 60              # Attente maximale acceptée, au-delà la requête est abandonnée
+
+# Limite de débit des traces : crédits regagnés par seconde, réserve maximale, et coût d'une requête /tracks/all
+# (à adapter au quota du compte OpenSky utilisé)
+TRACKS_RATE = 4.0
+TRACKS_BURST = 10
+TRACKS_COST = 1
+
+# Intervalle minimal entre deux requêtes de vecteurs d'états imposé par OpenSky (10 s sans compte, 5 s avec), avec une marge
+STATES_INTERVAL = 11
+
+# Coût en crédits OpenSky d'une requête /states/all selon la surface de sa zone (degrés carrés) : (surface maximale, crédits), 
+# STATES_GLOBAL_CREDITS au-delà ou sans zone (requêtes globales, et filtrées par codes ICAO seuls)
+STATES_AREA_CREDITS = [(25, 1), (100, 2), (400, 3)]
+STATES_GLOBAL_CREDITS = 4
+
+# Planification des requêtes de vecteurs d'états (voir QueryPlanner) : codes ICAO par requête filtrée, 
+# estimations initiales (affinées par les réponses) du nombre d'avions dans le monde, de la taille JSON d'un vecteur d'états 
+# et de l'en-tête d'une réponse (octets), arbitrage octets / crédits, et délai maximal entre deux requêtes couvrant le monde entier (s)
+ICAO_BATCH = 100
+GLOBAL_STATES = 10000
+STATE_BYTES = 200
+RESPONSE_BYTES = 400
+BYTES_PER_CREDIT = 1000000
+GLOBAL_REFRESH = 300
+
+# Sessions HTTP partagées (keep-alive), une par taille de pool
+_sessions = dict()
+
+def sharedSession(pool_size=REST_POOL_SIZE) :
+    """Renvoie la session HTTP partagée pour cette taille de pool, créée au premier appel : 
+    les connexions TCP+TLS sont réutilisées d'une requête à l'autre"""
+    if pool_size not in _sessions :
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _sessions[pool_size] = session
+    return _sessions[pool_size]
 
 class OSapi(OpenSkyApi) :
-    def __init__(self):
-        
-        ### ADD CREDENTIALS BELOW
-        super().__init__('','')
-        ### ADD CREDENTIALS ABOVE
+
+    ### ADD CREDENTIALS BELOW
+    user = ''
+    code = ''
+    ### ADD CREDENTIALS ABOVE
+
+    def __init__(self, cache=None):
+        super().__init__(self.user, self.code)
+
+        # Cache disque des vecteurs d'états (False pour le désactiver)
+        self.cache = sharedCache() if cache is None else cache
+
+    def statesKey(self, time_secs=0, icao24=None, bbox=()) :
+        """Clef de cache d'une requête de vecteurs d'états"""
+        icaos = icao24 if isinstance(icao24, str) or icao24 is None else ','.join(sorted(icao24))
+        return 'states:' + str(int(time_secs)) + ':' + str(icaos) + ':' + ','.join([str(b) for b in bbox])
+
+    def cachedStates(self, time_secs=0, icao24=None, bbox=()) :
+        """Renvoie la réponse en cache pour cette requête, None si elle n'y est pas"""
+        if not self.cache :
+            return None
+        return self.cache.get(self.statesKey(time_secs, icao24, bbox))
+
+    def get_states(self, time_secs=0, icao24=None, serials=None, bbox=()) :
+        """Vecteurs d'états OpenSky, servis par le cache disque s'ils y sont : 
+        les réponses en temps réel vivent LIVE_TTL secondes, les réponses datées (immuables) sont gardées, 
+        et chaque instantané en temps réel est aussi rangé sous son horodatage"""
+        if not self.cache or serials is not None :
+            with timer('opensky.states') :
+                return super().get_states(time_secs, icao24, serials, bbox)
+
+        states = self.cachedStates(time_secs, icao24, bbox)
+        if states is None :
+            with timer('opensky.states') :
+                states = super().get_states(time_secs, icao24, serials, bbox)
+            if states is not None :
+                self.cache.put(self.statesKey(time_secs, icao24, bbox), states, LIVE_TTL if time_secs == 0 else None)
+                if time_secs == 0 and states.time :
+                    self.cache.put(self.statesKey(states.time, icao24, bbox), states)
+        else :
+            count('opensky.states.cache')
+        return states
 
     def getCurrentPlaneState(self,icao_code) :
         """Récupère le vecteur d'états de l'avion icao_code, et tout les vecteurs en ligne si icao_code = [], au temps présent"""
@@ -28,6 +123,15 @@ class OSapi(OpenSkyApi) :
         state = self.get_states(time,icao_code)
         return state
 
+    def getScheduledState(self,time,icao_code) :
+        """Comme getTimePlaneState, en attendant seulement le temps nécessaire depuis la dernière requête (limite de débit OpenSky),
+        le planificateur étant partagé par toutes les instances"""
+        state = self.cachedStates(time,icao_code)
+        if state is None :
+            states_bucket.acquire()
+            state = self.get_states(time,icao_code)
+        return state
+
     def getCurrentStates(self):
         """Récupère tous les vecteurs d'états des avions actuellement en vol"""
         states = self.get_states(0)
@@ -41,24 +145,316 @@ class OSapi(OpenSkyApi) :
         return state
 
 class RESTapi():
-    def __init__(self) :
+    def __init__(self, url=REST_URL, session=None, timeout=REST_TIMEOUT, retries=REST_RETRIES, pool_size=REST_POOL_SIZE, cache=None) :
 
         ### ADD CREDENTIALS BELOW
         self.user = ""
         self.code = ""
         ### ADD CREDENTIALS ABOVE
 
-    def getCurrentRoute(self,icao):
+        self.url = url
+        self.session = session if session is not None else sharedSession(pool_size)
+        self.timeout = timeout
+        self.retries = retries
+
+        # Cache disque des traces (False pour le désactiver)
+        self.cache = sharedCache() if cache is None else cache
+
+    def retryDelay(self, attempt, answer=None) :
+        """Délai avant la tentative suivante : celui demandé par le serveur (X-Rate-Limit-Retry-After-Seconds) s'il est donné, 
+        sinon un délai exponentiel avec gigue aléatoire ("full jitter")"""
+        if answer is not None :
+            retry_after = answer.headers.get('X-Rate-Limit-Retry-After-Seconds') or answer.headers.get('Retry-After')
+            try :
+                return float(retry_after) + random.uniform(0, REST_BACKOFF)
+            except (TypeError, ValueError) :
+                pass
+        return random.uniform(0, min(REST_MAX_WAIT, REST_BACKOFF * 2 ** attempt))
+
+    def get(self, path, params=None) :
+        """Requête GET sur l'API REST, avec nouvelles tentatives sur limite de débit (429), erreur serveur (5xx) ou erreur réseau
+        Renvoie la dernière réponse reçue, None si le serveur est resté injoignable"""
+        auth = HTTPBasicAuth(self.user, self.code) if self.user else None
+        answer = None
+        for attempt in range(self.retries + 1) :
+            try :
+                with timer('rest.request') :
+                    answer = self.session.get(self.url + path, params=params, auth=auth, timeout=self.timeout)
+                count('rest.requests')
+                count('rest.bytes', len(answer.content))
+                if answer.status_code != 429 and answer.status_code < 500 :
+                    return answer
+            except requests.exceptions.RequestException :
+                count('rest.errors')
+                answer = None
+
+            if attempt < self.retries :
+                delay = self.retryDelay(attempt, answer)
+                # Quota épuisé pour longtemps (crédits journaliers) : inutile d'attendre
+                if delay > REST_MAX_WAIT :
+                    break
+                count('rest.retries')
+                time.sleep(delay)
+        return answer
+
+    def getCurrentRoute(self,icao,t=0):
         """Renvoie la liste des positions de l'avion en ligne, un erreur si il n'est pas en cours d'émission \n Format : [time,latitude,longitude,altitude,true_track,on_ground_flag]"""
-        url = "https://opensky-network.org/api/tracks/all?icao24="+icao+"&time=0"
-        auth = HTTPBasicAuth(self.user,self.code)
-        answer = requests.get(url,auth)
+        # Traces en cache : la trace en cours vit LIVE_TTL secondes, une trace datée (icao, dernier contact) est gardée
+        key = 'track:' + icao + ':' + str(int(t))
+        if self.cache :
+            path = self.cache.get(key)
+            if path is not None :
+                count('rest.tracks.cache')
+                return path
+
+        answer = self.get("/tracks/all", {'icao24' : icao, 'time' : t})
+        if answer is None :
+            print("Erreur d'acquisition de la route : serveur injoignable")
+            return []
         try :
-            return answer.json()['path']
-        except json.decoder.JSONDecodeError as e :
-            print("Erreur d'acquisition de la route")
+            with timer('rest.decode') :
+                track = answer.json()
+            path = track['path']
+        except (ValueError, KeyError, TypeError) :
+            print("Erreur d'acquisition de la route (code HTTP " + str(answer.status_code) + ")")
             return []
 
+        if self.cache and path is not None :
+            self.cache.put(key, path, LIVE_TTL if t == 0 else None)
+            if t == 0 and track.get('endTime') :
+                self.cache.put('track:' + icao + ':' + str(int(track['endTime'])), path)
+        return path
+
+
+
+class TokenBucket :
+    """Seau à jetons pour le respect des crédits OpenSky : rate crédits regagnés par seconde, jusqu'à capacity, 
+    chaque requête en consomme cost (utilisable depuis des threads ou depuis asyncio)"""
+    def __init__(self, rate, capacity) :
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, cost=1) :
+        """Réserve cost crédits et renvoie le délai à attendre avant de pouvoir les utiliser (les réservations sont servies dans l'ordre)"""
+        with self.lock :
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= cost
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self, cost=1) :
+        """Attend (en bloquant) que cost crédits soient disponibles"""
+        time.sleep(self.reserve(cost))
+
+    async def acquireAsync(self, cost=1) :
+        """Attend (sans bloquer la boucle asyncio) que cost crédits soient disponibles"""
+        await asyncio.sleep(self.reserve(cost))
+
+
+# Planificateur partagé des requêtes de vecteurs d'états : une requête par STATES_INTERVAL secondes
+states_bucket = TokenBucket(1 / STATES_INTERVAL, 1)
+
+
+class TrackFetcher :
+    """Récupération concurrente des traces (/tracks/all) d'une liste d'avions avec asyncio : 
+    au plus concurrency requêtes en cours, débit limité par un seau à jetons, résultats rendus dans leur ordre d'arrivée"""
+    def __init__(self, rest=None, concurrency=8, bucket=None) :
+        self.concurrency = concurrency
+        self.rest = rest if rest is not None else RESTapi(pool_size=concurrency)
+        self.bucket = bucket if bucket is not None else TokenBucket(TRACKS_RATE, TRACKS_BURST)
+
+    async def stream(self, icaos, t=0) :
+        """Générateur asynchrone des couples (icao, path), au fur et à mesure que les traces arrivent"""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        executor = ThreadPoolExecutor(self.concurrency)
+
+        async def fetch(icao) :
+            async with semaphore :
+                await self.bucket.acquireAsync(TRACKS_COST)
+                path = await loop.run_in_executor(executor, self.rest.getCurrentRoute, icao, t)
+            return icao, path
+
+        tasks = [asyncio.ensure_future(fetch(icao)) for icao in icaos]
+        try :
+            for task in asyncio.as_completed(tasks) :
+                yield await task
+        finally :
+            for task in tasks :
+                task.cancel()
+            executor.shutdown(wait=False)
+
+    def fetchAll(self, icaos, callback=None, t=0) :
+        """Récupère toutes les traces et renvoie le dictionnaire icao -> path, en appelant callback(icao, path) à chaque arrivée"""
+        async def collect() :
+            paths = dict()
+            async for icao, path in self.stream(icaos, t) :
+                paths[icao] = path
+                if callback is not None :
+                    callback(icao, path)
+            return paths
+        return asyncio.run(collect())
+
+
+def splitArea(bbox) :
+    """Découpe la zone bbox (lon_min, lon_max, lat_min, lat_max) à l'antiméridien : deux zones si lon_min > lon_max, 
+    l'API ne servant que des zones de longitudes croissantes"""
+    lon_min, lon_max, lat_min, lat_max = bbox
+    if lon_min > lon_max :
+        return [(lon_min, 180.0, lat_min, lat_max), (-180.0, lon_max, lat_min, lat_max)]
+    return [bbox]
+
+def areaCredits(bbox) :
+    """Coût en crédits des requêtes /states/all sur la zone bbox (lon_min, lon_max, lat_min, lat_max), globale si bbox est None
+    (une zone à cheval sur l'antiméridien coûte ses deux moitiés, voir splitArea)"""
+    if bbox is None :
+        return STATES_GLOBAL_CREDITS
+    total = 0
+    for lon_min, lon_max, lat_min, lat_max in splitArea(bbox) :
+        area = (lon_max - lon_min) * (lat_max - lat_min)
+        total += next((credits for limit, credits in STATES_AREA_CREDITS if area <= limit), STATES_GLOBAL_CREDITS)
+    return total
+
+
+class QueryPlanner :
+    """Choix, à chaque rafraîchissement, de la requête de vecteurs d'états la moins coûteuse en crédits et en octets estimés :
+    - 'global' : tous les avions du monde
+    - 'bbox' : la zone visible de la carte seulement, quand elle est donnée
+    - 'icao' : les jets déjà connus, par lots de ICAO_BATCH codes, tant qu'une requête globale a eu lieu il y a moins de GLOBAL_REFRESH s 
+      (les jets qui décollent ne sont découverts que par une requête globale ou de zone)
+    Une requête de zone ne renvoie que les avions de la zone : la flotte suivie s'y restreint jusqu'à la requête globale suivante
+    Les requêtes passent par la session REST partagée (avec les identifiants de OSapi si RESTapi n'en a pas), pour mesurer octets reçus 
+    et durée du décodage JSON, cumulés par stratégie ; elles sont servies par le cache disque (réponses en temps réel, LIVE_TTL secondes)
+    et cadencées par le planificateur des vecteurs d'états (states_bucket)"""
+
+    STRATEGIES = ['global', 'bbox', 'icao']
+
+    def __init__(self, rest=None, cache=None, bucket=None, bytes_per_credit=BYTES_PER_CREDIT) :
+        if rest is None :
+            rest = RESTapi()
+            if not rest.user :
+                rest.user, rest.code = OSapi.user, OSapi.code
+        self.rest = rest
+        self.cache = sharedCache() if cache is None else cache      # False pour le désactiver
+        self.bucket = states_bucket if bucket is None else bucket
+        self.bytes_per_credit = bytes_per_credit
+        self.global_states = GLOBAL_STATES      # Nombre d'avions dans le monde, d'après la dernière requête globale
+        self.state_bytes = STATE_BYTES          # Taille JSON moyenne d'un vecteur d'états, d'après les réponses reçues
+        self.last_global = None                 # Instant de la dernière requête globale, None si une requête de zone a restreint la flotte depuis
+        self.last = None                        # Bilan de la dernière requête
+        self.totals = {strategy : dict(fetches=0, requests=0, credits=0, bytes=0, decode=0.0, states=0) for strategy in self.STRATEGIES}
+        self.lock = threading.Lock()
+
+    def __repr__(self) :
+        return '\n'.join(f"{strategy:6s} : {t['fetches']} rafraîchissement(s), {t['requests']} requête(s), {t['credits']} crédits, "
+                         f"{t['bytes']/1e6:.2f} Mo, décodage {t['decode']*1000:.0f} ms, {t['states']} vecteurs d'états"
+                         for strategy, t in self.totals.items() if t['fetches'])
+
+    def plans(self, known=(), bbox=None, share=None, now=None) :
+        """Requêtes possibles, avec leurs estimations : liste de dictionnaires (stratégie, requêtes, crédits, octets, score)
+        known : codes ICAO des jets connus, bbox : zone visible (lon_min, lon_max, lat_min, lat_max, lon_min > lon_max si elle passe 
+        l'antiméridien) ou None, share : part des avions dans la zone (par défaut, sa part de la surface du globe)"""
+        now = time.time() if now is None else now
+        candidates = [dict(strategy='global', requests=[dict()], credits=STATES_GLOBAL_CREDITS, states=self.global_states)]
+        if bbox is not None :
+            areas = splitArea(bbox)
+            if share is None :
+                share = sum((lon_max - lon_min) * (math.sin(math.radians(lat_max)) - math.sin(math.radians(lat_min))) / 720 
+                            for lon_min, lon_max, lat_min, lat_max in areas)
+            candidates.append(dict(strategy='bbox', credits=areaCredits(bbox), states=self.global_states * share,
+                                   requests=[dict(lamin=lat_min, lomin=lon_min, lamax=lat_max, lomax=lon_max) for lon_min, lon_max, lat_min, lat_max in areas]))
+        elif len(known) and self.last_global is not None and now - self.last_global < GLOBAL_REFRESH :
+            known = sorted(known)
+            batches = [dict(icao24=known[k:k+ICAO_BATCH]) for k in range(0, len(known), ICAO_BATCH)]
+            candidates.append(dict(strategy='icao', requests=batches, credits=STATES_GLOBAL_CREDITS * len(batches), states=len(known)))
+        for plan in candidates :
+            plan['bytes'] = plan['states'] * self.state_bytes + RESPONSE_BYTES * len(plan['requests'])
+            plan['score'] = plan['credits'] + plan['bytes'] / self.bytes_per_credit
+        return candidates
+
+    def choose(self, known=(), bbox=None, share=None, now=None) :
+        """Requête au plus petit score (crédits, plus octets convertis en crédits)"""
+        return min(self.plans(known, bbox, share, now), key=lambda plan : plan['score'])
+
+    def statesKey(self, params) :
+        """Clef de cache d'une requête /states/all en temps réel"""
+        return 'rest.states:' + ':'.join(key + '=' + (','.join(value) if isinstance(value, list) else str(value)) for key, value in sorted(params.items()))
+
+    def request(self, params) :
+        """Réponse décodée d'une requête /states/all, servie par le cache si elle y est : (contenu, octets reçus, durée du décodage), 
+        None en cas d'échec"""
+        key = self.statesKey(params)
+        if self.cache :
+            content = self.cache.get(key)
+            if content is not None :
+                count('opensky.states.cache')
+                return content, 0, 0.0
+        self.bucket.acquire()
+        answer = self.rest.get("/states/all", params)
+        if answer is None or answer.status_code != 200 :
+            return None
+        start = time.perf_counter()
+        try :
+            content = answer.json()
+        except ValueError :
+            return None
+        decode = time.perf_counter() - start
+        if self.cache :
+            self.cache.put(key, content, LIVE_TTL)
+        return content, len(answer.content), decode
+
+    def fetch(self, plan) :
+        """Exécute les requêtes d'un plan, et renvoie la réponse /states/all fusionnée ({'time', 'states'}), None en cas d'échec"""
+        states, stamp, size, decode, cached = [], 0, 0, 0.0, 0
+        for params in plan['requests'] :
+            result = self.request(params)
+            if result is None :
+                return None
+            content, received, elapsed = result
+            cached += received == 0
+            size += received
+            decode += elapsed
+            states += content.get('states') or []
+            stamp = max(stamp, content.get('time') or 0)
+
+        # Réponses toutes servies par le cache : aucun crédit dépensé
+        credits = 0 if cached == len(plan['requests']) else plan['credits']
+        report = dict(strategy=plan['strategy'], requests=len(plan['requests']), credits=credits, bytes=size, 
+                      estimated=int(plan['bytes']), decode=decode, states=len(states))
+        with self.lock :
+            if states and not cached :
+                self.state_bytes = max(1, (size - RESPONSE_BYTES * len(plan['requests'])) / len(states))
+            if plan['strategy'] == 'global' :
+                self.global_states = len(states)
+                self.last_global = time.time()
+            elif plan['strategy'] == 'bbox' :
+                self.last_global = None
+            totals = self.totals[plan['strategy']]
+            totals['fetches'] += 1
+            for key in ['requests', 'credits', 'bytes', 'decode', 'states'] :
+                totals[key] += report[key]
+            self.last = report
+        count('states.bytes.' + plan['strategy'], size)
+        count('states.credits.' + plan['strategy'], credits)
+        if metrics().enabled :
+            metrics().record('states.decode.' + plan['strategy'], decode)
+        return {'time' : stamp, 'states' : states}
+
+    def states(self, known=(), bbox=None, share=None) :
+        """Choisit et exécute la requête la moins coûteuse (voir plans) ; renvoie la réponse /states/all, None en cas d'échec"""
+        return self.fetch(self.choose(known, bbox, share))
+
+    def describe(self) :
+        """Résumé de la dernière requête, pour l'affichage"""
+        last = self.last
+        if last is None :
+            return ""
+        return (f"{last['strategy']}, {last['requests']} requête(s), {last['credits']} crédits, {last['bytes']/1e3:.0f} ko "
+                f"(estimé {last['estimated']/1e3:.0f} ko), décodage {last['decode']*1000:.0f} ms")
 
 
 def initiateOpenSkyAPI() :
@@ -103,6 +499,140 @@ def testREST():
     rest = RESTapi()
     print(rest.getCurrentRoute('a77a32'))
 
+def startStubServer(latency=0, statuses=[], states=None) :
+    """Lance un serveur HTTP local imitant /tracks/all, dans un thread : chaque requête attend latency secondes, 
+    les premières réponses prennent les codes de statuses (429 avec X-Rate-Limit-Retry-After-Seconds), puis 200 avec une trace fictive
+    states : réponse /states/all servie (filtrée selon les paramètres icao24 et lamin, lomin, lamax, lomax), s'il est donné
+    Renvoie le serveur (server.requests, server.connections pour le suivi) et son URL"""
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+
+    class StubHandler(BaseHTTPRequestHandler) :
+        protocol_version = "HTTP/1.1"
+
+        def setup(self) :
+            super().setup()
+            self.server.connections += 1
+
+        def do_GET(self) :
+            with self.server.lock :
+                self.server.requests += 1
+                status = self.server.statuses.pop(0) if self.server.statuses else 200
+            time.sleep(self.server.latency)
+            query = parse_qs(urlparse(self.path).query)
+            if status == 200 and self.server.states is not None and urlparse(self.path).path.endswith('/states/all') :
+                rows = self.server.states['states']
+                if 'icao24' in query :
+                    icaos = set(query['icao24'])
+                    rows = [row for row in rows if row[0] in icaos]
+                if 'lamin' in query :
+                    lat_min, lon_min, lat_max, lon_max = [float(query[key][0]) for key in ['lamin', 'lomin', 'lamax', 'lomax']]
+                    rows = [row for row in rows if lat_min <= row[6] <= lat_max and lon_min <= row[5] <= lon_max]
+                body = json.dumps({'time' : self.server.states['time'], 'states' : rows or None})
+            elif status == 200 :
+                icao = query.get('icao24', ['000000'])[0]
+                now = int(time.time())
+                body = json.dumps({'icao24' : icao, 'startTime' : now - 600, 'endTime' : now, 'callsign' : None,
+                                   'path' : [[now - 600 + 60 * k, 45 + 0.1 * k, 2 + 0.1 * k, 10000, 45, False] for k in range(10)]})
+            else :
+                body = "Too many requests" if status == 429 else "Error"
+            body = body.encode()
+            self.send_response(status)
+            if status == 429 :
+                self.send_header('X-Rate-Limit-Retry-After-Seconds', '0')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) :
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.statuses = list(statuses)
+    server.states = states
+    server.requests = 0
+    server.connections = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:" + str(server.server_address[1])
+
+def testRESTStub():
+    """Teste le client REST contre un serveur local : reprise après 429 et 503, réutilisation des connexions, et cache des traces"""
+    server, url = startStubServer(statuses=[429, 503])
+    rest = RESTapi(url=url, cache=False)
+    path = rest.getCurrentRoute('a77a32')
+    print("Route reçue après 429 puis 503 : " + str(len(path)) + " points, " + str(server.requests) + " requêtes")
+    for k in range(10) :
+        rest.getCurrentRoute('a77a32')
+    print(str(server.requests) + " requêtes sur " + str(server.connections) + " connexion(s) TCP")
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as folder :
+        rest = RESTapi(url=url, cache=DiskCache(os.path.join(folder, 'test.sqlite')))
+        before = server.requests
+        for k in range(10) :
+            rest.getCurrentRoute('a77a32')
+        print("10 appels avec cache : " + str(server.requests - before) + " requête(s), " + str(rest.cache))
+        rest.cache.db.close()
+    server.shutdown()
+
+
+def benchTrackFetcher(n=100, latency=0.2, concurrency=16) :
+    """Compare le débit de récupération de n traces une par une et avec le TrackFetcher, contre un serveur local de latence donnée"""
+    server, url = startStubServer(latency=latency)
+    icaos = ["%06x" % k for k in range(n)]
+
+    start = time.perf_counter()
+    rest = RESTapi(url=url, cache=False)
+    for icao in icaos[:max(1, n // 10)] :
+        rest.getCurrentRoute(icao)
+    sequential = (time.perf_counter() - start) / max(1, n // 10)
+
+    fetcher = TrackFetcher(RESTapi(url=url, pool_size=concurrency, cache=False), concurrency, TokenBucket(1000, 1000))
+    start = time.perf_counter()
+    paths = fetcher.fetchAll(icaos)
+    concurrent = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"Latence injectée : {latency*1000:.0f} ms, {n} traces")
+    print(f"Une par une        : {1/sequential:8.1f} traces/s (estimé sur {max(1, n // 10)} requêtes)")
+    print(f"TrackFetcher ({concurrency:>3}) : {len(paths)/concurrent:8.1f} traces/s")
+
+
+def benchRequetes(n=10000, jets=[20, 500], bbox=(-10.0, 30.0, 35.0, 60.0)) :
+    """Compare les stratégies de requête des vecteurs d'états (octets reçus, décodage, crédits) contre un serveur local
+    servant n vecteurs d'états synthétiques, pour une flotte connue de jets avions et pour une zone visible bbox"""
+    rng = random.Random(0)
+    t = int(time.time())
+    rows = [["%06x" % rng.randrange(1 << 24), "CS%05d   " % k, "France", t - 2, t - 1, rng.uniform(-180, 180), rng.uniform(-80, 80),
+             rng.uniform(0, 13000), False, rng.uniform(50, 280), rng.uniform(0, 360), 0.0, None, None, None, False, 0] for k in range(n)]
+    server, url = startStubServer(states={'time' : t, 'states' : rows})
+    # Serveur local : ni cache, ni limite de débit
+    planner = QueryPlanner(RESTapi(url=url, cache=False), cache=False, bucket=TokenBucket(1000, 1000))
+    planner.fetch(planner.choose())
+
+    def run(plans, strategy, label) :
+        plan = next(plan for plan in plans if plan['strategy'] == strategy)
+        planner.fetch(plan)
+        print(f"   {label:28s} : {planner.describe()}, {planner.last['states']} avions")
+
+    for known in jets :
+        icaos = [row[0] for row in rng.sample(rows, known)]
+        plans = planner.plans(icaos)
+        print(f"{known} jets connus, carte entière : choix '{min(plans, key=lambda plan : plan['score'])['strategy']}'")
+        run(plans, 'global', 'globale')
+        run(plans, 'icao', 'par codes ICAO')
+    plans = planner.plans((), bbox)
+    print(f"Zone visible {bbox} : choix '{min(plans, key=lambda plan : plan['score'])['strategy']}'")
+    run(plans, 'global', 'globale')
+    run(plans, 'bbox', 'zone visible')
+    server.shutdown()
+    print(planner)
+
 
 if __name__ == "__main__" :
     testLiaison()
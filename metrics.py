@@ -0,0 +1,234 @@
+####################################################################
+### MESURES DES CHEMINS CRITIQUES (CHRONOMETRES ET COMPTEURS)
+### 18.10.2026
+### Nestor Laborier
+####################################################################
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+
+# Noms exportés par from metrics import * (les modules chronométrés n'ont besoin que des fonctions d'accès)
+__all__ = ['metrics', 'enableMetrics', 'timed', 'timer', 'count', 'serveMetrics']
+
+# Variable d'environnement activant les mesures au lancement : '1', ou la liste (séparée par des virgules) des opérations à profiler
+METRICS_ENV = 'JET_TRACKER_METRICS'
+
+# Préfixe des métriques exportées au format texte Prometheus
+METRICS_PREFIX = 'jet_tracker'
+
+# Nombre de lignes des profils cProfile affichés
+PROFILE_LINES = 20
+
+
+class Metrics :
+    """Chronomètres (nombre d'appels, durée totale et maximale) et compteurs par opération, partagés par tous les threads
+    Désactivées, les mesures se réduisent à un test de booléen par appel ; les opérations listées dans profiled sont en plus
+    exécutées sous cProfile, un profil cumulé par opération"""
+
+    def __init__(self) :
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.timers = dict()        # Opération -> [appels, durée totale (s), durée maximale (s)]
+        self.counters = dict()      # Compteur -> valeur
+        self.profiled = set()
+        self.profiles = dict()      # Opération -> cProfile.Profile cumulé
+        self.started = time.time()
+
+    def enable(self, profile=()) :
+        self.profiled = set(profile)
+        self.enabled = True
+
+    def disable(self) :
+        self.enabled = False
+
+    def reset(self) :
+        with self.lock :
+            self.timers.clear()
+            self.counters.clear()
+            self.profiles.clear()
+            self.started = time.time()
+
+    def record(self, name, elapsed) :
+        with self.lock :
+            timer = self.timers.get(name)
+            if timer is None :
+                self.timers[name] = [1, elapsed, elapsed]
+            else :
+                timer[0] += 1
+                timer[1] += elapsed
+                timer[2] = max(timer[2], elapsed)
+
+    def count(self, name, value=1) :
+        if self.enabled :
+            with self.lock :
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def run(self, name, function, *args, **kwargs) :
+        """Exécute function en la chronométrant (et en la profilant si elle est dans profiled)"""
+        profile = None
+        if name in self.profiled :
+            with self.lock :
+                profile = self.profiles.setdefault(name, cProfile.Profile())
+        start = time.perf_counter()
+        try :
+            if profile is None :
+                return function(*args, **kwargs)
+            try :
+                profile.enable()
+            except ValueError :
+                # Un autre profil est déjà actif (appel imbriqué ou autre thread) : simple chronométrage
+                return function(*args, **kwargs)
+            try :
+                return function(*args, **kwargs)
+            finally :
+                profile.disable()
+        finally :
+            self.record(name, time.perf_counter() - start)
+
+    def snapshot(self) :
+        """Etat des mesures : chronomètres (appels, total et maximum en secondes) et compteurs"""
+        with self.lock :
+            return dict(since=self.started,
+                        timers={name : dict(count=t[0], total=t[1], max=t[2]) for name, t in sorted(self.timers.items())},
+                        counters=dict(sorted(self.counters.items())))
+
+    def report(self, previous=None) :
+        """Lignes lisibles des chronomètres et compteurs, limitées à l'activité depuis l'état previous (voir snapshot) s'il est donné"""
+        current = self.snapshot()
+        lines = []
+        for name, timer in current['timers'].items() :
+            before = previous['timers'].get(name, dict(count=0, total=0.0)) if previous else dict(count=0, total=0.0)
+            calls, total = timer['count'] - before['count'], timer['total'] - before['total']
+            if calls :
+                lines.append(f"{name:<18} : {calls:6d} appels, {total*1000:10.1f} ms (moyenne {total/calls*1000:.2f} ms, max {timer['max']*1000:.1f} ms)")
+        for name, value in current['counters'].items() :
+            delta = value - (previous['counters'].get(name, 0) if previous else 0)
+            if delta :
+                lines.append(f"{name:<18} : {delta:+g}")
+        return lines
+
+    def prometheus(self) :
+        """Mesures au format texte d'exposition Prometheus"""
+        current = self.snapshot()
+        lines = []
+        for metric, kind, key, help in [('seconds_total', 'counter', 'total', "Durée cumulée de l'opération"),
+                                        ('calls_total', 'counter', 'count', "Nombre d'appels de l'opération"),
+                                        ('max_seconds', 'gauge', 'max', "Durée maximale d'un appel de l'opération")] :
+            name = f"{METRICS_PREFIX}_operation_{metric}"
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [f'{name}{{operation="{operation}"}} {timer[key]:.9g}' for operation, timer in current['timers'].items()]
+        name = f"{METRICS_PREFIX}_events_total"
+        lines += [f"# HELP {name} Compteurs d'événements", f"# TYPE {name} counter"]
+        lines += [f'{name}{{event="{event}"}} {value:.9g}' for event, value in current['counters'].items()]
+        return '\n'.join(lines) + '\n'
+
+    def profileReport(self, name, lines=PROFILE_LINES) :
+        """Fonctions les plus coûteuses (temps cumulé) du profil de l'opération name, None si elle n'a pas été profilée"""
+        with self.lock :
+            profile = self.profiles.get(name)
+        if profile is None :
+            return None
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(lines)
+        return stream.getvalue()
+
+
+# Mesures partagées par tout le processus
+_metrics = Metrics()
+
+def metrics() :
+    """Mesures partagées par tout le processus"""
+    return _metrics
+
+def enableMetrics(profile=()) :
+    """Active les mesures, et le profilage cProfile des opérations de profile"""
+    _metrics.enable(profile)
+
+def timed(name) :
+    """Décorateur chronométrant chaque appel de la fonction sous le nom name, si les mesures sont actives"""
+    def decorate(function) :
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs) :
+            if not _metrics.enabled :
+                return function(*args, **kwargs)
+            return _metrics.run(name, function, *args, **kwargs)
+        return wrapper
+    return decorate
+
+class timer :
+    """Bloc chronométré sous le nom name, si les mesures sont actives : with timer('rest.request') : ..."""
+    __slots__ = ['name', 'start']
+
+    def __init__(self, name) :
+        self.name = name
+
+    def __enter__(self) :
+        self.start = time.perf_counter() if _metrics.enabled else None
+        return self
+
+    def __exit__(self, *exc) :
+        if self.start is not None :
+            _metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+def count(name, value=1) :
+    """Incrémente le compteur name, si les mesures sont actives"""
+    if _metrics.enabled :
+        _metrics.count(name, value)
+
+def serveMetrics(port, host='') :
+    """Sert les mesures au format Prometheus sur http://host:port/metrics, depuis un thread de fond ; renvoie le serveur"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler) :
+        def do_GET(self) :
+            if self.path.split('?')[0] != '/metrics' :
+                self.send_error(404)
+                return
+            body = _metrics.prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) :
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Activation au lancement par la variable d'environnement
+if os.environ.get(METRICS_ENV) :
+    enableMetrics([name for name in os.environ[METRICS_ENV].split(',') if name and name != '1'])
+
+
+### PROCEDURES DE TEST
+
+def benchMetrics(calls=1000000) :
+    """Mesure le surcoût par appel d'une fonction décorée par timed, mesures désactivées puis activées"""
+    def bare() :
+        return None
+    wrapped = timed('bench.appel')(bare)
+    enabled = _metrics.enabled
+    results = dict()
+    for label, function, active in [('fonction nue', bare, False), ('timed, désactivé', wrapped, False), ('timed, activé', wrapped, True)] :
+        _metrics.enabled = active
+        start = time.perf_counter()
+        for k in range(calls) :
+            function()
+        results[label] = (time.perf_counter() - start) / calls * 1e9
+    _metrics.enabled = enabled
+    for label, elapsed in results.items() :
+        print(f"{label:18s} : {elapsed:7.1f} ns par appel")
+
+
+if __name__ == '__main__' :
+    benchMetrics()
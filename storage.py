@@ -0,0 +1,328 @@
+####################################################################
+### HISTORIQUE DES VOLS EN COLONNES
+### 18.10.2026
+### Nestor Laborier
+####################################################################
+
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+# Emplacement de l'historique, une table par dossier
+STORE_PATH = 'history'
+
+# Nombre de lignes accumulées en mémoire avant l'écriture d'un segment, et taille visée des segments compactés
+SEGMENT_ROWS = 100000
+COMPACT_ROWS = 2000000
+
+# Tolérance (km) de la simplification des routes enregistrées (voir Route.simplify), None pour garder tous les points
+ROUTE_TOLERANCE = 0.05
+
+# Valeur des colonnes absentes d'un segment (ajoutées à la table après son écriture), selon le type numpy
+FILL_VALUES = {'U' : '', 'f' : np.nan, 'b' : False, 'i' : 0}
+
+
+def dayOf(t) :
+    """Jour UTC (AAAA-MM-JJ) de chaque instant t (secondes Unix)"""
+    return np.datetime_as_string(np.asarray(t, dtype=float).astype('datetime64[s]'), unit='D')
+
+
+class ColumnStore :
+    """Table en ajout seul, rangée en colonnes : chaque segment est un dossier de fichiers .npy (un par colonne),
+    partitionné par jour UTC de la colonne 'time', et décrit dans un manifeste (nombre de lignes, bornes min / max)
+    Les requêtes écartent les segments sur ces bornes, puis ne lisent (en mmap) que les colonnes et les lignes utiles"""
+
+    def __init__(self, path=STORE_PATH, table='states', segment_rows=SEGMENT_ROWS) :
+        self.folder = os.path.join(path, table)
+        os.makedirs(self.folder, exist_ok=True)
+        self.manifest_path = os.path.join(self.folder, 'manifest.json')
+        self.segment_rows = segment_rows
+        self.lock = threading.Lock()
+        self.buffer = []            # Lots de lignes pas encore écrits
+        self.buffered = 0
+        self.readers = dict()       # Nombre de parcours en cours, par segment lu
+        self.retired = []           # Segments remplacés par une compaction, supprimés à la fin de leur dernier parcours
+
+        if os.path.exists(self.manifest_path) :
+            with open(self.manifest_path, encoding='utf-8') as file :
+                manifest = json.load(file)
+        else :
+            manifest = dict(schema=dict(), segments=[], next=0)
+        self.schema = manifest['schema']            # Colonne -> type numpy (kind), complété à chaque nouvelle colonne
+        self.segments = manifest['segments']
+        self.next = manifest['next']
+
+    def __len__(self) :
+        return sum(segment['rows'] for segment in self.segments) + self.buffered
+
+    def __repr__(self) :
+        return f"{self.folder} : {len(self.segments)} segments, {len(self)} lignes, colonnes {', '.join(self.schema)}"
+
+    def save(self) :
+        """Réécrit le manifeste de façon atomique (appelée sous le verrou)"""
+        temp = self.manifest_path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as file :
+            json.dump(dict(schema=self.schema, segments=self.segments, next=self.next), file)
+        os.replace(temp, self.manifest_path)
+
+    def append(self, columns) :
+        """Ajoute des lignes (dictionnaire colonne -> tableau, avec au moins la colonne 'time'), écrites par segments de segment_rows"""
+        columns = {name : np.asarray(values) for name, values in columns.items()}
+        with self.lock :
+            self.buffer.append(columns)
+            self.buffered += len(columns['time'])
+            if self.buffered >= self.segment_rows :
+                self.flush(locked=True)
+
+    def flush(self, locked=False) :
+        """Écrit les lignes en attente, un segment par jour"""
+        if not locked :
+            with self.lock :
+                return self.flush(locked=True)
+        if not self.buffered :
+            return
+        kinds = {name : values.dtype.kind for batch in self.buffer for name, values in batch.items()}
+        columns = {name : np.concatenate([batch[name] if name in batch else self.fill(name, len(batch['time']), kind)
+                                          for batch in self.buffer]) for name, kind in kinds.items()}
+        self.buffer, self.buffered = [], 0
+
+        days = dayOf(columns['time'])
+        for day in np.unique(days) :
+            rows = np.flatnonzero(days == day)
+            self.write(day, {name : values[rows] for name, values in columns.items()})
+        self.save()
+
+    def fill(self, name, n, kind=None) :
+        """Colonne de n valeurs par défaut, pour une colonne absente"""
+        if kind is None :
+            kind = self.schema.get(name, 'f')
+        return np.full(n, FILL_VALUES.get(kind, np.nan))
+
+    def write(self, day, columns, sorted_by=None) :
+        """Écrit un segment et l'ajoute au manifeste (appelée sous le verrou)"""
+        name = f"{day}/seg-{self.next:06d}"
+        self.next += 1
+        folder = os.path.join(self.folder, name)
+        os.makedirs(folder, exist_ok=True)
+        stats = dict()
+        for column, values in columns.items() :
+            np.save(os.path.join(folder, column + '.npy'), values)
+            self.schema.setdefault(column, values.dtype.kind)
+            if len(values) and values.dtype.kind in 'fi' and np.isfinite(values).any() :
+                stats[column] = [float(np.nanmin(values)), float(np.nanmax(values))]
+            elif len(values) and values.dtype.kind == 'U' :
+                ordered = np.sort(values)
+                stats[column] = [str(ordered[0]), str(ordered[-1])]
+        self.segments.append(dict(path=name, day=str(day), rows=len(columns['time']), stats=stats, sorted=sorted_by))
+
+    def load(self, segment, column, start=0, stop=None) :
+        """Lit une colonne d'un segment (mmap, seules les lignes [start, stop) sont chargées), valeurs par défaut si elle est absente
+        du segment ; un segment disparu (supprimé hors de cette table) est une erreur"""
+        folder = os.path.join(self.folder, segment['path'])
+        path = os.path.join(folder, column + '.npy')
+        if stop is None :
+            stop = segment['rows']
+        if not os.path.exists(path) :
+            if not os.path.isdir(folder) :
+                raise FileNotFoundError("Segment disparu : " + folder)
+            return self.fill(column, stop - start)
+        return np.array(np.load(path, mmap_mode='r')[start:stop])
+
+    def prune(self, icao=None, t_min=None, t_max=None, bbox=None) :
+        """Segments dont les bornes sont compatibles avec les prédicats (les autres ne sont pas lus)"""
+        kept = []
+        for segment in self.segments :
+            stats = segment['stats']
+            if t_min is not None and 'time' in stats and stats['time'][1] < t_min :
+                continue
+            if t_max is not None and 'time' in stats and stats['time'][0] > t_max :
+                continue
+            if icao is not None and 'icao24' in stats and not any(stats['icao24'][0] <= i <= stats['icao24'][1] for i in icao) :
+                continue
+            if bbox is not None and 'lat' in stats and 'lon' in stats :
+                lon_min, lon_max, lat_min, lat_max = bbox
+                if stats['lat'][1] < lat_min or stats['lat'][0] > lat_max :
+                    continue
+                if lon_min <= lon_max and (stats['lon'][1] < lon_min or stats['lon'][0] > lon_max) :
+                    continue
+            kept.append(segment)
+        return kept
+
+    def scan(self, columns=None, icao=None, t_min=None, t_max=None, bbox=None) :
+        """Parcourt les lignes vérifiant les prédicats, segment par segment (dictionnaire colonne -> tableau), sans tout charger en mémoire
+        icao : liste de codes ICAO, t_min / t_max : bornes de la colonne 'time', bbox : (lon_min, lon_max, lat_min, lat_max)"""
+        if icao is not None :
+            icao = sorted(set(icao))
+        # Segments lus figés sous le verrou, et réservés : une compaction concurrente ne les supprime qu'après ce parcours
+        with self.lock :
+            self.flush(locked=True)
+            if columns is None :
+                columns = list(self.schema)
+            segments = self.prune(icao, t_min, t_max, bbox)
+            for segment in segments :
+                self.readers[segment['path']] = self.readers.get(segment['path'], 0) + 1
+        try :
+            yield from self.read(segments, columns, icao, t_min, t_max, bbox)
+        finally :
+            with self.lock :
+                for segment in segments :
+                    self.readers[segment['path']] -= 1
+                    if not self.readers[segment['path']] :
+                        del self.readers[segment['path']]
+                self.retire([])
+
+    def read(self, segments, columns, icao=None, t_min=None, t_max=None, bbox=None) :
+        """Lignes des segments donnés vérifiant les prédicats (voir scan)"""
+        for segment in segments :
+            ranges = [(0, segment['rows'])]
+            if icao is not None and segment['sorted'] == 'icao24' :
+                # Segment compacté, trié par ICAO : seules les tranches des avions demandés sont lues
+                keys = np.load(os.path.join(self.folder, segment['path'], 'icao24.npy'), mmap_mode='r')
+                ranges = [(int(np.searchsorted(keys, i, 'left')), int(np.searchsorted(keys, i, 'right'))) for i in icao]
+                ranges = [(a, b) for a, b in ranges if b > a]
+            for start, stop in ranges :
+                keep = np.ones(stop - start, dtype=bool)
+                if t_min is not None or t_max is not None :
+                    t = self.load(segment, 'time', start, stop)
+                    keep &= (t >= (t_min if t_min is not None else -np.inf)) & (t <= (t_max if t_max is not None else np.inf))
+                if icao is not None and segment['sorted'] != 'icao24' :
+                    keep &= np.isin(self.load(segment, 'icao24', start, stop), icao)
+                if bbox is not None :
+                    lon_min, lon_max, lat_min, lat_max = bbox
+                    lat, lon = self.load(segment, 'lat', start, stop), self.load(segment, 'lon', start, stop)
+                    inside_lon = (lon >= lon_min) & (lon <= lon_max) if lon_min <= lon_max else (lon >= lon_min) | (lon <= lon_max)
+                    keep &= inside_lon & (lat >= lat_min) & (lat <= lat_max)
+                rows = np.flatnonzero(keep)
+                if len(rows) :
+                    yield {column : self.load(segment, column, start, stop)[rows] for column in columns}
+
+    def query(self, columns=None, **predicates) :
+        """Lignes vérifiant les prédicats (voir scan), réunies en un dictionnaire colonne -> tableau"""
+        if columns is None :
+            columns = list(self.schema)
+        parts = list(self.scan(columns, **predicates))
+        if not parts :
+            return {column : self.fill(column, 0) for column in columns}
+        return {column : np.concatenate([part[column] for part in parts]) for column in columns}
+
+    def compact(self, day=None) :
+        """Fusionne les segments de chaque jour (ou du jour donné) en segments d'au plus COMPACT_ROWS lignes, triés par ICAO puis instant,
+        ce qui permet de ne lire que les tranches des avions demandés ; renvoie le nombre de segments supprimés"""
+        self.flush()
+        with self.lock :
+            days = sorted(set(segment['day'] for segment in self.segments if day is None or segment['day'] == day))
+            removed = 0
+            for d in days :
+                old = [segment for segment in self.segments if segment['day'] == d]
+                if len(old) < 2 and all(segment['sorted'] == 'icao24' for segment in old) :
+                    continue
+                names = list(self.schema)
+                columns = {name : np.concatenate([self.load(segment, name) for segment in old]) for name in names}
+                order = np.lexsort((columns['time'], columns['icao24'])) if 'icao24' in columns else np.argsort(columns['time'], kind='stable')
+                columns = {name : values[order] for name, values in columns.items()}
+                self.segments = [segment for segment in self.segments if segment['day'] != d]
+                for start in range(0, len(order), COMPACT_ROWS) :
+                    self.write(d, {name : values[start:start + COMPACT_ROWS] for name, values in columns.items()},
+                               'icao24' if 'icao24' in columns else None)
+                # Le manifeste est enregistré avant la suppression des anciens segments : une interruption ne perd aucune ligne
+                self.save()
+                self.retire(old)
+                removed += len(old)
+            return removed
+
+    def retire(self, segments) :
+        """Supprime les segments remplacés (et ceux mis en attente), sauf ceux qu'un parcours lit encore (appelée sous le verrou)"""
+        waiting = []
+        for segment in self.retired + segments :
+            if segment['path'] in self.readers :
+                waiting.append(segment)
+            else :
+                shutil.rmtree(os.path.join(self.folder, segment['path']), ignore_errors=True)
+        self.retired = waiting
+
+
+class HistoryStore :
+    """Historique des vols : vecteurs d'états des instantanés successifs (table 'states') et routes terminées (table 'routes')"""
+
+    def __init__(self, path=STORE_PATH, segment_rows=SEGMENT_ROWS) :
+        self.states = ColumnStore(path, 'states', segment_rows)
+        self.routes = ColumnStore(path, 'routes', segment_rows)
+
+    def __repr__(self) :
+        return repr(self.states) + '\n' + repr(self.routes)
+
+    def recordStates(self, states, t=None) :
+        """Ajoute un instantané de vecteurs d'états en colonnes (StateColumns), pris à l'instant t (par défaut maintenant)"""
+        n = len(states)
+        if not n :
+            return
+        t = t if t is not None else time.time()
+        self.states.append(dict(time=np.full(n, float(t)), icao24=states.icao24, callsign=states.callsign,
+                                time_position=states.time_position, lat=states.lat, lon=states.lon, altitude=states.altitude,
+                                velocity=states.velocity, true_track=states.true_track, vertical_rate=states.vertical_rate,
+                                on_ground=states.on_ground))
+
+    def recordRoute(self, route, t=None, tolerance=ROUTE_TOLERANCE) :
+        """Ajoute les positions d'une route, identifiée par son avion et l'instant de l'enregistrement,
+        simplifiée à tolerance km (seq garde l'indice de chaque point dans la route complète)"""
+        kept = route.simplify(tolerance) if tolerance is not None else np.arange(len(route))
+        n = len(kept)
+        if not n :
+            return
+        times, lat, lon, altitude, ground = route.unpack_track()
+        t = t if t is not None else time.time()
+        self.routes.append(dict(time=np.full(n, float(t)), icao24=np.full(n, route.icao), seq=kept,
+                                lat=lat[kept], lon=lon[kept], point_time=times[kept], altitude=altitude[kept],
+                                on_ground=ground[kept]))
+
+    def flush(self) :
+        self.states.flush()
+        self.routes.flush()
+
+    def compact(self, day=None) :
+        return self.states.compact(day) + self.routes.compact(day)
+
+
+### PROCEDURES DE TEST
+
+def testStorage(path=os.path.join('history', 'test'), days=3, rows=20000, snapshots=50) :
+    """Écrit des instantanés synthétiques sur plusieurs jours, puis compare les requêtes filtrées à un filtrage complet en mémoire,
+    avant et après compaction, avec le nombre de segments lus"""
+    shutil.rmtree(path, ignore_errors=True)
+    store = ColumnStore(path, 'states', segment_rows=rows)
+    rng = np.random.default_rng(0)
+    icaos = np.array(["%06x" % k for k in rng.integers(0, 1 << 24, 500)])
+    t0 = 1671926400
+    written = []
+    for k in range(days * snapshots) :
+        n = rows // 4
+        t = t0 + k * 86400 // snapshots
+        batch = dict(time=np.full(n, float(t)), icao24=icaos[rng.integers(0, len(icaos), n)],
+                     lat=rng.uniform(-80, 80, n), lon=rng.uniform(-180, 180, n))
+        store.append(batch)
+        written.append(batch)
+    store.flush()
+    full = {name : np.concatenate([batch[name] for batch in written]) for name in written[0]}
+
+    predicates = dict(icao=list(icaos[:5]), t_min=t0 + 86400, t_max=t0 + 2 * 86400, bbox=(-10, 30, 35, 60))
+    expected = (np.isin(full['icao24'], predicates['icao']) & (full['time'] >= predicates['t_min']) & (full['time'] <= predicates['t_max'])
+                & (full['lon'] >= -10) & (full['lon'] <= 30) & (full['lat'] >= 35) & (full['lat'] <= 60))
+
+    for label in ['avant compaction', 'après compaction'] :
+        start = time.perf_counter()
+        result = store.query(['time', 'icao24'], **predicates)
+        elapsed = time.perf_counter() - start
+        read = len(store.prune(predicates['icao'], predicates['t_min'], predicates['t_max'], predicates['bbox']))
+        same = sorted(zip(result['icao24'], result['time'])) == sorted(zip(full['icao24'][expected], full['time'][expected]))
+        print(f"{label} : {len(store.segments)} segments, {read} lus, {len(result['time'])} lignes en {elapsed*1000:.1f} ms, identiques : {same}")
+        if label == 'avant compaction' :
+            print(f"Compaction : {store.compact()} segments fusionnés")
+    shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__' :
+    testStorage()